@@ -0,0 +1,130 @@
+import argparse
+import hashlib
+import multiprocessing
+import os
+import threading
+import time
+import traceback
+from pathlib import Path
+
+from utils.queue_utils import HEARTBEAT_SECONDS, MAX_ATTEMPTS, JobQueue
+
+VIDEO_EXTS = {".mp4", ".mkv", ".mov", ".avi", ".flv", ".ts", ".webm"}
+
+
+def collect_videos(source):
+    """
+    source 可以是目录（递归查找视频文件）或清单文件（每行一个视频路径，# 开头为注释）
+    """
+    source = Path(source)
+    if source.is_dir():
+        return sorted(p for p in source.rglob("*") if p.suffix.lower() in VIDEO_EXTS)
+
+    base = source.parent
+    videos = []
+    with open(source, "r", encoding="utf-8") as f:
+        for line in f:
+            line = line.strip()
+            if line and not line.startswith("#"):
+                path = Path(line)
+                videos.append(path if path.is_absolute() else base / path)
+    return videos
+
+
+def output_namespace(out_root, video_path):
+    """
+    每个视频独立的输出目录：<文件名>_<路径哈希>，避免同名视频互相覆盖
+    """
+    video_path = Path(video_path).resolve()
+    digest = hashlib.md5(str(video_path).encode("utf-8")).hexdigest()[:8]
+    return Path(out_root) / f"{video_path.stem}_{digest}"
+
+
+def heartbeat(db_path, job_id, stop):
+    # 单独的线程和连接：阶段可能跑上几个小时，期间一直证明本 worker 还在处理这个任务（见 JobQueue.recover）
+    queue = JobQueue(db_path)
+    try:
+        while not stop.wait(HEARTBEAT_SECONDS):
+            queue.heartbeat(job_id)
+    finally:
+        queue.close()
+
+
+def worker(db_path, max_attempts):
+    # 延迟导入：重型依赖只在 worker 进程里加载
+    from main import main as run_pipeline
+
+    queue = JobQueue(db_path, max_attempts)
+    try:
+        while True:
+            job = queue.claim()
+            if job is None:
+                return
+
+            job_id, video_path, output_dir = job
+            print(f"\n🎬 [{os.getpid()}] 开始处理：{video_path}")
+
+            def on_stage(stage, status, seconds, error):
+                queue.set_stage(job_id, stage, status, seconds, error)
+
+            stop = threading.Event()
+            beat = threading.Thread(target=heartbeat, args=(db_path, job_id, stop), daemon=True)
+            beat.start()
+            try:
+                result = run_pipeline(video_path, output_dir=output_dir, on_stage=on_stage)
+                queue.finish(job_id, result)
+            except Exception:
+                queue.fail(job_id, traceback.format_exc())
+            finally:
+                stop.set()
+                beat.join()
+    finally:
+        queue.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="批量处理视频（SQLite 持久队列，可中断续跑）")
+    parser.add_argument("source", nargs="?", help="视频目录或清单文件；省略时只继续处理队列中剩余任务")
+    parser.add_argument("--workers", type=int, default=2, help="并行处理的视频数")
+    parser.add_argument("--out", default=os.path.join("outputs", "batch"), help="输出根目录")
+    parser.add_argument("--db", default=None, help="队列数据库路径，默认 <out>/queue.sqlite")
+    parser.add_argument("--max-attempts", type=int, default=MAX_ATTEMPTS, help="每个视频最多尝试次数")
+    args = parser.parse_args()
+
+    Path(args.out).mkdir(parents=True, exist_ok=True)
+    db_path = args.db or os.path.join(args.out, "queue.sqlite")
+
+    queue = JobQueue(db_path, args.max_attempts)
+    recovered = queue.recover()
+    if recovered:
+        print(f"♻️ 回收上次中断的任务：{recovered} 个")
+
+    if args.source:
+        videos = collect_videos(args.source)
+        for video in videos:
+            queue.add(Path(video).resolve(), output_namespace(args.out, video))
+        print(f"📥 入队视频：{len(videos)} 个")
+
+    before = queue.counts().get("done", 0)
+    start = time.perf_counter()
+
+    procs = [
+        multiprocessing.Process(target=worker, args=(db_path, args.max_attempts))
+        for _ in range(args.workers)
+    ]
+    for p in procs:
+        p.start()
+    for p in procs:
+        p.join()
+
+    elapsed = time.perf_counter() - start
+    counts = queue.counts()
+    done = counts.get("done", 0) - before
+    queue.close()
+
+    print(f"\n✅ 批量处理结束：{counts}")
+    print(f"本次完成 {done} 个，用时 {elapsed / 60:.1f} 分钟，吞吐 {done / max(elapsed / 3600, 1e-9):.1f} 个/小时")
+
+
+if __name__ == "__main__":
+    main()
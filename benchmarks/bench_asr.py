@@ -0,0 +1,42 @@
+"""
+ASR 实时率（RTF = 识别耗时 / 音频时长）对比
+
+用法: python -m benchmarks.bench_asr [模型路径或模型名] [音频秒数]
+默认使用 ASR_MODEL 环境变量指定的模型（未设置时为 medium）
+"""
+import sys
+import time
+
+from benchmarks.synthetic import make_audio
+from utils.asr_utils import MODEL_PATH, SAMPLE_RATE, get_model, run_asr
+
+
+def bench(audio, model, batch_size):
+    start = time.perf_counter()
+    n = sum(1 for _ in run_asr(audio, model=model, batch_size=batch_size))
+    return n, time.perf_counter() - start
+
+
+def main():
+    model_path = sys.argv[1] if len(sys.argv) > 1 else MODEL_PATH
+    seconds = float(sys.argv[2]) if len(sys.argv) > 2 else 120
+    audio = make_audio(seconds)
+    audio_seconds = len(audio) / SAMPLE_RATE
+
+    start = time.perf_counter()
+    model = get_model(model_path, device="cpu", compute_type="int8")
+    cold = time.perf_counter() - start
+
+    start = time.perf_counter()
+    get_model(model_path, device="cpu", compute_type="int8")
+    warm = time.perf_counter() - start
+
+    print(f"模型加载：首次 {cold:.2f}s，缓存命中 {warm * 1000:.2f}ms")
+    print(f"{'方式':<16}{'片段':>6}{'耗时(s)':>10}{'RTF':>8}")
+    for name, batch_size in [("逐段推理", 0), ("批量推理 bs=8", 8), ("批量推理 bs=16", 16)]:
+        n, elapsed = bench(audio, model, batch_size)
+        print(f"{name:<16}{n:>6}{elapsed:>10.2f}{elapsed / audio_seconds:>8.3f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,74 @@
+"""
+人脸聚类对比：DBSCAN（全量） vs OnlineFaceClusterer（流式、内存有界）
+
+用法: python -m benchmarks.bench_clustering [人脸数] [人物数]
+输出耗时、峰值内存、簇数，以及两种结果的一致性（ARI，1.0 为完全一致）
+"""
+import sys
+import time
+import tracemalloc
+
+from sklearn.metrics import adjusted_rand_score
+
+from benchmarks.synthetic import make_embeddings
+from utils.face_utils import OnlineFaceClusterer, cluster_faces
+
+
+def labels_from_clusters(clusters, n):
+    labels = [-1] * n
+    for i, c in enumerate(clusters):
+        for idx in c["indices"]:
+            labels[idx] = i
+    return labels
+
+
+def measure(fn):
+    tracemalloc.start()
+    start = time.perf_counter()
+    result = fn()
+    elapsed = time.perf_counter() - start
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return result, elapsed, peak / 1024**2
+
+
+def run_online(X, threshold):
+    clusterer = OnlineFaceClusterer(threshold)
+    for i, enc in enumerate(X):
+        clusterer.add(enc, i)
+    return clusterer.finalize()
+
+
+def main():
+    n_faces = int(sys.argv[1]) if len(sys.argv) > 1 else 20000
+    n_people = int(sys.argv[2]) if len(sys.argv) > 2 else 50
+    threshold = 0.45
+
+    X, truth = make_embeddings(n_people=n_people, n_faces=n_faces)
+    encodings = list(X)
+
+    dbscan, t1, m1 = measure(lambda: cluster_faces(encodings, threshold=threshold))
+    (online, online_labels), t2, m2 = measure(lambda: run_online(X, threshold))
+
+    dbscan_labels = labels_from_clusters(dbscan, len(X))
+    real = truth >= 0
+
+    print(f"人脸 {len(X)}，真实人物 {n_people}，阈值 {threshold}")
+    print(f"{'方式':<10}{'耗时(s)':>10}{'峰值内存(MB)':>14}{'簇数(≥2)':>10}{'ARI vs 真值':>12}")
+    for name, clusters, labels, t, m in [
+        ("DBSCAN", dbscan, dbscan_labels, t1, m1),
+        ("Online", online, list(online_labels), t2, m2),
+    ]:
+        big = sum(1 for c in clusters if c["count"] >= 2)
+        ari = adjusted_rand_score(truth[real], [l for l, r in zip(labels, real) if r])
+        print(f"{name:<10}{t:>10.2f}{m:>14.1f}{big:>10}{ari:>12.4f}")
+
+    agree = adjusted_rand_score(
+        [l for l, r in zip(dbscan_labels, real) if r],
+        [l for l, r in zip(online_labels, real) if r],
+    )
+    print(f"\nDBSCAN 与 Online 一致性（ARI，非噪声人脸）：{agree:.4f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,276 @@
+"""
+全流程分阶段基准测试（离线、确定性的合成输入）
+
+用法: python -m benchmarks.bench_pipeline [--seconds 60] [--repeat 3] [--faces 人脸图片目录]
+                                         [--report bench_pipeline.json] [--compare 上次的报告.json]
+各阶段耗时写入 JSON 报告；传 --compare 时与旧报告逐项对比，
+慢于 --tolerance（默认 20%）的阶段视为回归，退出码为 1
+缺少依赖（face_recognition / ffprobe / ASR 模型）的阶段记为 skipped
+"""
+import argparse
+import importlib.util
+import json
+import os
+import platform
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+import cv2
+
+from benchmarks.synthetic import (
+    add_tone_audio, make_audio, make_dialogues, make_embeddings, make_face_video, make_metadata
+)
+
+
+class Skip(Exception):
+    """阶段的前置条件不满足（缺少依赖或上游阶段没有产出）"""
+
+
+def timed(fn, repeat):
+    """
+    运行 repeat 次，返回 (最后一次的结果, 每次的 wall 时间, 每次的 CPU 时间)
+    """
+    walls, cpus, result = [], [], None
+    for _ in range(repeat):
+        cpu = time.process_time()
+        start = time.perf_counter()
+        result = fn()
+        walls.append(time.perf_counter() - start)
+        cpus.append(time.process_time() - cpu)
+    return result, walls, cpus
+
+
+def run_stage(report, name, fn, repeat=1, **extra):
+    """
+    执行并记录一个阶段；fn 的返回值为 (结果, 额外指标 dict)
+    """
+    print(f"⏱️ {name} ...")
+    try:
+        (result, metrics), walls, cpus = timed(fn, repeat)
+    except (ImportError, FileNotFoundError, Skip) as e:
+        print(f"⏭️ 跳过 {name}：{e}")
+        report["stages"][name] = {"status": "skipped", "reason": str(e)}
+        return None
+    except Exception as e:
+        print(f"❌ {name} 失败：{e!r}")
+        report["stages"][name] = {"status": "failed", "error": repr(e)}
+        return None
+
+    report["stages"][name] = {
+        "status": "ok",
+        "seconds": min(walls),
+        "cpu_seconds": min(cpus),
+        "runs": walls,
+        **metrics,
+        **extra,
+    }
+    print(f"✅ {name}：{min(walls):.3f}s")
+    return result
+
+
+def _git_commit():
+    try:
+        out = subprocess.run(["git", "rev-parse", "HEAD"], capture_output=True, text=True, check=True)
+        return out.stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def load_faces(face_dir):
+    paths = sorted(p for p in Path(face_dir).iterdir() if p.suffix.lower() in (".jpg", ".jpeg", ".png"))
+    faces = [cv2.imread(str(p)) for p in paths]
+    return [f for f in faces if f is not None]
+
+
+def run_benchmarks(args, tmp):
+    from utils.cache_utils import ArtifactCache
+
+    report = {
+        "meta": {
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "commit": _git_commit(),
+            "python": sys.version.split()[0],
+            "platform": platform.platform(),
+            "cpu_count": os.cpu_count(),
+            "params": vars(args),
+        },
+        "stages": {},
+    }
+
+    print("🎬 生成合成视频...")
+    faces = load_faces(args.faces) if args.faces else None
+    video_path, cast = make_face_video(
+        tmp / "faces.mp4", seconds=args.seconds, shot_seconds=args.shot_seconds, faces=faces
+    )
+    av_path = add_tone_audio(video_path, tmp / "faces_audio.mp4") or video_path
+    report["meta"]["video"] = {"seconds": args.seconds, "shots": len(cast), "people": len(set(cast))}
+
+    def duration():
+        from utils.video_utils import get_video_duration
+        return get_video_duration(av_path), {}
+
+    run_stage(report, "get_video_duration", duration, args.repeat)
+
+    def media(shared):
+        def fn():
+            from utils.asr_utils import load_audio
+            from utils.media_utils import AudioBuffer, MediaReader
+            from utils.shot_utils import ShotDetector, detect_shots
+            if shared:
+                # 音频和镜头检测共用一次解封装
+                with MediaReader(av_path) as reader:
+                    if reader.audio_stream is None:
+                        raise Skip("合成视频没有音轨（未找到 ffmpeg）")
+                    audio = reader.add_audio(AudioBuffer())
+                    shots = reader.add_video(ShotDetector(reader.fps))
+                    reader.run()
+                return None, {"audio_seconds": len(audio.audio) / 16000, "shots": len(shots.shots)}
+            with MediaReader(av_path) as reader:
+                if reader.audio_stream is None:
+                    raise Skip("合成视频没有音轨（未找到 ffmpeg）")
+            audio, shots = load_audio(av_path), detect_shots(av_path)
+            return None, {"audio_seconds": len(audio) / 16000, "shots": len(shots)}
+        return fn
+
+    run_stage(report, "audio + shots (separate reads)", media(shared=False), args.repeat)
+    run_stage(report, "audio + shots (single pass)", media(shared=True), args.repeat)
+
+    def extract():
+        from utils.face_utils import extract_faces
+        encodings, frame_indices, _ = extract_faces(video_path, interval=args.interval)
+        return encodings, {"faces": len(encodings), "frames": len(set(frame_indices))}
+
+    run_stage(report, "extract_faces", extract, args.repeat, interval=args.interval)
+
+    X, _ = make_embeddings(n_people=args.people, n_faces=args.embeddings)
+
+    def cluster():
+        from utils.face_utils import cluster_faces
+        clusters = cluster_faces(list(X), threshold=0.45)
+        return clusters, {"clusters": len(clusters)}
+
+    run_stage(report, "cluster_faces", cluster, args.repeat, embeddings=len(X))
+
+    out_dir = tmp / "outputs"
+    cache = ArtifactCache(tmp / "cache")
+
+    def build(warm):
+        def fn():
+            from utils.face_db_utils import build_face_database
+            if not warm:
+                # 冷启动：每次都清空缓存和人物库
+                for p in (tmp / "cache", out_dir):
+                    shutil.rmtree(p, ignore_errors=True)
+            build_face_database(video_path, interval=args.interval, cache=cache, output_dir=out_dir)
+            return None, {}
+        return fn
+
+    run_stage(report, "build_face_database", build(warm=False), args.repeat)
+    run_stage(report, "build_face_database (cached)", build(warm=True), args.repeat)
+
+    dialogues = make_dialogues(args.seconds)
+
+    def speakers(warm):
+        # 与流水线相同的路径：台词采样帧的人脸库（get_speaker_store）+ 查表绑定
+        def fn():
+            from utils.speaker_utils import assign_speakers_from_store, get_speaker_store
+            if not (out_dir / "face_db.json").exists():
+                raise Skip("没有生成人物库（未检测到人脸）")
+            if not warm:
+                shutil.rmtree(tmp / "cache" / "speaker_faces", ignore_errors=True)
+            store = get_speaker_store(video_path, dialogues, cache=cache)
+            result = assign_speakers_from_store(store, dialogues, output_dir=out_dir)
+            named = sum(1 for d in result if d.speaker != "未知")
+            return None, {"dialogues": len(result), "identified": named}
+        return fn
+
+    run_stage(report, "assign_speakers", speakers(warm=False), args.repeat)
+    run_stage(report, "assign_speakers (cached store)", speakers(warm=True), args.repeat)
+
+    metadata = make_metadata(args.dialogues)
+    json_path = tmp / "metadata.json"
+
+    def save_json():
+        metadata.save_to_json(json_path)
+        return None, {"bytes": json_path.stat().st_size}
+
+    def load_json():
+        from video_metadata import VideoMetadata
+        return VideoMetadata.load_from_json(json_path), {}
+
+    run_stage(report, "save_to_json", save_json, args.repeat, dialogues=args.dialogues)
+    run_stage(report, "load_from_json", load_json, args.repeat, dialogues=args.dialogues)
+
+    def asr():
+        from utils.asr_utils import MODEL_PATH, SAMPLE_RATE, get_model, run_asr
+        if importlib.util.find_spec("faster_whisper") is None:
+            raise Skip("未安装 faster-whisper")
+        if os.path.sep in MODEL_PATH and not os.path.exists(MODEL_PATH):
+            raise Skip(f"未找到 ASR 模型：{MODEL_PATH}")
+        audio = make_audio(args.seconds)
+        model = get_model(MODEL_PATH)
+        start = time.perf_counter()
+        n = sum(1 for _ in run_asr(audio, model=model))
+        rtf = (time.perf_counter() - start) / (len(audio) / SAMPLE_RATE)
+        return None, {"segments": n, "rtf": rtf}
+
+    run_stage(report, "asr", asr, 1)
+    return report
+
+
+def compare(report, baseline, tolerance):
+    """
+    打印与旧报告的对比，返回回归的阶段名列表
+    """
+    print(f"\n{'阶段':<32}{'本次(s)':>10}{'基线(s)':>10}{'变化':>10}")
+    regressions = []
+    for name, stage in report["stages"].items():
+        old = baseline.get("stages", {}).get(name, {})
+        if stage.get("status") != "ok" or old.get("status") != "ok":
+            print(f"{name:<32}{stage.get('status'):>10}{old.get('status', '-'):>10}")
+            continue
+        change = stage["seconds"] / max(old["seconds"], 1e-9) - 1
+        flag = " ⚠️" if change > tolerance else ""
+        print(f"{name:<32}{stage['seconds']:>10.3f}{old['seconds']:>10.3f}{change:>+10.1%}{flag}")
+        if change > tolerance:
+            regressions.append(name)
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="全流程分阶段基准测试")
+    parser.add_argument("--seconds", type=float, default=60, help="合成视频时长（秒）")
+    parser.add_argument("--shot-seconds", type=float, default=5, help="每个镜头时长（秒）")
+    parser.add_argument("--interval", type=float, default=1, help="人脸抽帧间隔（秒）")
+    parser.add_argument("--faces", help="人脸图片目录（默认使用简笔人脸）")
+    parser.add_argument("--people", type=int, default=50, help="聚类测试的人物数")
+    parser.add_argument("--embeddings", type=int, default=20000, help="聚类测试的人脸向量数")
+    parser.add_argument("--dialogues", type=int, default=20000, help="JSON 读写测试的台词数")
+    parser.add_argument("--repeat", type=int, default=3, help="每个阶段重复次数（取最小值）")
+    parser.add_argument("--report", default="bench_pipeline.json", help="报告输出路径")
+    parser.add_argument("--compare", help="与之对比的旧报告")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="视为回归的变慢比例")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        report = run_benchmarks(args, Path(tmp))
+
+    with open(args.report, "w", encoding="utf-8") as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+    print(f"\n📄 报告已写入：{args.report}")
+
+    if args.compare:
+        with open(args.compare, "r", encoding="utf-8") as f:
+            baseline = json.load(f)
+        regressions = compare(report, baseline, args.tolerance)
+        if regressions:
+            print(f"\n❌ 性能回归：{', '.join(regressions)}")
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
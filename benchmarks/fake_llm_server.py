@@ -0,0 +1,94 @@
+"""
+本地 OpenAI 兼容的替身服务（仅用于测试/压测 llm_utils，不需要网络和 API Key）
+
+用法: python -m benchmarks.fake_llm_server [--port 8765] [--delay 0.5] [--fail-every 3]
+然后: LLM_BASE_URL=http://127.0.0.1:8765/v1 python main.py video.mp4
+"""
+import argparse
+import itertools
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+REPLY = {
+    "video_type": "剧情片",
+    "core_theme": "测试用的固定分析结果",
+    "people": [{"name": "张三", "identity": "主角"}],
+}
+
+
+def make_handler(delay, fail_every):
+    counter = itertools.count(1)
+    lock = threading.Lock()
+
+    class Handler(BaseHTTPRequestHandler):
+        def log_message(self, *args):
+            pass
+
+        def _send(self, status, body, headers=None):
+            data = json.dumps(body, ensure_ascii=False).encode("utf-8")
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(data)))
+            for k, v in (headers or {}).items():
+                self.send_header(k, v)
+            self.end_headers()
+            self.wfile.write(data)
+
+        def do_POST(self):
+            length = int(self.headers.get("Content-Length", 0))
+            request = json.loads(self.rfile.read(length) or b"{}")
+
+            if not self.path.endswith("/chat/completions"):
+                self._send(404, {"error": {"message": "not found"}})
+                return
+
+            with lock:
+                n = next(counter)
+            if fail_every and n % fail_every == 0:
+                # 模拟限流
+                self._send(429, {"error": {"message": "rate limited"}}, {"Retry-After": "0.1"})
+                return
+
+            time.sleep(delay)
+            prompt = request["messages"][-1]["content"]
+            self._send(200, {
+                "id": f"chatcmpl-{n}",
+                "object": "chat.completion",
+                "created": int(time.time()),
+                "model": request.get("model", "fake"),
+                "choices": [{
+                    "index": 0,
+                    "finish_reason": "stop",
+                    "message": {"role": "assistant", "content": "```json\n" + json.dumps(REPLY, ensure_ascii=False) + "\n```"},
+                }],
+                "usage": {"prompt_tokens": len(prompt), "completion_tokens": 20, "total_tokens": len(prompt) + 20},
+            })
+
+    return Handler
+
+
+def serve(port=8765, delay=0.0, fail_every=0):
+    """
+    在后台线程启动服务，返回 server（调用 server.shutdown() 停止）
+    """
+    server = ThreadingHTTPServer(("127.0.0.1", port), make_handler(delay, fail_every))
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def main():
+    parser = argparse.ArgumentParser(description="OpenAI 兼容的本地替身服务")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--delay", type=float, default=0.0, help="每个请求的模拟延迟（秒）")
+    parser.add_argument("--fail-every", type=int, default=0, help="每 N 个请求返回一次 429")
+    args = parser.parse_args()
+
+    server = ThreadingHTTPServer(("127.0.0.1", args.port), make_handler(args.delay, args.fail_every))
+    print(f"🧪 替身服务已启动：http://127.0.0.1:{args.port}/v1")
+    server.serve_forever()
+
+
+if __name__ == "__main__":
+    main()
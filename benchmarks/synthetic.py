@@ -0,0 +1,177 @@
+"""
+离线生成确定性的合成测试素材（不依赖任何外部文件）
+"""
+import cv2
+import numpy as np
+
+
+def make_video(path, seconds=60, fps=25, size=(640, 360), shot_seconds=None):
+    """
+    用 cv2.VideoWriter 生成一个带移动色块与帧号的视频
+    shot_seconds 不为 None 时每隔这么多秒换一次背景（模拟切镜头）
+    """
+    w, h = size
+    fourcc = cv2.VideoWriter_fourcc(*"mp4v")
+    writer = cv2.VideoWriter(str(path), fourcc, fps, (w, h))
+
+    rng = np.random.default_rng(0)
+    background = rng.integers(0, 255, size=(h, w, 3), dtype=np.uint8)
+    shot_frames = int(shot_seconds * fps) if shot_seconds else 0
+
+    for i in range(int(seconds * fps)):
+        if shot_frames and i and i % shot_frames == 0:
+            tint = rng.integers(0, 255, size=3, dtype=np.uint8)
+            background = (background // 4 + tint // 4 * 3).astype(np.uint8)
+        frame = background.copy()
+        x = (i * 4) % max(w - 80, 1)
+        cv2.rectangle(frame, (x, h // 3), (x + 80, h // 3 + 80), (0, 255, 255), -1)
+        cv2.putText(frame, str(i), (10, 30), cv2.FONT_HERSHEY_SIMPLEX, 1, (255, 255, 255), 2)
+        writer.write(frame)
+
+    writer.release()
+    return str(path)
+
+
+def make_audio(seconds=60, sample_rate=16000):
+    """
+    生成 16k 单声道 float32 测试音频：间隔出现的和弦音 + 静音段（可触发 VAD 切分）
+    """
+    t = np.arange(int(seconds * sample_rate), dtype=np.float32) / sample_rate
+    tone = sum(np.sin(2 * np.pi * f * t) for f in (220.0, 330.0, 440.0)) / 3
+    # 每 10 秒里 6 秒有声、4 秒静音
+    gate = ((t % 10) < 6).astype(np.float32)
+    noise = np.random.default_rng(0).normal(0, 0.01, t.shape).astype(np.float32)
+    return (0.3 * tone * gate + noise).astype(np.float32)
+
+
+def make_embeddings(n_people=50, n_faces=20000, n_noise=200, spread=0.015, seed=0):
+    """
+    生成类似 dlib 128 维人脸向量的合成数据：
+    每人一个中心（人与人之间距离约 0.9），人脸 = 中心 + 高斯扰动；另加少量孤立噪声
+    返回 (X float64 (n, 128), labels)，噪声的 label 为 -1
+    """
+    rng = np.random.default_rng(seed)
+    centers = rng.normal(0, 0.06, size=(n_people, 128))
+    labels = rng.integers(0, n_people, size=n_faces)
+    X = centers[labels] + rng.normal(0, spread, size=(n_faces, 128))
+
+    noise = rng.normal(0, 0.06, size=(n_noise, 128))
+    X = np.concatenate([X, noise])
+    labels = np.concatenate([labels, -np.ones(n_noise, dtype=labels.dtype)])
+
+    order = rng.permutation(len(X))
+    return X[order], labels[order]
+
+
+def drawn_face(seed, size=160):
+    """
+    用 cv2 画一张简笔人脸（肤色椭圆 + 眉眼鼻嘴），seed 决定五官位置与颜色
+    """
+    rng = np.random.default_rng(seed)
+    img = np.full((size, size, 3), 40, dtype=np.uint8)
+    c = size // 2
+    skin = tuple(int(x) for x in rng.integers((120, 150, 190), (170, 190, 240)))
+    cv2.ellipse(img, (c, c), (int(size * 0.32), int(size * 0.42)), 0, 0, 360, skin, -1)
+
+    eye_y = int(size * (0.40 + rng.uniform(-0.03, 0.03)))
+    eye_dx = int(size * rng.uniform(0.11, 0.15))
+    for sign in (-1, 1):
+        x = c + sign * eye_dx
+        cv2.ellipse(img, (x, eye_y), (int(size * 0.06), int(size * 0.03)), 0, 0, 360, (255, 255, 255), -1)
+        cv2.circle(img, (x, eye_y), int(size * 0.025), (30, 20, 10), -1)
+        cv2.line(img, (x - int(size * 0.07), eye_y - int(size * 0.07)),
+                 (x + int(size * 0.07), eye_y - int(size * 0.08)), (20, 20, 20), 3)
+
+    nose_y = int(size * 0.56)
+    cv2.line(img, (c, eye_y + 8), (c - 6, nose_y), (90, 110, 150), 2)
+    cv2.line(img, (c - 6, nose_y), (c + 6, nose_y), (90, 110, 150), 2)
+    mouth_w = int(size * rng.uniform(0.10, 0.16))
+    cv2.ellipse(img, (c, int(size * 0.68)), (mouth_w, int(size * 0.05)), 0, 0, 180, (40, 40, 160), 3)
+    return img
+
+
+def make_face_video(path, seconds=60, fps=25, size=(640, 360), shot_seconds=5, faces=None, n_people=3):
+    """
+    生成“多人轮流出镜”的视频：每个镜头一张人脸（轮流），位置随镜头变化
+    faces: 人脸图片列表（BGR）；为 None 时使用 n_people 张简笔人脸
+    返回 (视频路径, 每个镜头出镜的人物编号列表)
+    """
+    w, h = size
+    faces = faces if faces is not None else [drawn_face(i) for i in range(n_people)]
+    face_h = h // 2
+    faces = [cv2.resize(f, (int(f.shape[1] * face_h / f.shape[0]), face_h)) for f in faces]
+
+    fourcc = cv2.VideoWriter_fourcc(*"mp4v")
+    writer = cv2.VideoWriter(str(path), fourcc, fps, (w, h))
+    rng = np.random.default_rng(0)
+    shot_frames = int(shot_seconds * fps)
+    cast = []
+
+    for i in range(int(seconds * fps)):
+        if i % shot_frames == 0:
+            person = len(cast) % len(faces)
+            cast.append(person)
+            background = np.full((h, w, 3), rng.integers(60, 200, size=3), dtype=np.uint8)
+            face = faces[person]
+            x = int(rng.integers(0, max(w - face.shape[1], 1)))
+            y = (h - face.shape[0]) // 2
+            base = background.copy()
+            base[y:y + face.shape[0], x:x + face.shape[1]] = face
+
+        frame = base.copy()
+        cv2.putText(frame, str(i), (10, 30), cv2.FONT_HERSHEY_SIMPLEX, 1, (255, 255, 255), 2)
+        writer.write(frame)
+
+    writer.release()
+    return str(path), cast
+
+
+def add_tone_audio(video_path, out_path, frequency=440):
+    """
+    用 ffmpeg lavfi 生成正弦音轨并与视频合成一个文件；没有 ffmpeg 时返回 None
+    """
+    import shutil
+    import subprocess
+
+    if shutil.which("ffmpeg") is None:
+        return None
+    cmd = [
+        "ffmpeg", "-y", "-v", "error",
+        "-i", str(video_path),
+        "-f", "lavfi", "-i", f"sine=frequency={frequency}:sample_rate=16000",
+        "-map", "0:v", "-map", "1:a", "-c:v", "copy", "-c:a", "aac", "-shortest",
+        str(out_path),
+    ]
+    subprocess.run(cmd, check=True)
+    return str(out_path)
+
+
+def make_dialogues(seconds, every=2.0, length=1.5):
+    """
+    每隔 every 秒一句、每句 length 秒的合成台词
+    """
+    from video_metadata import Dialogue
+
+    return [
+        Dialogue(round(t, 3), round(t + length, 3), "未知", f"第 {k} 句台词")
+        for k, t in enumerate(np.arange(0, seconds - length, every))
+    ]
+
+
+def make_metadata(n_dialogues=20000, n_shots=2000):
+    """
+    构造一个较大的 VideoMetadata，用于测 JSON 序列化开销
+    """
+    from video_metadata import BasicInfo, Dialogue, Person, Shot, VideoMetadata
+
+    duration = float(n_dialogues * 2 + 10)
+    shot_len = duration / n_shots
+    return VideoMetadata(
+        basic_info=BasicInfo(duration, "剧情片", "合成数据"),
+        shots=[Shot(k * shot_len, (k + 1) * shot_len, f"镜头 {k}") for k in range(n_shots)],
+        people=[Person(f"人物{k}", "配角") for k in range(20)],
+        dialogues=[
+            Dialogue(k * 2.0, k * 2.0 + 1.5, f"人物{k % 20}", f"这是第 {k} 句测试台词，包含一些中文字符。")
+            for k in range(n_dialogues)
+        ],
+    )
@@ -0,0 +1,42 @@
+"""
+运行配置：命令行参数的默认值，每一项都可以用同名环境变量覆盖
+（ASR / LLM / 缓存等模块级配置见各 utils 模块，同样读取环境变量）
+本文件只依赖标准库，命令行启动时不会加载任何重型依赖
+"""
+import os
+
+
+def _env(name, default, cast=str):
+    value = os.getenv(name)
+    if value is None or value == "":
+        return default
+    if cast is bool:
+        return value.strip().lower() in ("1", "true", "yes", "on")
+    return cast(value)
+
+
+OUTPUT_DIR = _env("OUTPUT_DIR", "outputs")                  # 输出目录
+FACE_INTERVAL = _env("FACE_INTERVAL", 15, float)            # 人脸抽帧间隔（秒）
+FACE_THRESHOLD = _env("FACE_THRESHOLD", 0.45, float)        # 人脸聚类阈值
+SPEAKER_THRESHOLD = _env("SPEAKER_THRESHOLD", 0.5, float)   # 说话人匹配阈值
+# 人脸按镜头采样（否则按固定间隔稀疏 seek）；镜头检测要解码整个视频，人脸库得等它结束才能开始，默认关闭
+USE_SHOTS = _env("USE_SHOTS", False, bool)
+
+# 各阶段缓存 key 用到的参数：main.py 组装 key 时只读这里，轻量子命令（build / analyze）不必为几个常量加载 cv2 / PyAV
+SAMPLE_RATE = 16000                                             # 音频统一重采样为 16k 单声道 float32（ASR 输入格式）
+SHOT_THRESHOLD = _env("SHOT_THRESHOLD", 0.35, float)            # 相邻帧颜色直方图差异（0~1）超过该值视为切镜头
+MIN_SHOT_LEN = _env("MIN_SHOT_LEN", 0.5, float)                 # 最短镜头（秒），过滤闪光等误检
+SAMPLES_PER_DIALOGUE = _env("SAMPLES_PER_DIALOGUE", 3, int)     # 说话人：每句台词采样帧数（多帧投票）
+STORE_MAX_GAP = _env("STORE_MAX_GAP", 1.0, float)               # 说话人：台词区间内没有已分析帧时，向外查找的最大距离（秒）
+
+
+def face_db_paths(output_dir=OUTPUT_DIR):
+    """
+    某个输出目录下的人物库文件: (faces 目录, face_db.json, face_db.npz, face_db.key)
+    """
+    return (
+        os.path.join(output_dir, "faces"),
+        os.path.join(output_dir, "face_db.json"),
+        os.path.join(output_dir, "face_db.npz"),
+        os.path.join(output_dir, "face_db.key"),
+    )
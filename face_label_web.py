@@ -1,56 +1,266 @@
+import argparse
 import os
 import json
-from flask import Flask, request, redirect,send_from_directory
+import threading
 
-OUTPUT_DIR = "outputs"
+from filelock import FileLock
+from flask import Flask, abort, jsonify, request, redirect, send_from_directory, url_for
+from markupsafe import escape
+
+import config
+
+OUTPUT_DIR = config.OUTPUT_DIR      # 批量运行时每个视频一个输出目录，用 --out 指定
 DB_PATH = os.path.join(OUTPUT_DIR, "face_db.json")
 
+PER_PAGE = 60                  # 每页人物数
+MAX_PER_PAGE = 500             # per_page 参数上限
+CACHE_MAX_AGE = 3600           # 图片缓存时间（秒），配合 ETag 校验
+UNLABELLED_PREFIX = "未知人物_"  # build_face_database 生成的默认名字
+
 app = Flask(__name__)
 
 
-def load_db():
-    with open(DB_PATH, "r", encoding="utf-8") as f:
-        return json.load(f)
+class FaceDBStore:
+    """
+    face_db.json 的内存副本：
+    1. 读取时按文件 mtime 判断是否需要重新加载
+    2. 保存时加文件锁，重新读取最新文件后只修改提交的条目，再原子替换
+       （多人同时保存不会互相覆盖）
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.lock = FileLock(path + ".lock")
+        self._mutex = threading.Lock()
+        self._db = {}
+        self._mtime = None
+
+    def _read(self):
+        with open(self.path, "r", encoding="utf-8") as f:
+            return json.load(f)
+
+    def get(self):
+        mtime = os.stat(self.path).st_mtime_ns
+        with self._mutex:
+            if mtime != self._mtime:
+                self._db = self._read()
+                self._mtime = mtime
+            return self._db
+
+    def update(self, changes):
+        """
+        changes: {pid: {"name": 新名字}}；只修改存在的条目和允许的字段
+        格式不对（条目不是 dict、名字不是字符串）时抛出 ValueError，不做任何修改
+        返回实际修改的条目数
+        """
+        for pid, fields in changes.items():
+            if not isinstance(fields, dict) or not isinstance(fields.get("name", ""), str):
+                raise ValueError(f"条目 {pid} 格式错误，应为 {{\"name\": \"名字\"}}")
+
+        with self.lock:
+            db = self._read()
+            changed = 0
+            for pid, fields in changes.items():
+                name = fields.get("name", "").strip()
+                if pid in db and name and db[pid]["name"] != name:
+                    db[pid]["name"] = name
+                    changed += 1
+
+            if changed:
+                tmp = self.path + ".tmp"
+                with open(tmp, "w", encoding="utf-8") as f:
+                    json.dump(db, f, ensure_ascii=False, indent=2)
+                os.replace(tmp, self.path)
+
+            with self._mutex:
+                self._db = db
+                self._mtime = os.stat(self.path).st_mtime_ns
+        return changed
+
+
+store = FaceDBStore(DB_PATH)
+
+
+def query_faces(status="all", min_count=0, sort="id", page=1, per_page=PER_PAGE):
+    """
+    过滤 + 排序 + 分页
+    status: all / unlabelled / labelled；sort: id / count
+    """
+    db = store.get()
+    items = []
+    for pid, person in db.items():
+        unlabelled = person["name"].startswith(UNLABELLED_PREFIX)
+        if status == "unlabelled" and not unlabelled:
+            continue
+        if status == "labelled" and unlabelled:
+            continue
+        if person.get("count", 0) < min_count:
+            continue
+        items.append((pid, person))
+
+    if sort == "count":
+        items.sort(key=lambda kv: -kv[1].get("count", 0))
+    else:
+        items.sort(key=lambda kv: int(kv[0]))
+
+    total = len(items)
+    page = max(page, 1)
+    items = items[(page - 1) * per_page: page * per_page]
 
+    return {
+        "total": total,
+        "page": page,
+        "per_page": per_page,
+        "items": [
+            {
+                "id": pid,
+                "name": person["name"],
+                "count": person.get("count"),
+                "thumb": url_for("serve_thumb", pid=pid),
+                "image": url_for("serve_image", filename=person["image"]),
+            }
+            for pid, person in items
+        ],
+    }
 
-def save_db(db):
-    with open(DB_PATH, "w", encoding="utf-8") as f:
-        json.dump(db, f, ensure_ascii=False, indent=2)
+
+def _query_args():
+    return dict(
+        status=request.args.get("status", "all"),
+        min_count=request.args.get("min_count", 0, type=int),
+        sort=request.args.get("sort", "id"),
+        page=max(request.args.get("page", 1, type=int), 1),
+        per_page=max(min(request.args.get("per_page", PER_PAGE, type=int), MAX_PER_PAGE), 1),
+    )
+
+
+@app.route("/api/faces", methods=["GET"])
+def api_list_faces():
+    return jsonify(query_faces(**_query_args()))
+
+
+@app.route("/api/faces", methods=["PATCH"])
+def api_update_faces():
+    changes = request.get_json(silent=True)
+    if not isinstance(changes, dict):
+        abort(400)
+    return _update(changes)
+
+
+@app.route("/api/faces/<pid>", methods=["PATCH"])
+def api_update_face(pid):
+    fields = request.get_json(silent=True)
+    if not isinstance(fields, dict):
+        abort(400)
+    if pid not in store.get():
+        abort(404)
+    return _update({pid: fields})
+
+
+def _update(changes):
+    try:
+        changed = store.update(changes)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    return jsonify({"changed": changed})
 
 
 @app.route("/", methods=["GET", "POST"])
 def index():
-    db = load_db()
+    args = _query_args()
 
     if request.method == "POST":
-        for pid in db:
-            db[pid]["name"] = request.form.get(f"name_{pid}", db[pid]["name"])
-        save_db(db)
-        return redirect("/")
+        # 只提交当前页的条目
+        changes = {
+            key[len("name_"):]: {"name": value}
+            for key, value in request.form.items()
+            if key.startswith("name_")
+        }
+        store.update(changes)
+        return redirect(url_for("index", **request.args))
 
-    html = "<h1>人物校正</h1><form method='post'>"
+    result = query_faces(**args)
+    pages = max((result["total"] + result["per_page"] - 1) // result["per_page"], 1)
 
-    for pid, person in db.items():
+    html = "<h1>人物校正</h1>"
+    html += (
+        f"<p>共 {result['total']} 人，第 {result['page']}/{pages} 页 · "
+        f"<a href='{url_for('index', status='all')}'>全部</a> · "
+        f"<a href='{url_for('index', status='unlabelled')}'>未标注</a> · "
+        f"<a href='{url_for('index', status=args['status'], sort='count')}'>按出现次数</a></p>"
+    )
+    html += "<form method='post'>"
 
-        img_path =  person["image"]
-        
+    for item in result["items"]:
         html += f"""
-        <div style='margin:20px'>
-            <img src='/image/{img_path}' width='120'><br>
-            <input name='name_{pid}' value='{person["name"]}' style='width:200px'>
+        <div style='margin:20px;display:inline-block'>
+            <img src='{item["thumb"]}' width='120' height='120' loading='lazy'><br>
+            <input name='name_{escape(item["id"])}' value='{escape(item["name"])}' style='width:120px'>
         </div>
         """
 
-    html += "<button type='submit'>保存</button></form>"
+    html += "<br><button type='submit'>保存</button></form>"
+
+    nav = []
+    if result["page"] > 1:
+        nav.append(f"<a href='{url_for('index', **{**args, 'page': result['page'] - 1})}'>上一页</a>")
+    if result["page"] < pages:
+        nav.append(f"<a href='{url_for('index', **{**args, 'page': result['page'] + 1})}'>下一页</a>")
+    html += " · ".join(nav)
     return html
 
 
+def _ensure_thumb(pid, person):
+    """
+    旧版人物库没有缩略图时，按需生成一次并落盘
+    """
+    thumb = person.get("thumb") or f"faces/thumbs/person_{pid}.jpg"
+    path = os.path.join(OUTPUT_DIR, thumb)
+    if not os.path.exists(path):
+        import cv2
+        from utils.face_db_utils import make_thumbnail
+
+        img = cv2.imread(os.path.join(OUTPUT_DIR, person["image"]))
+        if img is None:
+            return None
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        cv2.imwrite(path, make_thumbnail(img))
+    return thumb
+
+
+@app.route("/thumb/<pid>")
+def serve_thumb(pid):
+    person = store.get().get(pid)
+    if person is None:
+        abort(404)
+    thumb = _ensure_thumb(pid, person)
+    if thumb is None:
+        abort(404)
+    return send_from_directory(os.path.abspath(OUTPUT_DIR), thumb, max_age=CACHE_MAX_AGE, etag=True, conditional=True)
+
+
 @app.route("/image/<path:filename>")
 def serve_image(filename):
-    return send_from_directory("outputs", filename)
+    return send_from_directory(os.path.abspath(OUTPUT_DIR), filename, max_age=CACHE_MAX_AGE, etag=True, conditional=True)
+
+
+def set_output_dir(output_dir):
+    """
+    切换要校正的输出目录（人物库、人脸图都在其中）
+    """
+    global OUTPUT_DIR, DB_PATH, store
+    OUTPUT_DIR = output_dir
+    DB_PATH = os.path.join(OUTPUT_DIR, "face_db.json")
+    store = FaceDBStore(DB_PATH)
 
 
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="人物库校正页面")
+    parser.add_argument("--out", default=config.OUTPUT_DIR, help="输出目录（main.py 的 --out）")
+    parser.add_argument("--port", type=int, default=5000)
+    args = parser.parse_args()
+
+    set_output_dir(args.out)
     # 关键：让 Flask 能访问 outputs 目录
     app.static_folder = "."
-    app.run(debug=True)
+    app.run(debug=True, port=args.port)
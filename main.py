@@ -1,92 +1,306 @@
+import argparse
 import sys
 from pathlib import Path
 
-from utils.video_utils import get_video_duration
-from utils.asr_utils import transcribe_video
-from utils.llm_utils import analyze_video
-from utils.builder_utils import build_metadata
-from utils.face_db_utils import build_face_database
-from utils.speaker_utils import assign_speakers
+import config
 
+# 顶层只导入标准库和 config：faster_whisper / dlib / cv2 / openai / sklearn 等重型依赖
+# 在各阶段内部按需导入，--help 和只读缓存的 build 子命令不会加载它们
 
-def main(video_path: str):
-    print("\n请选择运行模式：")
-    print("1️⃣ 第一次运行（完整流程）")
-    print("2️⃣ 第二次运行（跳过耗时步骤）")
+# 子命令 → 需要产出的阶段（依赖的阶段自动包含，见 select_stages）
+COMMANDS = {
+    "transcribe": ("dialogues",),
+    "faces": ("face_db",),
+    "label-speakers": ("speakers",),
+    "analyze": ("llm_result",),
+    "build": ("metadata", "speakers"),
+    "all": ("metadata", "speakers"),
+}
+# 会重建人物库的子命令；其余子命令直接使用磁盘上的人物库，不会覆盖 face_label_web.py 里校正过的名字
+BUILD_FACES_COMMANDS = ("faces", "all")
+COMMAND_HELP = {
+    "transcribe": "语音识别，生成台词",
+    "faces": "人脸提取聚类，生成人物库（之后可用 face_label_web.py 校正名字）",
+    "label-speakers": "按（校正后的）人物库绑定说话人",
+    "analyze": "LLM 剧情分析",
+    "build": "只用已缓存的结果组装元数据文件，不做任何识别",
+    "all": "全流程",
+}
 
-    mode = input("请输入 1 或 2：").strip()
 
-    output_path = Path("outputs") / (Path(video_path).stem + "_metadata.json")
-    output_path.parent.mkdir(exist_ok=True)
+def analyze_video_stage(dialogues):
+    from utils.llm_utils import analyze_video
 
-    # =================================================
-    # ⭐ 模式1：完整流程
-    # =================================================
-    if mode == "1":
+    print(f"台词数量：{len(dialogues)}")
+    llm_result = analyze_video(dialogues)
+    print("LLM分析完成")
+    return llm_result
 
-        print("\n=== STEP 1：获取视频时长 ===")
-        duration = get_video_duration(video_path)
 
-        print("\n=== STEP 2：Whisper识别台词 ===")
+def pipeline_stages(video_path, output_dir, targets=COMMANDS["all"], cache_only=False, build_faces=True,
+                    face_interval=config.FACE_INTERVAL, face_threshold=config.FACE_THRESHOLD,
+                    speaker_threshold=config.SPEAKER_THRESHOLD, use_shots=config.USE_SHOTS):
+    """
+    产出 targets 需要的阶段列表（见 run_stages / select_stages）
+    cache_only: 台词 / 镜头 / 剧情分析 / 说话人只读缓存，缺失时提示先运行对应的子命令（build 子命令）
+    build_faces: 是否（按 face_* 参数）重建人物库；为 False 时使用磁盘上已有的人物库
+    """
+    # 这里只组装缓存 key：参数取自 config 和轻量模块，cv2 / PyAV 等到真正要计算的阶段里才导入
+    from config import MIN_SHOT_LEN, SAMPLE_RATE, SAMPLES_PER_DIALOGUE, SHOT_THRESHOLD, STORE_MAX_GAP, face_db_paths
+    from utils.asr_utils import asr_params
+    from utils.cache_utils import file_hash, get_cache, video_hash
+    from utils.llm_utils import LLM_MODEL
+    from utils.pipeline_utils import Stage, select_stages
 
-        dialogues = transcribe_video(video_path)
+    _, db_path, emb_path, _ = face_db_paths(output_dir)
 
+    # 每个阶段的缓存 key = 视频内容指纹 / 上游 key + 本阶段参数；
+    # 输入没变的阶段直接读缓存，不再需要手动选择“模式1/模式2”
+    cache = get_cache()
+    vhash = video_hash(video_path)
 
-        print("\n=== STEP 3：建立人物人脸库 ===")
-        build_face_database(video_path)
+    duration_key = cache.key("duration", vhash)
+    audio_key = cache.key("audio", vhash, sample_rate=SAMPLE_RATE)
+    dialogues_key = cache.key("dialogues", audio_key, **asr_params())     # 同时是断点续跑的 key
+    llm_key = cache.key("llm", dialogues_key, model=LLM_MODEL)
+    shots_key = cache.key("shots", vhash, threshold=SHOT_THRESHOLD, min_shot_len=MIN_SHOT_LEN)
 
+    missing = object()
 
-        print("\n=== STEP 5：调用千问分析剧情 ===")
-        print(f"台词数量：{len(dialogues)}")
-        llm_result = analyze_video(dialogues)
-        print("LLM分析完成")
+    def fetch(stage, key, compute, command):
+        if not cache_only:
+            return cache.get_or_compute(stage, key, compute)
+        value = cache.get(stage, key, missing)
+        if value is missing:
+            raise RuntimeError(f"缓存中没有 {stage} 的结果，请先运行：python main.py {command} {video_path}")
+        return value
 
-        print("\n=== STEP 6：构建元数据 ===")
-        metadata = build_metadata(duration, dialogues, llm_result)
+    def media_stage():
+        # 时长 / 音频 / 镜头检测 / 人脸采样帧共用一次解封装（见 MediaReader），在后台线程进行，本阶段立即返回：
+        # 音频边解码边交给台词识别（AudioStream），不再整段缓存后读回；镜头检测在同一遍里完成；
+        # 人脸按固定间隔采样时，采样帧也从这一遍里取（FrameStream），不再单独打开视频 seek
+        # 已缓存或本次用不到的产物不注册消费者，全部命中缓存时不打开视频（也不导入 PyAV / cv2）
+        duration = cache.get("duration", duration_key)
+        need_audio = not cache_only and "dialogues" in needed and not cache.exists("dialogues", dialogues_key)
+        need_shots = not cache_only and "shots" in needed and not cache.exists("shots", shots_key)
+        need_faces = build_faces and not cache_only and not use_shots and "face_db" in needed
+        if need_faces:
+            from utils.face_db_utils import face_store_path
+            from utils.face_store_utils import FaceStore
+            need_faces = not FaceStore.exists(face_store_path(video_path, interval=face_interval, cache=cache)[1])
+        media = {"duration": duration, "reader": None, "audio": None, "shots": None, "faces": None, "has_audio": True}
+        if duration is not None and not need_audio and not need_shots and not need_faces:
+            return media
 
-        metadata.save_to_json(output_path)
+        from utils.media_utils import AudioStream, FrameStream, MediaReader
+        from utils.shot_utils import ShotDetector
 
-        print(f"\n✅ 全流程完成：{output_path}")
+        reader = MediaReader(video_path, sample_rate=SAMPLE_RATE)
+        try:
+            media["duration"] = reader.duration
+            media["has_audio"] = reader.audio_stream is not None
+            if need_audio and not media["has_audio"]:
+                print("⚠️ 视频中没有音频流，台词为空")
+            media["audio"] = reader.add_audio(AudioStream()) if need_audio and media["has_audio"] else None
+            media["shots"] = reader.add_video(ShotDetector(reader.fps)) if need_shots else None
+            if need_faces and reader.video_stream is not None and reader.fps > 0:
+                media["faces"] = reader.add_video(FrameStream(reader.fps, face_interval))
+        except BaseException:
+            reader.close()
+            raise
+        cache.put("duration", duration_key, reader.duration)
 
-    # =================================================
-    # ⭐ 模式2：快速模式
-    # =================================================
-    elif mode == "2":
+        print("🎞️ 解封装视频（单次读取，后台进行）...")
+        media["reader"], media["pass"] = reader, reader.start()
+        return media
 
-        from video_metadata import VideoMetadata
+    def shots_stage(media):
+        if media["shots"] is not None:
+            media["pass"].result()      # 等单次读取结束（解封装出错时在这里抛出）
+            cache.put("shots", shots_key, media["shots"].shots)
+            return media["shots"].shots
 
-        if not output_path.exists():
-            print("❌ 找不到 metadata，请先运行模式1")
-            return
+        def detect():
+            from utils.shot_utils import detect_shots
+            return detect_shots(video_path)
+        return fetch("shots", shots_key, detect, "faces")
 
-        print("\n=== 加载已有 metadata ===")
-        metadata = VideoMetadata.load_from_json(output_path)
+    def dialogues_stage(media):
+        if not media["has_audio"]:
+            return fetch("dialogues", dialogues_key, list, "transcribe")
 
-        print("\n=== 重新绑定说话人 ===")
-        metadata.dialogues = assign_speakers(video_path, metadata.dialogues)
+        def transcribe():
+            from utils.asr_utils import transcribe_video
+            try:
+                return transcribe_video(
+                    video_path, audio=media["audio"], output_dir=output_dir, resume_key=dialogues_key
+                )
+            except BaseException:
+                if media["reader"] is not None:
+                    media["reader"].stop()      # 识别失败就不必再解码剩下的音频
+                raise
+        return fetch("dialogues", dialogues_key, transcribe, "transcribe")
 
-        print("\n=== 重新构建人物列表 ===")
-        # 重新生成 people（避免仍然是旧名字）
-        metadata.people = []
-        seen = set()
+    def face_db_stage(media, shots=None):
+        if cache_only or not build_faces:
+            return None     # 人物库已在磁盘上（face_db.json），说话人阶段直接读取
+        from utils.face_db_utils import build_face_database
+        try:
+            return build_face_database(
+                video_path, interval=face_interval, threshold=face_threshold, output_dir=output_dir,
+                shots=shots if use_shots else None, frames=media["faces"],
+            )
+        finally:
+            if media["faces"] is not None:
+                media["faces"].close()      # 不再取帧，单次读取继续为其他消费者解码
 
-        for dlg in metadata.dialogues:
-            if dlg.speaker not in seen and dlg.speaker != "未知":
-                from video_metadata import Person
-                metadata.people.append(Person(dlg.speaker, "未知"))
-                seen.add(dlg.speaker)
+    def llm_stage(dialogues):
+        return fetch("llm", llm_key, lambda: analyze_video_stage(dialogues), "analyze")
 
-        metadata.save_to_json(output_path)
+    def speakers_stage(dialogues, face_db):
+        if not Path(db_path).exists():
+            return ["未知"] * len(dialogues)
 
-        print(f"\n✅ 快速更新完成：{output_path}")
+        # 人物库（包括人工校正的名字）变化时重新绑定说话人；
+        # 台词采样帧的人脸只检测一次（见 get_speaker_store），之后只是查表
+        speakers_key = cache.key(
+            "speakers", dialogues_key, file_hash(db_path), file_hash(emb_path),
+            samples=SAMPLES_PER_DIALOGUE, max_gap=STORE_MAX_GAP, threshold=speaker_threshold,
+        )
 
-    else:
-        print("❌ 输入错误")
+        def assign():
+            from utils.speaker_utils import assign_speakers_from_store, get_speaker_store
+            store = get_speaker_store(video_path, dialogues, SAMPLES_PER_DIALOGUE, cache=cache)
+            labelled = assign_speakers_from_store(store, dialogues, threshold=speaker_threshold, output_dir=output_dir)
+            return [d.speaker for d in labelled]
 
+        return fetch("speakers", speakers_key, assign, "label-speakers")
 
-if __name__ == "__main__":
-    if len(sys.argv) < 2:
-        print("用法: python main.py video.mp4")
-        sys.exit(1)
+    def metadata_stage(media, dialogues, llm_result, shots):
+        from utils.builder_utils import build_metadata
+        return build_metadata(media["duration"], dialogues, llm_result, shots)
+
+    # 各阶段输入输出显式声明，互不依赖的阶段并发执行：
+    # 后台单次读取视频（时长 / 音频 / 镜头 / 人脸采样帧），台词识别和人脸检测边解码边进行，剧情分析等台词完成后开始
+    # 只有采样时间点要等这一遍的结果才知道的读取仍然单独 seek（见 FrameSampler，只解码采样点附近的帧）：
+    # 按镜头采样人脸（要等镜头检测）、人物代表图（要等聚类）、说话人采样帧（要等台词）
+    stages = [
+        Stage("media", media_stage),
+        Stage("dialogues", dialogues_stage, deps=("media",)),
+        Stage("shots", shots_stage, deps=("media",)),
+        # 按镜头采样时人脸库要等整遍解码（镜头检测）结束；默认按固定间隔从单次读取里取帧，立即开始
+        Stage("face_db", face_db_stage,
+              deps=("media", "shots") if use_shots and build_faces and not cache_only else ("media",)),
+        Stage("llm_result", llm_stage, deps=("dialogues",)),
+        Stage("speakers", speakers_stage, deps=("dialogues", "face_db")),
+        Stage("metadata", metadata_stage, deps=("media", "dialogues", "llm_result", "shots")),
+    ]
+    stages = select_stages(stages, targets)
+    needed = {s.name for s in stages}
+    return stages
+
+
+def save_metadata(metadata, speakers, output_path):
+    from video_metadata import DialogueTable, Person, ShotTable
+
+    # 列式表：改说话人只是改编号列，建索引和写 .vmd 都直接用列，不再逐条转换
+    # （台词识别阶段已经直接产出 DialogueTable；旧缓存里的列表在这里转换）
+    metadata.shots = ShotTable.from_shots(metadata.shots)
+    if not isinstance(metadata.dialogues, DialogueTable):
+        metadata.dialogues = DialogueTable.from_dialogues(metadata.dialogues)
+    index = metadata.build_index()
+    for i, speaker in enumerate(speakers):
+        index.set_speaker(i, speaker)     # 同步增量更新说话人索引
+
+    # 补充识别出的说话人（LLM 未列出的人物），按首次出场顺序
+    seen = {p.name for p in metadata.people}
+    for name in sorted(index.speakers, key=lambda n: index.speakers[n].start):
+        if name not in seen and name != "未知":
+            metadata.people.append(Person(name, "未知"))
+            seen.add(name)
+
+    metadata.save_to_json(output_path)
+    metadata.save_to_binary(output_path.with_suffix(".vmd"))   # 列式二进制，供下游快速加载
+
+
+def run(video_path, command="all", output_dir=config.OUTPUT_DIR, on_stage=None, **options):
+    """
+    执行一个子命令（见 COMMANDS）需要的阶段；build / all 写出元数据文件并返回其路径
+    options: 传给 pipeline_stages 的阈值等参数
+    """
+    from utils.metrics_utils import METRICS_DIR, METRICS_PREFIX, Trace, set_trace
+    from utils.pipeline_utils import run_stages
+
+    stem = Path(video_path).stem
+    output_path = Path(output_dir) / (stem + "_metadata.json")
+    output_path.parent.mkdir(parents=True, exist_ok=True)
+
+    # 本次运行的结构化记录：<视频名>_trace.json + Prometheus textfile（METRICS_DIR 或输出目录）
+    # textfile 所有运行共用一个（视频名只在 JSON 里），计数在其中累加
+    trace = set_trace(Trace(labels={"video": stem, "command": command}, profile_dir=output_dir))
+    try:
+        stages = pipeline_stages(
+            video_path, output_dir, targets=COMMANDS[command], cache_only=(command == "build"),
+            build_faces=(command in BUILD_FACES_COMMANDS), **options
+        )
+        results = run_stages(stages, on_event=on_stage)
 
-    main(sys.argv[1])
+        if "metadata" not in results:
+            print(f"\n✅ {command} 完成")
+            return None
+
+        with trace.stage("save"):
+            save_metadata(results["metadata"], results["speakers"], output_path)
+        print(f"\n✅ 全流程完成：{output_path}")
+        return output_path
+    finally:
+        trace.write(
+            Path(output_dir) / f"{stem}_trace.json",
+            Path(METRICS_DIR or output_dir) / f"{METRICS_PREFIX}.prom",
+        )
+
+
+def main(video_path: str, output_dir=config.OUTPUT_DIR, on_stage=None):
+    """
+    全流程（batch.py 调用）
+    output_dir: 本视频的输出目录（批量运行时每个视频一个）
+    on_stage: 阶段状态回调，见 run_stages
+    """
+    return run(video_path, "all", output_dir=output_dir, on_stage=on_stage)
+
+
+def cli(argv=None):
+    parser = argparse.ArgumentParser(
+        description="视频 → 结构化元数据（参数默认值见 config.py，可用同名环境变量覆盖）"
+    )
+    sub = parser.add_subparsers(dest="command", required=True)
+    for name, text in COMMAND_HELP.items():
+        p = sub.add_parser(name, help=text, description=text)
+        p.add_argument("video", help="视频路径")
+        p.add_argument("--out", default=config.OUTPUT_DIR, help="输出目录")
+        if name in ("faces", "all"):
+            p.add_argument("--face-interval", type=float, default=config.FACE_INTERVAL, help="人脸抽帧间隔（秒）")
+            p.add_argument("--face-threshold", type=float, default=config.FACE_THRESHOLD, help="人脸聚类阈值")
+            p.add_argument("--shots", dest="use_shots", action=argparse.BooleanOptionalAction,
+                           default=config.USE_SHOTS,
+                           help="人脸按镜头采样（需等镜头检测解码完整个视频；默认按固定间隔稀疏读取）")
+        if name in ("label-speakers", "build", "all"):
+            p.add_argument("--speaker-threshold", type=float, default=config.SPEAKER_THRESHOLD,
+                           help="说话人匹配阈值")
+
+    # 兼容旧用法：python main.py video.mp4 等同于 all
+    argv = sys.argv[1:] if argv is None else list(argv)
+    if argv and argv[0] not in COMMANDS and not argv[0].startswith("-"):
+        argv.insert(0, "all")
+    args = parser.parse_args(argv)
+
+    options = {
+        k: getattr(args, k)
+        for k in ("face_interval", "face_threshold", "use_shots", "speaker_threshold")
+        if hasattr(args, k)
+    }
+    run(args.video, args.command, output_dir=args.out, **options)
+
+
+if __name__ == "__main__":
+    cli()
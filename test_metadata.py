@@ -1,13 +1,16 @@
+"""
+手动冒烟脚本：对一个真实视频构建人物库（需要 face_recognition 等全部依赖）
+用法: python test_metadata.py [视频路径，默认 input.mp4]
+单元测试见 tests/（pytest 只收集 tests/ 目录）
+"""
 import sys
-from pathlib import Path
 
-from utils.video_utils import get_video_duration
-from utils.asr_utils import transcribe_video
-from utils.llm_utils import analyze_video
-from utils.builder_utils import build_metadata
-from utils.face_db_utils import build_face_database
-from utils.speaker_utils import assign_speakers
 
+def main(video_path="input.mp4"):
+    from utils.face_db_utils import build_face_database
 
+    build_face_database(video_path)
 
-build_face_database("input.mp4")
+
+if __name__ == "__main__":
+    main(*sys.argv[1:])
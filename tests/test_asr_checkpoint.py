@@ -0,0 +1,194 @@
+import json
+import pickle
+import sys
+from types import ModuleType, SimpleNamespace
+
+import numpy as np
+import pytest
+
+from utils import asr_utils
+from utils.asr_utils import SAMPLE_RATE, iter_audio_windows, iter_dialogues, load_dialogues_jsonl, split_on_silence
+from video_metadata import DialogueTable
+
+AUDIO = np.zeros(30 * SAMPLE_RATE, dtype=np.float32)
+
+
+class FakeASR:
+    """10 秒一个窗口（切点在静音处），每 2 秒一句；共识别 crash_after 句之后抛异常模拟中断"""
+
+    def __init__(self, monkeypatch, crash_after=None):
+        self.crash_after = crash_after
+        self.calls = 0
+        self.emitted = 0
+        monkeypatch.setattr(asr_utils, "get_model", lambda *a, **k: None)
+        monkeypatch.setattr(asr_utils, "run_asr", self.run)
+        monkeypatch.setattr(asr_utils, "CHECKPOINT_SECONDS", 0)      # 每个窗口都落检查点
+        monkeypatch.setattr(asr_utils, "WINDOW_SECONDS", 10)
+        # 假 VAD：窗口末尾的搜索区间正中间是静音，即正好在 10 秒处切开
+        monkeypatch.setattr(asr_utils, "split_on_silence", lambda audio, n: [0, len(audio) // 2, len(audio)])
+
+    def run(self, audio, model=None, batch_size=None):
+        self.calls += 1
+        for k in range(int(len(audio) / SAMPLE_RATE) // 2):
+            if self.crash_after is not None and self.emitted >= self.crash_after:
+                raise RuntimeError("中断")
+            self.emitted += 1
+            yield SimpleNamespace(start=k * 2.0, end=k * 2.0 + 1.0, text=f" 第{k}句 ")
+
+
+def test_resume_from_checkpoint(tmp_path, monkeypatch):
+    sidecar = tmp_path / "video_dialogues.jsonl"
+
+    # 第二个窗口识别到一半中断：检查点停在第一个窗口的终点（静音切点），不在半个窗口处
+    FakeASR(monkeypatch, crash_after=7)
+    with pytest.raises(RuntimeError):
+        list(iter_dialogues("video.mp4", sidecar, audio=AUDIO, resume_key="k"))
+    ckpt = json.loads(sidecar.with_name(sidecar.name + ".ckpt").read_text())
+    assert not ckpt["done"] and ckpt["count"] == 5 and ckpt["offset"] == pytest.approx(10.0)
+
+    fake = FakeASR(monkeypatch)
+    dialogues = list(iter_dialogues("video.mp4", sidecar, audio=AUDIO, resume_key="k"))
+    restored, resumed = dialogues[:5], dialogues[5:]
+    assert [d.text for d in restored] == [f"第{k}句" for k in range(5)]
+    assert resumed[0].start_time == pytest.approx(10.0)     # 从窗口终点续跑，中断窗口里已写出的两句被丢弃重识别
+    assert [d.start_time for d in dialogues] == [k * 2.0 for k in range(15)]
+    assert load_dialogues_jsonl(sidecar) == dialogues
+
+    # 已完成：直接读取，不再识别
+    calls = fake.calls
+    assert list(iter_dialogues("video.mp4", sidecar, audio=AUDIO, resume_key="k")) == dialogues
+    assert fake.calls == calls
+
+
+def test_transcribe_video_builds_table(tmp_path, monkeypatch):
+    FakeASR(monkeypatch)
+    table = asr_utils.transcribe_video("video.mp4", audio=AUDIO, output_dir=tmp_path, resume_key="k")
+
+    assert isinstance(table, DialogueTable)
+    assert table.to_dialogues() == load_dialogues_jsonl(tmp_path / "video_dialogues.jsonl")
+    assert pickle.loads(pickle.dumps(table)).to_dialogues() == table.to_dialogues()     # 可直接写入阶段缓存
+
+
+def test_different_key_starts_over(tmp_path, monkeypatch):
+    sidecar = tmp_path / "video_dialogues.jsonl"
+    FakeASR(monkeypatch, crash_after=7)
+    with pytest.raises(RuntimeError):
+        list(iter_dialogues("video.mp4", sidecar, audio=AUDIO, resume_key="k1"))
+
+    FakeASR(monkeypatch)
+    dialogues = list(iter_dialogues("video.mp4", sidecar, audio=AUDIO, resume_key="k2"))
+    assert [d.start_time for d in dialogues] == [k * 2.0 for k in range(15)]
+
+
+def test_audio_windows_cover_stream_exactly(monkeypatch):
+    # 假 VAD：窗口末尾的搜索区间正中间是静音
+    monkeypatch.setattr(asr_utils, "split_on_silence", lambda audio, n: [0, len(audio) // 2, len(audio)])
+    chunks = [np.random.default_rng(i).random(1234).astype(np.float32) for i in range(200)]
+
+    windows = list(iter_audio_windows(iter(chunks), skip_seconds=1.0, window_seconds=3))
+
+    assert np.array_equal(np.concatenate([w.audio for w in windows]), np.concatenate(chunks)[SAMPLE_RATE:])
+    position = 1.0
+    for w in windows:
+        assert w.offset == w.keep_from == pytest.approx(position)
+        position += len(w.audio) / SAMPLE_RATE
+        assert w.keep_until == w.next_offset == pytest.approx(position)
+
+
+def fake_speech_timestamps(audio, vad_options=None):
+    """与 faster_whisper.vad.get_speech_timestamps 同样的输出：非零采样的连续段 [{"start", "end"}, ...]"""
+    voiced = np.concatenate([[0], (audio != 0).astype(np.int8), [0]])
+    edges = np.flatnonzero(np.diff(voiced))
+    return [{"start": int(a), "end": int(b)} for a, b in zip(edges[::2], edges[1::2])]
+
+
+@pytest.fixture
+def fake_vad(monkeypatch):
+    vad = ModuleType("faster_whisper.vad")
+    vad.VadOptions = lambda **kwargs: kwargs
+    vad.get_speech_timestamps = fake_speech_timestamps
+    package = ModuleType("faster_whisper")
+    package.vad = vad
+    monkeypatch.setitem(sys.modules, "faster_whisper", package)
+    monkeypatch.setitem(sys.modules, "faster_whisper.vad", vad)
+
+
+def test_split_on_silence_uses_leading_and_trailing_silence(fake_vad):
+    audio = np.zeros(10 * SAMPLE_RATE, dtype=np.float32)
+    audio[2 * SAMPLE_RATE:9 * SAMPLE_RATE] = 1.0      # 只有一段话，前后是静音：没有两段语音之间的间隙
+
+    assert split_on_silence(audio, 2) == [0, SAMPLE_RATE, len(audio)]
+    audio[:] = 1.0      # 一直在说话：找不到切点
+    assert split_on_silence(audio, 2) == [0, len(audio)]
+
+
+def test_split_on_silence_picks_gap_nearest_target(fake_vad):
+    audio = np.ones(10 * SAMPLE_RATE, dtype=np.float32)
+    audio[3 * SAMPLE_RATE:4 * SAMPLE_RATE] = 0.0
+    audio[6 * SAMPLE_RATE:8 * SAMPLE_RATE] = 0.0
+
+    assert split_on_silence(audio, 2) == [0, 3 * SAMPLE_RATE + SAMPLE_RATE // 2, len(audio)]
+
+
+class ContinuousSpeechASR:
+    """
+    一直在说话的音频（采样值为全片采样序号），每 3 秒一句、每句 2.5 秒；
+    只把窗口内的部分识别出来（被窗口边界截断的句子也会输出半句），和真实模型一样
+    """
+
+    def __init__(self, monkeypatch):
+        monkeypatch.setattr(asr_utils, "get_model", lambda *a, **k: None)
+        monkeypatch.setattr(asr_utils, "run_asr", self.run)
+        monkeypatch.setattr(asr_utils, "CHECKPOINT_SECONDS", 0)
+        monkeypatch.setattr(asr_utils, "WINDOW_SECONDS", 10)
+
+    @staticmethod
+    def audio(seconds):
+        return np.arange(1, seconds * SAMPLE_RATE + 1, dtype=np.float32)
+
+    def run(self, audio, model=None, batch_size=None):
+        begin = (float(audio[0]) - 1) / SAMPLE_RATE
+        end = begin + len(audio) / SAMPLE_RATE
+        for k in range(int(end // 3) + 1):
+            start, stop = max(k * 3.0, begin), min(k * 3.0 + 2.5, end)
+            if start < stop:
+                yield SimpleNamespace(start=start - begin, end=stop - begin, text=f"第{k}句")
+
+
+def test_hard_cut_windows_overlap_without_duplicates(tmp_path, monkeypatch, fake_vad):
+    ContinuousSpeechASR(monkeypatch)
+    audio = ContinuousSpeechASR.audio(42)
+    windows = list(iter_audio_windows([audio]))
+    assert len(windows) > 2
+    for a, b in zip(windows, windows[1:]):
+        assert b.offset < a.offset + len(a.audio) / SAMPLE_RATE     # 硬切：相邻窗口有重叠
+        assert a.keep_until == b.keep_from and a.next_offset == b.offset
+
+    dialogues = list(iter_dialogues("video.mp4", tmp_path / "d.jsonl", audio=audio))
+    assert [(d.text, d.start_time, d.end_time) for d in dialogues] == [
+        (f"第{k}句", k * 3.0, k * 3.0 + 2.5) for k in range(14)
+    ]
+
+
+def test_resume_at_hard_cut_starts_in_overlap(tmp_path, monkeypatch, fake_vad):
+    sidecar = tmp_path / "video_dialogues.jsonl"
+    fake = ContinuousSpeechASR(monkeypatch)
+    audio = ContinuousSpeechASR.audio(42)
+    expected = list(iter_dialogues("video.mp4", None, audio=audio))
+
+    run, calls = fake.run, []
+
+    def crash_on_second_window(*args, **kwargs):
+        calls.append(1)
+        if len(calls) == 2:
+            raise RuntimeError("中断")
+        return run(*args, **kwargs)
+
+    monkeypatch.setattr(asr_utils, "run_asr", crash_on_second_window)
+    with pytest.raises(RuntimeError):
+        list(iter_dialogues("video.mp4", sidecar, audio=audio, resume_key="k"))
+    ckpt = json.loads(sidecar.with_name(sidecar.name + ".ckpt").read_text())
+    assert ckpt["audio_offset"] < ckpt["offset"]
+
+    monkeypatch.setattr(asr_utils, "run_asr", run)
+    assert list(iter_dialogues("video.mp4", sidecar, audio=audio, resume_key="k")) == expected
@@ -0,0 +1,70 @@
+import os
+import time
+
+import numpy as np
+
+from utils.cache_utils import ArtifactCache
+
+
+def test_put_get_roundtrip(tmp_path):
+    cache = ArtifactCache(tmp_path)
+    key = cache.key("audio", "video", sample_rate=16000)
+
+    cache.put("audio", key, np.arange(5, dtype=np.float32))
+    cache.put("dialogues", key, [{"text": "你好"}])
+
+    assert np.array_equal(cache.get("audio", key), np.arange(5, dtype=np.float32))
+    assert cache.get("dialogues", key) == [{"text": "你好"}]
+    assert cache.exists("audio", key)
+    assert cache.get("missing", key, "default") == "default"
+    assert not list(tmp_path.rglob("*.tmp"))     # 临时文件都已原子替换
+
+
+def test_key_depends_on_params():
+    assert ArtifactCache.key("shots", "v", threshold=0.5) != ArtifactCache.key("shots", "v", threshold=0.6)
+    assert ArtifactCache.key("shots", "v", threshold=0.5) == ArtifactCache.key("shots", "v", threshold=0.5)
+
+
+def test_get_or_compute_only_computes_once(tmp_path):
+    cache = ArtifactCache(tmp_path)
+    calls = []
+
+    def compute():
+        calls.append(1)
+        return {"value": 1}
+
+    assert cache.get_or_compute("stage", "k", compute) == {"value": 1}
+    assert cache.get_or_compute("stage", "k", compute) == {"value": 1}
+    assert len(calls) == 1
+
+
+def test_evict_removes_least_recently_used(tmp_path):
+    cache = ArtifactCache(tmp_path, max_bytes=10**9)
+    for i in range(3):
+        cache.put("audio", f"k{i}", np.zeros(1000, dtype=np.float64))
+        old = time.time() - 100 + i
+        os.utime(tmp_path / "audio" / f"k{i}.npy", (old, old))
+    cache.get("audio", "k0")        # 读取刷新最近使用时间
+
+    cache.max_bytes = 2 * 8200      # 只放得下两个
+    cache.evict()
+
+    assert cache.exists("audio", "k0")
+    assert not cache.exists("audio", "k1")
+    assert cache.exists("audio", "k2")
+
+
+def test_evict_skips_leased_directories(tmp_path):
+    cache = ArtifactCache(tmp_path, max_bytes=10**9)
+    leased, free = cache.artifact_dir("face_store", "a"), cache.artifact_dir("face_store", "b")
+    for path in (leased, free):
+        path.mkdir(parents=True)
+        (path / "data.bin").write_bytes(b"x" * 4096)
+    (free / ".lease-999999999").write_text("")     # 持有者已退出的租约
+
+    cache.lease(leased)
+    cache.max_bytes = 0
+    cache.evict()
+
+    assert leased.exists()
+    assert not free.exists()
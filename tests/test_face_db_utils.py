@@ -0,0 +1,76 @@
+import json
+
+import cv2
+import numpy as np
+import pytest
+
+from utils.face_db_utils import UNLABELLED_PREFIX, carry_over_names, extract_crops, save_face_embeddings
+
+SHARP_FRAMES = {10, 30}     # 人脸区域是高频纹理的帧，其余帧是纯色
+
+
+@pytest.fixture(scope="module")
+def video(tmp_path_factory):
+    path = str(tmp_path_factory.mktemp("crops") / "video.mp4")
+    writer = cv2.VideoWriter(path, cv2.VideoWriter_fourcc(*"mp4v"), 25, (160, 120))
+    rng = np.random.default_rng(0)
+    for i in range(40):
+        frame = np.full((120, 160, 3), 128, dtype=np.uint8)
+        if i in SHARP_FRAMES:
+            frame[20:80, 40:100] = rng.integers(0, 2, (60, 60, 1), dtype=np.uint8) * 255
+        writer.write(frame)
+    writer.release()
+    return path
+
+
+def test_extract_crops_keeps_sharpest_faces(video):
+    frame_indices = [0, 10, 20, 30, 5, 6]
+    face_boxes = [(20, 100, 80, 40)] * 4 + [(-10, 200, 50, 100), (130, 40, 150, 10)]     # 后两个越界
+    clusters = [{"indices": [0, 1, 2, 3]}, {"indices": [4]}, {"indices": [5]}]
+
+    crops = extract_crops(video, clusters, frame_indices, face_boxes, top_k=2)
+
+    assert len(crops[0]) == 2
+    scores = [score for score, _ in crops[0]]
+    assert scores == sorted(scores, reverse=True)
+    assert all(img.shape == (60, 60, 3) for _, img in crops[0])
+    assert min(img.std() for _, img in crops[0]) > 50          # 两张都来自有纹理的帧
+    assert crops[1][0][1].shape == (50, 60, 3)                 # 部分越界：裁到画面内
+    assert crops[2] == []                                      # 完全在画面外：跳过
+
+
+def test_extract_crops_limits_candidates_by_area(video):
+    frame_indices = [10, 30, 0]
+    face_boxes = [(20, 50, 40, 40), (20, 60, 50, 40), (0, 160, 120, 0)]
+    crops = extract_crops(video, [{"indices": [0, 1, 2]}], frame_indices, face_boxes, top_k=3, candidates=1)
+    assert [img.shape for _, img in crops[0]] == [(120, 160, 3)]     # 只读面积最大的候选
+
+
+def make_old_db(tmp_path, names):
+    centers = [np.eye(128, dtype=np.float32)[i] for i in range(len(names))]
+    clusters = [{"center": c, "members": [c, c]} for c in centers]
+    db_path, emb_path = str(tmp_path / "face_db.json"), str(tmp_path / "face_db.npz")
+    save_face_embeddings(clusters, emb_path)
+    with open(db_path, "w", encoding="utf-8") as f:
+        json.dump({str(i): {"name": name} for i, name in enumerate(names)}, f, ensure_ascii=False)
+    return db_path, emb_path, centers
+
+
+def test_carry_over_names_keeps_labelled_only(tmp_path):
+    db_path, emb_path, old = make_old_db(tmp_path, ["张三", f"{UNLABELLED_PREFIX}1", "李四"])
+    new = [
+        {"center": old[2] + 0.01},      # 李四
+        {"center": old[1]},             # 未校正：不沿用默认名字
+        {"center": old[0] * 0.9},       # 张三
+        {"center": np.eye(128, dtype=np.float32)[5]},     # 新人物
+    ]
+    assert carry_over_names(new, db_path, emb_path, threshold=0.45) == {0: "李四", 2: "张三"}
+
+
+def test_carry_over_names_without_old_db(tmp_path):
+    clusters = [{"center": np.zeros(128, dtype=np.float32)}]
+    assert carry_over_names(clusters, str(tmp_path / "face_db.json"), str(tmp_path / "face_db.npz")) == {}
+
+    db_path, emb_path, _ = make_old_db(tmp_path, [f"{UNLABELLED_PREFIX}0"])
+    assert carry_over_names(clusters, db_path, emb_path) == {}
+    assert carry_over_names([], db_path, emb_path) == {}
@@ -0,0 +1,77 @@
+import json
+
+import pytest
+
+import face_label_web
+
+
+@pytest.fixture
+def client(tmp_path):
+    (tmp_path / "faces" / "thumbs").mkdir(parents=True)
+    db = {}
+    for pid in range(1, 6):
+        name = f"人物_{pid}" if pid == 1 else f"{face_label_web.UNLABELLED_PREFIX}{pid}"
+        db[str(pid)] = {
+            "name": name,
+            "count": pid * 10,
+            "image": f"faces/person_{pid}.jpg",
+            "thumb": f"faces/thumbs/person_{pid}.jpg",
+        }
+        (tmp_path / db[str(pid)]["thumb"]).write_bytes(b"thumb %d" % pid)
+    (tmp_path / "face_db.json").write_text(json.dumps(db, ensure_ascii=False), encoding="utf-8")
+
+    face_label_web.set_output_dir(str(tmp_path))
+    return face_label_web.app.test_client()
+
+
+def test_list_filters_sorts_and_paginates(client):
+    data = client.get("/api/faces?status=unlabelled&sort=count&per_page=2&page=2").get_json()
+    assert data["total"] == 4
+    assert [item["id"] for item in data["items"]] == ["3", "2"]
+
+
+@pytest.mark.parametrize("query, page, per_page", [
+    ("per_page=0", 1, 1),
+    ("per_page=-5", 1, 1),
+    ("per_page=100000", 1, face_label_web.MAX_PER_PAGE),
+    ("page=0", 1, face_label_web.PER_PAGE),
+    ("page=-3&per_page=2", 1, 2),
+])
+def test_pagination_args_are_clamped(client, query, page, per_page):
+    data = client.get(f"/api/faces?{query}").get_json()
+    assert (data["page"], data["per_page"]) == (page, per_page)
+    assert data["items"]
+    assert client.get(f"/?{query}").status_code == 200
+
+
+def test_thumb_supports_conditional_get(client):
+    first = client.get("/thumb/1")
+    assert first.status_code == 200
+    assert first.headers["ETag"]
+    assert "max-age" in first.headers["Cache-Control"]
+
+    again = client.get("/thumb/1", headers={"If-None-Match": first.headers["ETag"]})
+    assert again.status_code == 304
+    assert client.get("/thumb/99").status_code == 404
+
+
+def test_patch_updates_names(client, tmp_path):
+    resp = client.patch("/api/faces", json={"2": {"name": " 张三 "}, "99": {"name": "无此人"}})
+    assert resp.get_json() == {"changed": 1}
+
+    assert client.patch("/api/faces/3", json={"name": "李四"}).get_json() == {"changed": 1}
+    db = json.loads((tmp_path / "face_db.json").read_text(encoding="utf-8"))
+    assert (db["2"]["name"], db["3"]["name"]) == ("张三", "李四")
+
+
+@pytest.mark.parametrize("url, body, status", [
+    ("/api/faces", ["not", "a", "dict"], 400),
+    ("/api/faces", {"2": "张三"}, 400),
+    ("/api/faces", {"2": {"name": 123}}, 400),
+    ("/api/faces/2", "张三", 400),
+    ("/api/faces/99", {"name": "无此人"}, 404),
+])
+def test_patch_rejects_bad_input(client, tmp_path, url, body, status):
+    before = (tmp_path / "face_db.json").read_text(encoding="utf-8")
+    assert client.patch(url, json=body).status_code == status
+    assert (tmp_path / "face_db.json").read_text(encoding="utf-8") == before
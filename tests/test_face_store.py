@@ -0,0 +1,61 @@
+import numpy as np
+import pytest
+
+from utils.face_store_utils import FaceStore, build_face_store
+
+FPS = 10.0
+
+
+def frame_results(n_frames, fail_after=None):
+    """每隔 5 帧分析一次，偶数次有一张人脸；fail_after 帧之后抛异常模拟中断"""
+    calls = []
+
+    def frames(after_frame):
+        calls.append(after_frame)
+        for frame_idx in range(0, n_frames, 5):
+            if frame_idx <= after_frame:
+                continue
+            if fail_after is not None and frame_idx > fail_after:
+                raise RuntimeError("中断")
+            faces = [(np.full(128, frame_idx, dtype=np.float32), (1, 2, 3, 4))] if frame_idx % 10 == 0 else []
+            yield frame_idx, faces
+    return frames, calls
+
+
+def test_build_and_query(tmp_path):
+    frames, _ = frame_results(100)
+    store = build_face_store(tmp_path / "store", frames, FPS)
+
+    assert FaceStore.exists(tmp_path / "store")
+    assert list(store.frames) == list(range(0, 100, 5))
+    assert list(store.face_frames) == list(range(0, 100, 10))
+    assert len(store) == 10
+    assert store.encodings.shape == (10, 128)
+    assert store.boxes[0].tolist() == [1, 2, 3, 4]
+
+    rows = store.faces_between(2.0, 4.0)       # 帧 20、30
+    assert list(store.face_frames[rows]) == [20, 30]
+    assert list(store.frames_between(2.0, 3.0)) == [20, 25]
+    assert store.nearest_frame(2.6) == (25, pytest.approx(0.1))
+
+
+def test_resume_after_interruption(tmp_path):
+    path = tmp_path / "store"
+    frames, _ = frame_results(100, fail_after=60)
+    with pytest.raises(RuntimeError):
+        build_face_store(path, frames, FPS, flush_frames=2)
+    assert not FaceStore.exists(path)
+
+    frames, calls = frame_results(100)
+    store = build_face_store(path, frames, FPS, flush_frames=2)
+
+    assert calls[0] >= 50        # 从检查点之后继续，不再分析前面的帧
+    assert list(store.frames) == list(range(0, 100, 5))
+    assert list(store.face_frames) == list(range(0, 100, 10))
+    assert store.encodings[:, 0].tolist() == list(range(0, 100, 10))
+
+
+def test_empty_store(tmp_path):
+    store = build_face_store(tmp_path / "store", lambda after: iter(()), FPS)
+    assert len(store) == 0
+    assert store.nearest_frame(1.0) == (None, float("inf"))
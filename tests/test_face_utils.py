@@ -0,0 +1,87 @@
+import sys
+
+import numpy as np
+import pytest
+
+from benchmarks.synthetic import make_video
+
+# 替身 face_recognition：结果只取决于帧内容，部分帧没有人脸；
+# 写成真实模块放到 sys.path 上，spawn 出来的检测进程也能导入
+FAKE_FACE_RECOGNITION = '''
+import numpy as np
+
+
+def face_locations(img, model="hog"):
+    if int(img[40:50, 40:50].sum()) % 3 == 0:
+        return []
+    return [(10, 60, 60, 10)]
+
+
+def face_encodings(img, known_face_locations=None):
+    rows = np.array_split(img.astype(np.float64), 128, axis=1)
+    return [np.array([r.mean() / 255 for r in rows]) for _ in known_face_locations]
+'''
+
+
+@pytest.fixture
+def fake_face_recognition(tmp_path, monkeypatch):
+    (tmp_path / "face_recognition.py").write_text(FAKE_FACE_RECOGNITION, encoding="utf-8")
+    monkeypatch.syspath_prepend(str(tmp_path))
+    monkeypatch.delitem(sys.modules, "face_recognition", raising=False)
+
+
+@pytest.fixture(scope="module")
+def video(tmp_path_factory):
+    return make_video(tmp_path_factory.mktemp("faces") / "video.mp4", seconds=6, size=(320, 180))
+
+
+def test_parallel_matches_serial(video, fake_face_recognition):
+    from utils.face_utils import extract_faces
+
+    serial = extract_faces(video, interval=0.2)
+    parallel = extract_faces(video, interval=0.2, workers=2)
+
+    encodings, frame_indices, boxes = serial
+    assert 0 < len(frame_indices) < 30         # 有的帧没有人脸
+    assert parallel[1] == frame_indices and parallel[2] == boxes
+    assert np.array_equal(np.asarray(parallel[0]), np.asarray(encodings))
+
+
+def test_online_clusterer_matches_identities():
+    from benchmarks.synthetic import make_embeddings
+    from utils.face_utils import OnlineFaceClusterer
+
+    X, truth = make_embeddings(n_people=20, n_faces=4000, n_noise=0)
+    clusterer = OnlineFaceClusterer(threshold=0.45, reservoir_size=8)
+    for i, enc in enumerate(X):
+        clusterer.add(enc, index=i)
+    clusters, labels = clusterer.finalize()
+
+    assert len(clusters) == 20
+    for c in range(len(clusters)):
+        assert len(set(truth[labels == c])) == 1     # 每簇只含一个人
+    assert sum(c["count"] for c in clusters) == len(X)
+    assert [c["count"] for c in clusters] == np.bincount(labels).tolist()
+
+    for c, cluster in enumerate(clusters):
+        assert len(cluster["indices"]) == len(cluster["members"]) <= 8     # 样本数有界
+        assert all(labels[i] == c for i in cluster["indices"])
+        assert np.allclose(cluster["center"], X[labels == c].mean(axis=0))
+        assert np.allclose(cluster["members"], X[cluster["indices"]], atol=1e-6)
+
+
+def test_online_clusterer_merges_close_centers():
+    from utils.face_utils import OnlineFaceClusterer
+
+    a = np.zeros(128)
+    b = a.copy()
+    b[0] = 0.6              # 与 a 距离超过阈值：先各自成簇
+    mid = a.copy()
+    mid[0] = 0.3
+
+    clusterer = OnlineFaceClusterer(threshold=0.5)
+    assert [clusterer.add(x) for x in (a, b, mid, mid, mid)] == [0, 1, 0, 0, 0]     # 中心逐渐向 b 靠拢
+    clusters, labels = clusterer.finalize()
+
+    assert len(clusters) == 1 and labels.tolist() == [0] * 5
+    assert clusters[0]["count"] == 5
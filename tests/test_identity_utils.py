@@ -0,0 +1,64 @@
+import numpy as np
+import pytest
+
+from benchmarks.synthetic import make_embeddings
+from utils.identity_utils import IdentityIndex, pairwise_distances
+
+
+@pytest.fixture(scope="module")
+def known():
+    X, labels = make_embeddings(n_people=40, n_faces=3000, n_noise=0)
+    return X.astype(np.float32), [f"人物{i}" for i in labels]
+
+
+def test_pairwise_distances_matches_naive():
+    rng = np.random.default_rng(0)
+    A, B = rng.normal(size=(5, 128)), rng.normal(size=(7, 128))
+    naive = np.linalg.norm(A[:, None] - B[None], axis=2)
+    assert np.allclose(pairwise_distances(A, B), naive, atol=1e-6)
+
+
+def test_exact_search_sorted_top_k(known):
+    X, names = known
+    index = IdentityIndex(X, names, mode="exact")
+    hits = index.search(X[:3], k=4)
+
+    for q, row in zip(X[:3], hits):
+        dists = [d for _, d in row]
+        assert dists == sorted(dists) and len(row) == 4
+        assert row[0] == (names[int(np.argmin(np.linalg.norm(X - q, axis=1)))], pytest.approx(0.0, abs=1e-3))
+
+
+def test_ivf_recall_against_exact(known):
+    X, names = known
+    queries = X[::30] + np.random.default_rng(1).normal(0, 0.01, size=X[::30].shape).astype(np.float32)
+
+    exact = IdentityIndex(X, names, mode="exact").search(queries, k=1)
+    ivf = IdentityIndex(X, names, mode="ivf", nprobe=4)
+    approx = ivf.search(queries, k=1)
+
+    same_name = np.mean([a[0][0] == b[0][0] for a, b in zip(exact, approx)])
+    assert same_name >= 0.99
+    assert all(b[0][1] >= a[0][1] - 1e-5 for a, b in zip(exact, approx))    # 近似结果不会比精确结果更近
+
+
+def test_auto_mode_and_threshold(known, monkeypatch):
+    X, names = known
+    from utils import identity_utils
+
+    assert IdentityIndex(X[:100], names[:100]).mode == "exact"
+    monkeypatch.setattr(identity_utils, "ANN_MIN_SIZE", 100)
+    assert IdentityIndex(X[:100], names[:100]).mode == "ivf"
+
+    index = IdentityIndex(X, names, mode="exact")
+    far = np.full((1, 128), 10.0, dtype=np.float32)
+    assert index.search(far, k=1, threshold=0.5) == [[]]
+    assert index.best(np.concatenate([far, X[:1]]), threshold=0.5) == (names[0], pytest.approx(0.0, abs=1e-3))
+    assert index.best(far) == (None, float("inf"))
+
+
+def test_empty_inputs():
+    index = IdentityIndex(np.zeros((0, 128)), [])
+    assert index.search(np.zeros((2, 128))) == [[], []]
+    with pytest.raises(ValueError):
+        IdentityIndex(np.zeros((2, 128)), ["张三"])
@@ -0,0 +1,57 @@
+import random
+
+import pytest
+
+from video_metadata import IntervalIndex
+
+
+def brute_force(items, a, b):
+    return sorted(key for start, end, key in items if end > a and (start < b or start == a == b))
+
+
+def test_matches_brute_force_with_long_intervals():
+    rng = random.Random(0)
+    items = [(s, s + rng.uniform(0.1, 5), i) for i, s in enumerate(rng.uniform(0, 1000) for _ in range(2000))]
+    items.append((0.0, 1000.0, len(items)))     # 贯穿全片的长区间
+    index = IntervalIndex(items)
+
+    for _ in range(300):
+        a = rng.uniform(-10, 1010)
+        b = a + rng.choice([0.0, rng.uniform(0, 20)])
+        assert sorted(index.overlapping(a, b)) == brute_force(items, a, b)
+
+
+def test_insert_and_remove_keep_queries_correct():
+    rng = random.Random(1)
+    items = []
+    index = IntervalIndex()
+    for i in range(1000):
+        start = rng.uniform(0, 500)
+        item = (start, start + rng.uniform(0.1, 50), i)
+        items.append(item)
+        index.insert(*item)
+
+    for item in rng.sample(items, 600):
+        index.remove(item[0], item[2])
+        items.remove(item)
+
+    assert len(index) == len(items)
+    assert index.start == min(start for start, _, _ in items)
+    for t in range(0, 560, 7):
+        assert sorted(index.at(t)) == brute_force(items, t, t)
+
+
+def test_half_open_intervals():
+    index = IntervalIndex([(0.0, 1.0, "a"), (1.0, 2.0, "b")])
+    assert index.at(1.0) == ["b"]
+    assert index.overlapping(0.5, 1.0) == ["a"]
+    assert index.at(2.0) == []
+
+
+def test_empty_index():
+    index = IntervalIndex()
+    assert len(index) == 0
+    assert index.start is None
+    assert index.at(0.0) == []
+    with pytest.raises(KeyError):
+        index.remove(0.0, "missing")
@@ -0,0 +1,90 @@
+import asyncio
+import json
+
+import pytest
+
+from utils.llm_utils import _normalize, parse_json_reply
+
+
+def test_parse_plain_and_fenced_json():
+    assert parse_json_reply('{"video_type": "剧情"}') == {"video_type": "剧情"}
+    reply = '好的，结果如下：\n```json\n{"people": [{"name": "张三"}]}\n```'
+    assert parse_json_reply(reply) == {"people": [{"name": "张三"}]}
+
+
+@pytest.mark.parametrize("reply", [
+    None,
+    "",
+    "没有 JSON",
+    '["张三"]',
+    '{"people": "张三"}',
+])
+def test_parse_rejects_bad_structure(reply):
+    with pytest.raises(ValueError):
+        parse_json_reply(reply)
+
+
+def test_normalize_fills_defaults_and_skips_bad_people():
+    result = _normalize({
+        "video_type": " ",
+        "people": ["张三", {"name": "李四", "identity": "医生"}, {"identity": "无名"}, 3, None],
+    })
+    assert result == {
+        "video_type": "未知",
+        "core_theme": "未知",
+        "people": [{"name": "张三", "identity": "未知"}, {"name": "李四", "identity": "医生"}],
+    }
+
+
+@pytest.fixture
+def llm(monkeypatch, tmp_path):
+    from utils import llm_utils, metrics_utils
+    from utils.cache_utils import ArtifactCache
+
+    monkeypatch.setenv("DASHSCOPE_API_KEY", "test")
+    monkeypatch.setattr(llm_utils, "CHUNK_LINES", 1)
+    monkeypatch.setattr(metrics_utils, "_trace", metrics_utils.Trace())
+    return llm_utils, ArtifactCache(tmp_path / "cache"), metrics_utils._trace
+
+
+def dialogues(n):
+    from types import SimpleNamespace
+    return [SimpleNamespace(text=f"第 {i} 句台词") for i in range(n)]
+
+
+def test_ask_retries_rate_limited_requests(llm, monkeypatch):
+    from benchmarks.fake_llm_server import REPLY, serve
+
+    llm_utils, cache, trace = llm
+    server = serve(port=0, fail_every=2)        # 每两个请求返回一次 429（Retry-After: 0.1）
+    try:
+        monkeypatch.setattr(llm_utils, "LLM_BASE_URL", f"http://127.0.0.1:{server.server_address[1]}/v1")
+        result = asyncio.run(llm_utils.analyze_video_async(dialogues(3), cache=cache))
+    finally:
+        server.shutdown()
+
+    assert result == _normalize(REPLY)
+    metrics = {m["name"]: m for m in trace.to_dict()["metrics"]}
+    assert metrics["llm_retries"]["value"] >= 1
+    assert metrics["llm_latency_seconds"]["count"] == 4        # 3 个 map + 1 个 reduce，全部最终成功
+
+
+def test_reduce_merges_in_batches(llm, monkeypatch):
+    llm_utils, cache, _ = llm
+    monkeypatch.setattr(llm_utils, "REDUCE_BATCH", 3)
+    reduce_sizes = []
+
+    async def fake_ask(client, semaphore, prompt, cache):
+        if "分段结果" not in prompt:
+            part = prompt.split("第 ")[1].split("/")[0]
+            return {"people": [{"name": f"人物{part}"}]}
+        parts = [json.loads(line) for line in prompt.splitlines() if line.startswith("{\"")]
+        reduce_sizes.append(len(parts))
+        return {"people": [p for part in parts for p in part["people"]]}
+
+    monkeypatch.setattr(llm_utils, "_ask", fake_ask)
+    result = asyncio.run(llm_utils.analyze_video_async(dialogues(10), cache=cache))
+
+    assert sorted(p["name"] for p in result["people"]) == sorted(f"人物{i}" for i in range(1, 11))
+    assert max(reduce_sizes) <= 3
+    assert len(reduce_sizes) == 5       # 10 → 4 → 2 → 1
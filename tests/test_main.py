@@ -0,0 +1,59 @@
+import json
+import os
+import subprocess
+import sys
+from pathlib import Path
+
+import pytest
+
+from benchmarks.synthetic import make_video
+
+ROOT = Path(__file__).resolve().parents[1]
+
+
+def run_python(code, tmp_path):
+    env = {**os.environ, "CACHE_DIR": str(tmp_path / "cache")}
+    result = subprocess.run([sys.executable, "-c", code], cwd=ROOT, env=env, capture_output=True, text=True)
+    assert result.returncode == 0, result.stderr
+    return result.stdout
+
+
+def test_build_from_cache_skips_heavy_imports(tmp_path):
+    video = make_video(tmp_path / "video.mp4", seconds=4)
+    out = tmp_path / "out"
+
+    # 准备缓存：时长 / 台词（无音轨 → 空）/ 镜头 / 剧情分析（不调用 LLM）
+    run_python(f"""
+import main
+from utils.pipeline_utils import run_stages
+main.analyze_video_stage = lambda dialogues: {{"video_type": "测试", "core_theme": "测试", "people": []}}
+run_stages(main.pipeline_stages({str(video)!r}, {str(out)!r}, targets=("metadata",), build_faces=False))
+""", tmp_path)
+
+    stdout = run_python(f"""
+import json, sys
+import main
+main.run({str(video)!r}, "build", output_dir={str(out)!r})
+print(json.dumps([m for m in ("cv2", "av", "sklearn", "openai") if m in sys.modules]))
+""", tmp_path)
+
+    assert json.loads(stdout.strip().splitlines()[-1]) == []
+    assert (out / "video_metadata.json").exists()
+
+
+@pytest.mark.parametrize("argv, command, options", [
+    (["video.mp4"], "all", {"use_shots": False}),
+    (["faces", "video.mp4", "--shots", "--face-interval", "2"], "faces", {"use_shots": True, "face_interval": 2.0}),
+    (["build", "video.mp4"], "build", {}),
+])
+def test_cli_parses_subcommands(monkeypatch, argv, command, options):
+    import main
+
+    calls = []
+    monkeypatch.setattr(main, "run", lambda video, cmd, output_dir, **kw: calls.append((video, cmd, kw)))
+    main.cli(argv)
+
+    video, cmd, kwargs = calls[0]
+    assert (video, cmd) == ("video.mp4", command)
+    for key, value in options.items():
+        assert kwargs[key] == value
@@ -0,0 +1,106 @@
+import av
+import numpy as np
+import pytest
+
+from utils.frame_utils import FrameSampler
+from utils.media_utils import SAMPLE_RATE, AudioBuffer, AudioStream, FrameStream, MediaReader
+
+FPS = 25
+SECONDS = 4
+
+
+def make_video(path, audio=True):
+    """每帧灰度不同的小视频，可选 16k 正弦音轨"""
+    with av.open(str(path), "w") as container:
+        video = container.add_stream("mpeg4", rate=FPS)
+        video.width, video.height, video.pix_fmt = 160, 120, "yuv420p"
+        if audio:
+            sound = container.add_stream("aac", rate=SAMPLE_RATE)
+            sound.layout = "mono"
+
+        for i in range(SECONDS * FPS):
+            image = np.full((120, 160, 3), (i * 7) % 256, dtype=np.uint8)
+            for packet in video.encode(av.VideoFrame.from_ndarray(image, format="rgb24")):
+                container.mux(packet)
+        for packet in video.encode():
+            container.mux(packet)
+
+        if audio:
+            t = np.arange(SECONDS * SAMPLE_RATE) / SAMPLE_RATE
+            samples = (0.3 * np.sin(2 * np.pi * 440 * t)).astype(np.float32)
+            for k in range(0, len(samples), 1024):
+                frame = av.AudioFrame.from_ndarray(samples[None, k:k + 1024], format="flt", layout="mono")
+                frame.sample_rate = SAMPLE_RATE
+                for packet in sound.encode(frame):
+                    container.mux(packet)
+            for packet in sound.encode():
+                container.mux(packet)
+    return str(path)
+
+
+@pytest.fixture(scope="module")
+def video(tmp_path_factory):
+    return make_video(tmp_path_factory.mktemp("media") / "video.mp4")
+
+
+def test_single_pass_feeds_audio_and_frames(video):
+    with FrameSampler(video) as sampler:
+        expected = list(sampler.iter_interval(1.0))
+
+    reader = MediaReader(video)
+    audio = reader.add_audio(AudioBuffer())
+    frames = reader.add_video(FrameStream(reader.fps, 1.0, maxsize=2))     # 队列很小：消费者边读边取
+    future = reader.start()
+    got = list(frames)
+    future.result()
+
+    assert reader.fps == FPS
+    assert reader.decoded_frames == SECONDS * FPS       # 每帧只解码一次
+    assert len(audio.audio) / SAMPLE_RATE == pytest.approx(SECONDS, abs=0.2)
+    assert [i for i, _ in got] == [i for i, _ in expected]
+    assert all(np.array_equal(a, b) for (_, a), (_, b) in zip(got, expected))
+
+
+def test_closed_frame_stream_does_not_block_pass(video):
+    reader = MediaReader(video)
+    audio = reader.add_audio(AudioStream())
+    frames = reader.add_video(FrameStream(reader.fps, 1 / FPS, maxsize=1))
+    future = reader.start()
+
+    next(iter(frames))
+    frames.close()      # 下游不再取帧：解封装继续，音频照常产出
+    assert sum(len(chunk) for chunk in audio) > 0
+    future.result(timeout=30)
+
+
+def test_stop_fails_consumers(video):
+    reader = MediaReader(video)
+    audio = reader.add_audio(AudioStream())
+    reader.stop()
+    future = reader.start()
+
+    with pytest.raises(RuntimeError):
+        list(audio)
+    with pytest.raises(RuntimeError):
+        future.result(timeout=30)
+
+
+def test_video_without_audio(tmp_path):
+    with MediaReader(make_video(tmp_path / "silent.mp4", audio=False)) as reader:
+        assert reader.audio_stream is None
+        with pytest.raises(RuntimeError):
+            reader.add_audio(AudioBuffer())
+        assert reader.duration == pytest.approx(SECONDS, abs=0.1)
+
+
+def test_pipeline_without_audio_has_no_dialogues(tmp_path, monkeypatch):
+    from main import pipeline_stages
+    from utils import cache_utils
+    from utils.pipeline_utils import run_stages
+
+    monkeypatch.setattr(cache_utils, "_cache", cache_utils.ArtifactCache(tmp_path / "cache"))
+    video = make_video(tmp_path / "silent.mp4", audio=False)
+
+    results = run_stages(pipeline_stages(video, tmp_path / "out", targets=("dialogues", "shots")))
+    assert results["dialogues"] == []
+    assert results["shots"]
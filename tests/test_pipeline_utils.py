@@ -0,0 +1,50 @@
+import time
+
+import pytest
+
+from utils.pipeline_utils import Stage, run_stages, select_stages
+
+
+def stages():
+    return [
+        Stage("media", lambda: "m"),
+        Stage("dialogues", lambda media: media + "d", deps=("media",)),
+        Stage("shots", lambda media: media + "s", deps=("media",)),
+        Stage("face_db", lambda: "f"),
+        Stage("speakers", lambda dialogues, face_db: dialogues + face_db, deps=("dialogues", "face_db")),
+    ]
+
+
+def test_select_stages_keeps_dependencies_in_order():
+    assert [s.name for s in select_stages(stages(), ["speakers"])] == ["media", "dialogues", "face_db", "speakers"]
+    assert [s.name for s in select_stages(stages(), ["face_db"])] == ["face_db"]
+    assert [s.name for s in select_stages(stages(), ["shots", "media"])] == ["media", "shots"]
+
+
+def test_select_stages_rejects_unknown_target():
+    with pytest.raises(ValueError):
+        select_stages(stages(), ["metadata"])
+
+
+def test_run_stages_passes_outputs_along():
+    results = run_stages(stages())
+    assert results["speakers"] == "mdf"
+    assert results["shots"] == "ms"
+
+
+def test_run_stages_fails_fast():
+    def slow():
+        time.sleep(2)
+
+    def broken():
+        raise RuntimeError("boom")
+
+    started = time.perf_counter()
+    with pytest.raises(RuntimeError, match="boom"):
+        run_stages([Stage("slow", slow), Stage("broken", broken)])
+    assert time.perf_counter() - started < 1.5     # 不等其他阶段结束
+
+
+def test_run_stages_detects_cycles():
+    with pytest.raises(ValueError):
+        run_stages([Stage("a", lambda b: b, deps=("b",)), Stage("b", lambda a: a, deps=("a",))])
@@ -0,0 +1,102 @@
+import socket
+import subprocess
+import sys
+import time
+
+from utils.queue_utils import JobQueue
+
+
+def test_claim_and_finish(tmp_path):
+    queue = JobQueue(tmp_path / "queue.sqlite")
+    queue.add("a.mp4", "out/a")
+    queue.add("b.mp4", "out/b")
+    queue.add("a.mp4", "out/a")      # 重复入队被忽略
+
+    first, second = queue.claim(), queue.claim()
+    assert (first[1], second[1]) == ("a.mp4", "b.mp4")
+    assert queue.claim() is None
+
+    queue.finish(first[0], "out/a/a_metadata.json")
+    queue.set_stage(second[0], "dialogues", "failed", 1.0, "boom")
+    assert queue.counts() == {"done": 1, "running": 1}
+    queue.close()
+
+
+def test_failed_jobs_retry_until_max_attempts(tmp_path):
+    queue = JobQueue(tmp_path / "queue.sqlite", max_attempts=2)
+    queue.add("a.mp4", "out/a")
+
+    job = queue.claim()
+    queue.fail(job[0], "first")
+    assert queue.counts() == {"pending": 1}
+
+    job = queue.claim()
+    queue.fail(job[0], "second")
+    assert queue.counts() == {"failed": 1}
+    assert queue.claim() is None
+    queue.close()
+
+
+def dead_pid():
+    proc = subprocess.Popen([sys.executable, "-c", ""])
+    proc.wait()
+    return proc.pid
+
+
+def test_recover_requeues_interrupted_jobs(tmp_path):
+    db = tmp_path / "queue.sqlite"
+    queue = JobQueue(db)
+    queue.add("a.mp4", "out/a")
+    job = queue.claim()
+    # 模拟 worker 进程中途退出
+    queue.conn.execute("UPDATE jobs SET worker = ? WHERE id = ?", (f"{socket.gethostname()}:{dead_pid()}", job[0]))
+    queue.close()
+
+    queue = JobQueue(db)
+    assert queue.recover() == 1
+    assert queue.claim()[1] == "a.mp4"
+    queue.close()
+
+
+def test_recover_leaves_live_workers_alone(tmp_path):
+    db = tmp_path / "queue.sqlite"
+    worker = JobQueue(db)
+    worker.add("a.mp4", "out/a")
+    job = worker.claim()
+    worker.heartbeat(job[0])
+
+    other = JobQueue(db)        # 同时启动的另一个批量进程
+    assert other.recover() == 0
+    assert other.counts() == {"running": 1}
+
+    # 其他机器上的 worker：只看心跳
+    worker.conn.execute("UPDATE jobs SET worker = 'elsewhere:1', heartbeat = ?", (time.time() - 3600,))
+    assert other.recover(lease_seconds=60) == 1
+    assert other.counts() == {"pending": 1}
+    worker.close()
+    other.close()
+
+
+def test_recover_fails_jobs_out_of_attempts(tmp_path):
+    db = tmp_path / "queue.sqlite"
+    queue = JobQueue(db, max_attempts=1)
+    queue.add("a.mp4", "out/a")
+    job = queue.claim()
+    queue.conn.execute("UPDATE jobs SET heartbeat = 0 WHERE id = ?", (job[0],))
+
+    assert queue.recover() == 1
+    assert queue.counts() == {"failed": 1}
+    assert queue.claim() is None
+    queue.close()
+
+
+def test_workers_never_claim_the_same_job(tmp_path):
+    db = tmp_path / "queue.sqlite"
+    queues = [JobQueue(db) for _ in range(2)]
+    for i in range(4):
+        queues[0].add(f"{i}.mp4", f"out/{i}")
+
+    claimed = [queues[i % 2].claim()[0] for i in range(4)]
+    assert sorted(claimed) == sorted(set(claimed))
+    for queue in queues:
+        queue.close()
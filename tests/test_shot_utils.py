@@ -0,0 +1,59 @@
+import numpy as np
+import pytest
+
+from benchmarks.synthetic import make_video
+from utils.shot_utils import ShotDetector, detect_shots, shot_sample_times
+
+
+@pytest.fixture(scope="module")
+def video(tmp_path_factory):
+    return make_video(tmp_path_factory.mktemp("shots") / "video.mp4", seconds=6, size=(320, 180), shot_seconds=2)
+
+
+def test_detects_background_changes(video):
+    shots = detect_shots(video)
+    assert len(shots) == 3
+    assert [a for a, _ in shots] == pytest.approx([0.0, 2.0, 4.0], abs=0.05)
+    assert shots[-1][1] == pytest.approx(6.0, abs=0.05)
+    assert all(a == b for (_, a), (b, _) in zip(shots, shots[1:]))     # 首尾相接
+
+
+def test_batch_size_does_not_change_result(video):
+    assert detect_shots(video, batch_size=7) == detect_shots(video)
+
+
+class FakeFrame:
+    def __init__(self, value):
+        self.value = value
+
+    def to_ndarray(self, width, height, format):
+        return np.full((height, width, 3), self.value, dtype=np.uint8)
+
+
+def detect(values, fps=10, **kwargs):
+    detector = ShotDetector(fps=fps, **kwargs)
+    for i, v in enumerate(values):
+        detector.on_frame(i / fps, FakeFrame(v))
+    detector.finish()
+    return detector.shots
+
+
+def test_min_shot_len_filters_close_cuts():
+    values = [0] * 10 + [255] + [0] * 9 + [128] * 10     # 1 秒处闪一帧白，2 秒处切镜头
+    # 闪光后 0.1 秒切回来：离上一个切点太近，不算新镜头
+    assert detect(values, min_shot_len=0.5, batch_size=4) == pytest.approx([(0.0, 1.0), (1.0, 2.0), (2.0, 3.0)])
+    assert detect(values, min_shot_len=1.5) == pytest.approx([(0.0, 2.0), (2.0, 3.0)])
+    assert detect([0] * 30, min_shot_len=0.5) == pytest.approx([(0.0, 3.0)])
+
+
+def test_no_frames():
+    detector = ShotDetector(fps=25)
+    detector.finish()
+    assert detector.shots == []
+
+
+def test_shot_sample_times():
+    shots = [(0.0, 2.0), (2.0, 12.0)]
+    assert shot_sample_times(shots) == pytest.approx([1.0, 7.0])
+    assert shot_sample_times(shots, per_shot=3)[:3] == pytest.approx([0.5, 1.0, 1.5])
+    assert len(shot_sample_times(shots, max_gap=2.0)) == 1 + 5      # 长镜头加密采样
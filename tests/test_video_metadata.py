@@ -0,0 +1,78 @@
+import numpy as np
+import pytest
+
+from video_metadata import BasicInfo, Dialogue, DialogueTable, Person, Shot, ShotTable, VideoMetadata
+
+
+def make_metadata():
+    return VideoMetadata(
+        basic_info=BasicInfo(20.0, "剧情片", "测试"),
+        shots=[Shot(0.0, 8.0, "开场"), Shot(8.0, 20.0, "对话")],
+        people=[Person("张三", "主角")],
+        dialogues=[
+            Dialogue(1.0, 2.5, "张三", "你好"),
+            Dialogue(3.0, 4.0, "未知", "今天天气不错 🌤"),
+            Dialogue(9.0, 12.0, "张三", "走吧"),
+        ],
+    )
+
+
+def test_binary_roundtrip(tmp_path):
+    metadata = make_metadata()
+    path = tmp_path / "video.vmd"
+    metadata.save_to_binary(path)
+
+    loaded = VideoMetadata.load(path)
+    assert loaded.to_dict() == metadata.to_dict()
+    assert isinstance(loaded.dialogues[0], Dialogue)
+
+
+def test_binary_as_tables(tmp_path):
+    metadata = make_metadata()
+    path = tmp_path / "video.vmd"
+    metadata.save_to_binary(path)
+
+    loaded = VideoMetadata.load_from_binary(path, as_tables=True)
+    assert isinstance(loaded.dialogues, DialogueTable) and isinstance(loaded.shots, ShotTable)
+    assert loaded.to_dict() == metadata.to_dict()
+    assert np.array_equal(loaded.dialogues.start_time, [1.0, 3.0, 9.0])
+
+    loaded.dialogues[1].speaker = "李四"        # 只读映射的列首次修改时复制
+    assert loaded.dialogues.to_dialogues()[1].speaker == "李四"
+
+
+def test_table_from_iter_matches_list():
+    dialogues = make_metadata().dialogues
+    table = DialogueTable.from_iter(d for d in dialogues)      # 生成器：只能迭代一次
+    assert table.to_dialogues() == dialogues
+    assert table.speakers == ["张三", "未知"]
+    assert len(DialogueTable.from_iter(iter([]))) == 0
+
+
+def test_binary_sections(tmp_path):
+    path = tmp_path / "video.vmd"
+    make_metadata().save_to_binary(path)
+
+    loaded = VideoMetadata.load_from_binary(path, sections=("dialogues",))
+    assert loaded.shots == []
+    assert [d.text for d in loaded.dialogues] == ["你好", "今天天气不错 🌤", "走吧"]
+
+
+def test_rejects_invalid_file(tmp_path):
+    path = tmp_path / "bad.vmd"
+    path.write_bytes(b"not a vmd file")
+    with pytest.raises(ValueError):
+        VideoMetadata.load_from_binary(path)
+
+
+def test_index_from_tables_matches_lists(tmp_path):
+    metadata = make_metadata()
+    path = tmp_path / "video.vmd"
+    metadata.save_to_binary(path)
+    tables = VideoMetadata.load_from_binary(path, as_tables=True)
+
+    for t in (0.5, 1.5, 3.5, 10.0):
+        expected = metadata.build_index().at(t)
+        actual = tables.build_index().at(t)
+        assert [d.text for d in actual["dialogues"]] == [d.text for d in expected["dialogues"]]
+        assert actual["speakers"] == expected["speakers"]
@@ -1,74 +1,436 @@
-import subprocess
+import json
+import multiprocessing
+import os
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import asdict, dataclass
 from pathlib import Path
 
-from faster_whisper import WhisperModel
-from video_metadata import Dialogue
+import numpy as np
+from config import SAMPLE_RATE
+from video_metadata import Dialogue, DialogueTable
 
+from .cache_utils import ArtifactCache, video_hash
+from .metrics_utils import get_trace
 
-MODEL_PATH = r"D:\python\models\models\faster-whisper-medium"
 
+# 本地模型目录，或 faster-whisper 的模型名（如 medium / large-v3，首次使用时下载到 HuggingFace 缓存）
+MODEL_PATH = os.getenv("ASR_MODEL", "medium")
 
-def extract_audio(video_path: str) -> str:
+# ASR 引擎配置（环境变量可覆盖）；批处理节点无 GPU，默认自动选择设备
+ASR_DEVICE = os.getenv("ASR_DEVICE", "auto")
+ASR_COMPUTE_TYPE = os.getenv("ASR_COMPUTE_TYPE", "int8")
+ASR_CPU_THREADS = int(os.getenv("ASR_CPU_THREADS", "0"))     # 0 = ctranslate2 默认
+ASR_NUM_WORKERS = int(os.getenv("ASR_NUM_WORKERS", "1"))
+ASR_BATCH_SIZE = int(os.getenv("ASR_BATCH_SIZE", "0"))       # >0 时使用批量推理
+ASR_PROCESSES = int(os.getenv("ASR_PROCESSES", "0"))         # >1 时多进程并行识别各音频窗口
+MIN_SILENCE_MS = 2000
+WINDOW_SECONDS = int(os.getenv("ASR_WINDOW_SECONDS", "120"))  # 流式识别的窗口时长（秒），切点落在静音处
+WINDOW_SEARCH_SECONDS = 20   # 在窗口末尾前后多少秒内找静音切点
+HARD_CUT_OVERLAP_SECONDS = 10    # 找不到静音只能硬切时，前后两个窗口重叠多少秒
+CHECKPOINT_SECONDS = 10      # 断点续跑：至多每隔多少秒（墙钟）落一次检查点
+
+_models = {}
+_models_lock = threading.Lock()
+
+
+def get_model(model_path=None, device=None, compute_type=None, cpu_threads=None, num_workers=None):
     """
-    使用 ffmpeg 提取 wav 音频
+    进程级模型缓存：同一 (模型, 设备, 精度, 线程配置) 只加载一次
     """
-    audio_path = Path("outputs") / (Path(video_path).stem + ".wav")
-    audio_path.parent.mkdir(exist_ok=True)
+    key = (
+        model_path or MODEL_PATH,
+        device or ASR_DEVICE,
+        compute_type or ASR_COMPUTE_TYPE,
+        ASR_CPU_THREADS if cpu_threads is None else cpu_threads,
+        ASR_NUM_WORKERS if num_workers is None else num_workers,
+    )
+
+    with _models_lock:
+        if key not in _models:
+            from faster_whisper import WhisperModel     # 延迟导入：只有真正识别时才加载
+
+            print("🧠 加载 Whisper 模型...")
+            _models[key] = WhisperModel(
+                key[0],
+                device=key[1],
+                compute_type=key[2],
+                cpu_threads=key[3],
+                num_workers=key[4],
+            )
+        return _models[key]
 
-    cmd = [
-        "ffmpeg",
-        "-y",
-        "-i", video_path,
-        "-ac", "1",          # 单声道
-        "-ar", "16000",      # 采样率16k
-        "-vn",               # 不要视频
-        str(audio_path)
-    ]
 
-    subprocess.run(cmd, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+def run_asr(audio, model=None, batch_size=None):
+    """
+    对 float32 音频执行识别，返回 faster-whisper 的 segments 生成器
+    batch_size > 0 时使用 BatchedInferencePipeline（长音频吞吐更高）
+    """
+    model = model or get_model()
+    batch_size = ASR_BATCH_SIZE if batch_size is None else batch_size
+
+    options = dict(
+        language="zh",
+        vad_filter=True,
+        vad_parameters=dict(min_silence_duration_ms=MIN_SILENCE_MS),
+    )
 
-    return str(audio_path)
+    if batch_size > 0:
+        from faster_whisper import BatchedInferencePipeline
+        segments, _ = BatchedInferencePipeline(model=model).transcribe(audio, batch_size=batch_size, **options)
+    else:
+        segments, _ = model.transcribe(audio, **options)
+    return segments
 
 
-def transcribe_video(video_path: str):
+def split_on_silence(audio, n_chunks, min_silence_ms=MIN_SILENCE_MS):
     """
-    稳定版 ASR：
-    1. 先提取音频
-    2. 再进行识别
+    用 VAD 找出静音段（第一段语音之前、相邻两段语音之间、最后一段语音之后），在最接近等分点的静音中点切开
+    返回切点（采样下标）列表，首尾为 0 和 len(audio)；静音不够时切点会少于 n_chunks + 1 个
     """
+    if n_chunks <= 1:
+        return [0, len(audio)]
 
-    print("🎧 提取音频...")
-    audio_path = extract_audio(video_path)
+    from faster_whisper.vad import VadOptions, get_speech_timestamps
+
+    speech = get_speech_timestamps(audio, VadOptions(min_silence_duration_ms=min_silence_ms))
+    bounds = [0] + [x for seg in speech for x in (seg["start"], seg["end"])] + [len(audio)]
+    gaps = [(a + b) // 2 for a, b in zip(bounds[::2], bounds[1::2]) if b > a]
+    gaps = [g for g in gaps if 0 < g < len(audio)]
+
+    cuts = [0]
+    for k in range(1, n_chunks):
+        target = len(audio) * k / n_chunks
+        candidates = [g for g in gaps if g > cuts[-1]]
+        if not candidates:
+            break
+        cut = min(candidates, key=lambda g: abs(g - target))
+        if cut not in cuts:
+            cuts.append(cut)
+    cuts.append(len(audio))
+    return cuts
+
+
+_worker_model = None    # 识别进程内的模型（由 _init_asr_worker 加载）
+
+
+def _init_asr_worker(cpu_threads):
+    # 每个进程各自持有一个模型实例；记下来供 _transcribe_chunk 使用，
+    # 否则 get_model() 的缓存 key（默认线程数）与这里不同，会再加载一个模型
+    global _worker_model
+    _worker_model = get_model(cpu_threads=cpu_threads)
+
+
+@dataclass
+class AudioWindow:
+    """
+    iter_audio_windows 切出的一个识别窗口（时间均为全片绝对秒数）
+    offset: 窗口音频的起点；audio: float32 音频
+    keep_from / keep_until: 本窗口负责的时间范围，句子中点落在范围外的丢弃（与相邻窗口重叠的部分只保留一份）
+    next_offset: 下一个窗口音频的起点（断点续跑从这里开始解码）；在静音处切开时等于 keep_until
+    """
+    offset: float
+    audio: np.ndarray
+    keep_from: float
+    keep_until: float
+    next_offset: float
+
+
+def _transcribe(window, model):
+    get_trace().count("asr_windows")
+    for seg in run_asr(window.audio, model=model):
+        start, end = seg.start + window.offset, seg.end + window.offset
+        if window.keep_from <= (start + end) / 2 < window.keep_until:
+            yield start, end, seg.text
+
+
+def _transcribe_chunk(window):
+    # 识别进程里记录的指标随结果一起传回主进程（见 Trace.drain / merge），否则会丢失
+    cpu = time.process_time()
+    segments = list(_transcribe(window, _worker_model))
+    trace = get_trace()
+    trace.count("asr_worker_cpu_seconds", time.process_time() - cpu)
+    return segments, trace.drain()
+
+
+def iter_audio_windows(chunks, skip_seconds=0.0, window_seconds=None, keep_from=None):
+    """
+    把陆续到达的音频块（如 AudioStream）切成约 window_seconds 秒的窗口，产出 AudioWindow
+    切点取窗口末尾前后 WINDOW_SEARCH_SECONDS 内最接近的静音中点，因此音频还没解码完，前面的窗口就可以开始识别；
+    搜索范围内一直有人说话、找不到静音时硬切：后一个窗口往前多取 HARD_CUT_OVERLAP_SECONDS 秒，
+    两个窗口以重叠部分的中点为界各自保留句子（见 AudioWindow.keep_from / keep_until），被切断的句子在后一个窗口里完整识别
+    skip_seconds 之前的音频直接丢弃，keep_from 为第一个窗口负责的起点（断点续跑，默认等于 skip_seconds）
+    window_seconds 为 None 时取 WINDOW_SECONDS
+    """
+    window = int((window_seconds or WINDOW_SECONDS) * SAMPLE_RATE)
+    search = min(int(WINDOW_SEARCH_SECONDS * SAMPLE_RATE), window // 2)
+    overlap = min(int(HARD_CUT_OVERLAP_SECONDS * SAMPLE_RATE), window // 2)
+    skip = int(skip_seconds * SAMPLE_RATE)
+    start, buffer, buffered = skip, [], 0
+    keep_from = skip_seconds if keep_from is None else keep_from
+
+    for chunk in chunks:
+        if skip:
+            dropped = min(skip, len(chunk))
+            chunk, skip = chunk[dropped:], skip - dropped
+        if not len(chunk):
+            continue
+        buffer.append(chunk)
+        buffered += len(chunk)
+
+        while buffered >= window + search:
+            audio = np.concatenate(buffer)
+            cuts = split_on_silence(audio[window - search:window + search], 2)
+            if len(cuts) == 3:
+                cut = next_start = window - search + cuts[1]
+                keep_until = (start + cut) / SAMPLE_RATE
+            else:
+                cut, next_start = window, window - overlap
+                keep_until = (start + window - overlap // 2) / SAMPLE_RATE
+            yield AudioWindow(start / SAMPLE_RATE, audio[:cut], keep_from, keep_until, (start + next_start) / SAMPLE_RATE)
+            start += next_start
+            keep_from = keep_until
+            buffer, buffered = [audio[next_start:]], len(audio) - next_start
+
+    if buffered:
+        end = (start + buffered) / SAMPLE_RATE
+        yield AudioWindow(start / SAMPLE_RATE, np.concatenate(buffer), keep_from, end, end)
+
+
+def iter_window_segments(windows, workers=None):
+    """
+    逐窗口识别，按窗口顺序产出 (AudioWindow, [(start, end, text), ...])，时间为全片绝对时间
+    workers > 1 时多进程并行，至多 workers 个窗口同时在识别，不会把整段音频都压进队列
+    每个窗口只保留中点在 [keep_from, keep_until) 内的句子：静音处切开的窗口原样保留，
+    硬切的窗口重叠部分只保留一份，因此拼接时不重不漏
+    """
+    workers = ASR_PROCESSES if workers is None else workers
+    if workers <= 1:
+        for window in windows:
+            yield window, _transcribe(window, get_model())
+        return
+
+    # 避免多进程 × 多线程超额占用 CPU
+    cpu_threads = ASR_CPU_THREADS or max((os.cpu_count() or 1) // workers, 1)
+
+    with ProcessPoolExecutor(
+        max_workers=workers,
+        initializer=_init_asr_worker,
+        initargs=(cpu_threads,),
+        # 本进程里有阶段线程和解封装线程，fork 可能复制到别的线程持有的锁；用 spawn 启动干净的进程
+        mp_context=multiprocessing.get_context("spawn"),
+    ) as pool:
+        trace = get_trace()
+
+        def collect(future):
+            segments, metrics = future.result()
+            trace.merge(metrics)
+            return segments
+
+        pending = []
+        for window in windows:
+            pending.append((window, pool.submit(_transcribe_chunk, window)))
+            if len(pending) >= workers:
+                window, future = pending.pop(0)
+                yield window, collect(future)
+        for window, future in pending:
+            yield window, collect(future)
+
+
+def load_audio(video_path: str) -> np.ndarray:
+    """
+    PyAV 解码并重采样为 16k 单声道 float32，不再调用 ffmpeg 命令行
+    整段音频解码完才返回（全部在内存里）；识别请用 stream_audio，
+    需要同时读视频帧时直接把 AudioBuffer / AudioStream 注册到同一个 MediaReader 上
+    """
+    from .media_utils import AudioBuffer, MediaReader     # 延迟导入 PyAV：只组装缓存 key 时用不到
+
+    with MediaReader(video_path, sample_rate=SAMPLE_RATE) as reader:
+        buffer = reader.add_audio(AudioBuffer())
+        reader.run()
+    return buffer.audio
+
+
+def stream_audio(video_path: str):
+    """
+    后台线程解码音频，返回边解码边产出的 AudioStream（识别不必等整段音频解码完）
+    """
+    from .media_utils import AudioStream, MediaReader
+
+    reader = MediaReader(video_path, sample_rate=SAMPLE_RATE)
+    stream = reader.add_audio(AudioStream())
+    reader.start()
+    return stream
+
+
+def _checkpoint_path(sidecar_path):
+    return Path(str(sidecar_path) + ".ckpt")
 
-    print("🧠 加载 Whisper 模型...")
-    model = WhisperModel(
-        MODEL_PATH,
-        device="cuda",
-        compute_type="int8"
-    )
+
+def _write_checkpoint(sidecar, ckpt_path, **state):
+    """
+    先把 JSONL fsync 到磁盘，再原子替换检查点文件：
+    检查点里的 count 行一定已经完整落盘
+    """
+    sidecar.flush()
+    os.fsync(sidecar.fileno())
+    tmp = ckpt_path.with_name(ckpt_path.name + ".tmp")
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(state, f)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp, ckpt_path)
+
+
+def _restore_checkpoint(sidecar_path, resume_key):
+    """
+    读取检查点：key 一致时返回 (检查点, 已提交的台词)，并把 JSONL 截断到已提交的行
+    （上次中断时写了一半的行、以及检查点之后的行会被丢弃，续跑时重新识别）
+    """
+    ckpt_path = _checkpoint_path(sidecar_path)
+    if not ckpt_path.exists() or not Path(sidecar_path).exists():
+        return None, []
+    with open(ckpt_path, "r", encoding="utf-8") as f:
+        ckpt = json.load(f)
+    if ckpt.get("key") != resume_key:
+        return None, []
+
+    dialogues, size = [], 0
+    with open(sidecar_path, "rb") as f:
+        for _ in range(ckpt["count"]):
+            line = f.readline()
+            dialogues.append(Dialogue(**json.loads(line)))
+            size += len(line)
+    os.truncate(sidecar_path, size)
+    return ckpt, dialogues
+
+
+def iter_dialogues(video_path: str, sidecar_path=None, audio=None, resume_key=None):
+    """
+    流式 ASR：
+    1. 音频按静音切成窗口（iter_audio_windows），边解码边识别
+    2. 每识别一句就 yield 一条 Dialogue
+    3. 同时追加写入 JSONL（sidecar_path 不为 None 时）
+    audio: 已解码的 float32 音频，或陆续产出音频块的可迭代对象（如 MediaReader 上的 AudioStream）；
+       为 None 时在后台线程现场解码
+    resume_key: 不为 None 时启用断点续跑（需要 sidecar_path）：
+       每识别完一个窗口（至多每 CHECKPOINT_SECONDS 秒一次）把已识别的台词和窗口边界落盘到 <sidecar>.ckpt；
+       再次运行且 key 相同时，先产出已识别的台词，再从下一个窗口的起点继续识别
+       窗口在静音处切开（硬切时从重叠部分开始），续跑不会从半句话中间开始（代价是至多重新识别一个窗口）；
+       key 需要包含所有影响识别结果的参数（见 asr_params）
+    """
+    ckpt, done = None, []
+    if sidecar_path and resume_key:
+        ckpt, done = _restore_checkpoint(sidecar_path, resume_key)
+        if ckpt and ckpt["done"]:
+            print(f"♻️ 语音识别已完成（{len(done)} 条台词），直接读取")
+            yield from done
+            return
+        if ckpt:
+            print(f"⏩ 从 {ckpt['offset']:.1f}s 继续语音识别（已识别 {len(done)} 条）")
+
+    if audio is None:
+        print("🎧 解码音频...")
+        audio = stream_audio(video_path)
+    if isinstance(audio, np.ndarray):
+        audio = [audio]
+
+    yield from done
+    offset = ckpt["offset"] if ckpt else 0.0
+    audio_offset = ckpt.get("audio_offset", offset) if ckpt else 0.0    # 硬切处续跑时要从重叠部分开始解码
+    windows = iter_audio_windows(audio, skip_seconds=audio_offset, keep_from=offset)
 
     print("🎙 开始语音识别...")
+    trace = get_trace()
+    started = last_checkpoint = time.perf_counter()
 
-    segments, _ = model.transcribe(
-        audio_path,
-        language="zh",
-        vad_filter=True,
-        vad_parameters=dict(min_silence_duration_ms=2000),
+    ckpt_path = _checkpoint_path(sidecar_path) if sidecar_path and resume_key else None
+    sidecar = open(sidecar_path, "a" if ckpt else "w", encoding="utf-8") if sidecar_path else None
+    count = len(done)
+    end_of_audio = offset
+    try:
+        for window, segments in iter_window_segments(windows):
+            end_of_audio = window.keep_until
+            for start, end, text in segments:
+                text = text.strip()
+                if not text or end <= start:
+                    continue
+
+                trace.count("asr_segments")
+                dlg = Dialogue(
+                    start_time=start,
+                    end_time=end,
+                    speaker="未知",
+                    text=text
+                )
+
+                if sidecar:
+                    sidecar.write(json.dumps(asdict(dlg), ensure_ascii=False) + "\n")
+                    sidecar.flush()
+                    count += 1
+
+                yield dlg
+
+            if ckpt_path and time.perf_counter() - last_checkpoint >= CHECKPOINT_SECONDS:
+                _write_checkpoint(
+                    sidecar, ckpt_path, key=resume_key, count=count, offset=end_of_audio,
+                    audio_offset=window.next_offset, done=False,
+                )
+                last_checkpoint = time.perf_counter()
+
+        if ckpt_path:
+            _write_checkpoint(
+                sidecar, ckpt_path, key=resume_key, count=count, offset=end_of_audio, audio_offset=end_of_audio,
+                done=True,
+            )
+    finally:
+        if sidecar:
+            sidecar.close()
+        audio_seconds = end_of_audio - offset
+        trace.gauge("audio_seconds", audio_seconds)
+        if audio_seconds:
+            # 实时率 RTF = 识别耗时 / 音频时长（流式消费时包含下游处理时间）
+            trace.gauge("asr_rtf", (time.perf_counter() - started) / audio_seconds)
+
+
+def asr_params():
+    """
+    影响识别结果的全部参数（模型 / 精度 / 批量 / 窗口与 VAD 切分 / 进程数），
+    用于台词缓存 key 和断点续跑 key：任何一项变化都从头识别
+    """
+    return dict(
+        model=MODEL_PATH, compute_type=ASR_COMPUTE_TYPE, batch_size=ASR_BATCH_SIZE, processes=ASR_PROCESSES,
+        min_silence_ms=MIN_SILENCE_MS, window_seconds=WINDOW_SECONDS, window_search_seconds=WINDOW_SEARCH_SECONDS,
+        hard_cut_overlap_seconds=HARD_CUT_OVERLAP_SECONDS,
     )
 
-    dialogues = []
 
-    for i, seg in enumerate(segments):
-        print(f"识别 {i+1}: {seg.start:.1f}s → {seg.end:.1f}s")
+def dialogues_path(video_path: str, output_dir="outputs") -> Path:
+    return Path(output_dir) / (Path(video_path).stem + "_dialogues.jsonl")
+
+
+def load_dialogues_jsonl(path):
+    """
+    读取 iter_dialogues 写出的 JSONL 台词
+    """
+    with open(path, "r", encoding="utf-8") as f:
+        return [Dialogue(**json.loads(line)) for line in f if line.strip()]
+
 
-        dlg = Dialogue(
-            start_time=seg.start,
-            end_time=seg.end,
-            speaker="未知",
-            text=seg.text.strip()
-        )
+def transcribe_video(video_path: str, audio=None, output_dir="outputs", resume_key=None):
+    """
+    稳定版 ASR：边解码边识别，边识别边写 <output_dir>/<视频名>_dialogues.jsonl
+    识别结果边产出边累积成列式 DialogueTable（剧情分析 / 说话人 / 元数据都需要完整台词），
+    不再先收集成 List[Dialogue]；需要逐条处理时直接迭代 iter_dialogues
+    中途被中断时，再次运行从检查点继续（见 iter_dialogues）；
+    resume_key 默认由视频内容指纹 + 识别参数（asr_params）生成
+    """
+    sidecar_path = dialogues_path(video_path, output_dir)
+    sidecar_path.parent.mkdir(parents=True, exist_ok=True)
 
-        dialogues.append(dlg)
+    resume_key = resume_key or ArtifactCache.key("dialogues", video_hash(video_path), **asr_params())
+    dialogues = DialogueTable.from_iter(iter_dialogues(video_path, sidecar_path, audio=audio, resume_key=resume_key))
 
     print(f"✅ 共识别 {len(dialogues)} 条台词")
 
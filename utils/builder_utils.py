@@ -1,9 +1,17 @@
 from video_metadata import (
-    BasicInfo, Shot, Person, VideoMetadata
+    BasicInfo, IntervalIndex, Shot, Person, VideoMetadata
 )
 
 
-def build_metadata(duration, dialogues, llm_result):
+def describe_shot(start, end, dialogues, dialogue_index):
+    """
+    镜头描述：镜头内台词的前 30 个字；无台词时标记为无台词镜头
+    """
+    text = "".join(dialogues[i].text for i in dialogue_index.overlapping(start, end))
+    return text[:30] or "无台词镜头"
+
+
+def build_metadata(duration, dialogues, llm_result, shots=None):
     # BasicInfo
     basic = BasicInfo(
         duration_seconds=duration,
@@ -11,14 +19,16 @@ def build_metadata(duration, dialogues, llm_result):
         core_theme=llm_result["core_theme"]
     )
 
-    # Shots（每句台词一个镜头）
+    # Shots：有镜头检测结果时用真实镜头，否则每句台词一个镜头
+    ranges = shots if shots is not None else [(d.start_time, d.end_time) for d in dialogues]
+    dialogue_index = IntervalIndex((d.start_time, d.end_time, i) for i, d in enumerate(dialogues))
     shots = []
-    for dlg in dialogues:
+    for start, end in ranges:
         shots.append(
             Shot(
-                start_time=dlg.start_time,
-                end_time=dlg.end_time,
-                description=dlg.text[:30]
+                start_time=start,
+                end_time=end,
+                description=describe_shot(start, end, dialogues, dialogue_index)
             )
         )
 
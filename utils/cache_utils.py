@@ -0,0 +1,209 @@
+import hashlib
+import json
+import os
+import pickle
+import shutil
+import tempfile
+import threading
+from pathlib import Path
+
+import numpy as np
+from filelock import FileLock, Timeout
+
+from .metrics_utils import get_trace
+
+CACHE_DIR = os.getenv("CACHE_DIR", os.path.join("outputs", "cache"))
+CACHE_MAX_BYTES = int(os.getenv("CACHE_MAX_BYTES", str(20 * 1024**3)))   # 默认 20GB
+
+HASH_BLOCK = 1024 * 1024     # 内容指纹每块 1MB
+HASH_BLOCKS = 16             # 均匀抽取的块数
+LEASE_PREFIX = ".lease-"     # 多文件产物目录下的租约文件：.lease-<pid>
+
+
+_video_hashes = {}
+_leases = {}        # 本进程持有租约的产物目录 → FileLock
+
+
+def video_hash(video_path):
+    """
+    视频内容指纹：文件大小 + 均匀抽取的若干 1MB 数据块
+    不需要读完整个文件；同一进程内按 (路径, 大小, 修改时间) 缓存
+    """
+    st = os.stat(video_path)
+    memo_key = (os.path.abspath(video_path), st.st_size, st.st_mtime_ns)
+    if memo_key in _video_hashes:
+        return _video_hashes[memo_key]
+
+    h = hashlib.blake2b(digest_size=16)
+    h.update(str(st.st_size).encode())
+    with open(video_path, "rb") as f:
+        if st.st_size <= HASH_BLOCK * HASH_BLOCKS:
+            h.update(f.read())
+        else:
+            step = (st.st_size - HASH_BLOCK) // (HASH_BLOCKS - 1)
+            for i in range(HASH_BLOCKS):
+                f.seek(i * step)
+                h.update(f.read(HASH_BLOCK))
+
+    digest = h.hexdigest()
+    _video_hashes[memo_key] = digest
+    return digest
+
+
+def file_hash(path):
+    """
+    小文件（如 face_db.json）的完整内容哈希；不存在时返回空串
+    """
+    if not os.path.exists(path):
+        return ""
+    with open(path, "rb") as f:
+        return hashlib.blake2b(f.read(), digest_size=16).hexdigest()
+
+
+class ArtifactCache:
+    """
+    按内容寻址的阶段产物缓存：
+    key = hash(阶段名 + 上游 key/视频指纹 + 阶段参数)
+    输入或参数变了 key 就变，只有变化的阶段会重算
+    numpy 数组存 .npy，其余对象存 .pkl；超过 max_bytes 时按最近使用时间淘汰
+    """
+
+    def __init__(self, root=CACHE_DIR, max_bytes=CACHE_MAX_BYTES):
+        self.root = Path(root)
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def key(stage, *inputs, **params):
+        payload = json.dumps(
+            {"stage": stage, "inputs": inputs, "params": params},
+            sort_keys=True, ensure_ascii=False, default=str,
+        )
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()[:32]
+
+    def _paths(self, stage, key):
+        base = self.root / stage / key
+        return base.with_suffix(".npy"), base.with_suffix(".pkl")
+
+    def artifact_dir(self, stage, key):
+        """
+        多文件产物（如逐帧人脸库）的目录，由调用方自行读写
+        """
+        return self.root / stage / key
+
+    def lease(self, path):
+        """
+        标记多文件产物目录正在被本进程使用（如内存映射中的人脸库），本进程退出前 evict 不会删除它
+        租约是目录下 .lease-<pid> 文件上的锁，进程退出（包括崩溃）后自动失效
+        """
+        path = Path(os.path.abspath(path))
+        if path not in _leases:
+            lock = FileLock(str(path / f"{LEASE_PREFIX}{os.getpid()}"), thread_local=False)
+            lock.acquire()
+            _leases[path] = lock
+        return path
+
+    def exists(self, stage, key):
+        """只检查是否已缓存，不读取内容"""
+        return any(path.exists() for path in self._paths(stage, key))
+
+    def get(self, stage, key, default=None):
+        for path in self._paths(stage, key):
+            if path.exists():
+                os.utime(path)      # 记录最近使用时间，供 LRU 淘汰
+                if path.suffix == ".npy":
+                    return np.load(path)
+                with open(path, "rb") as f:
+                    return pickle.load(f)
+        return default
+
+    def put(self, stage, key, value):
+        npy_path, pkl_path = self._paths(stage, key)
+        npy_path.parent.mkdir(parents=True, exist_ok=True)
+
+        path = npy_path if isinstance(value, np.ndarray) else pkl_path
+        # 每个写入者一个唯一的临时文件（批量运行时多个进程可能同时写同一个 key），再原子替换
+        fd, tmp = tempfile.mkstemp(dir=path.parent, prefix=path.name + ".", suffix=".tmp")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                if isinstance(value, np.ndarray):
+                    np.save(f, value)
+                else:
+                    pickle.dump(value, f, protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(tmp, path)    # 中途崩溃不会留下半个文件
+        except BaseException:
+            Path(tmp).unlink(missing_ok=True)
+            raise
+
+        self.evict()
+
+    def get_or_compute(self, stage, key, compute):
+        missing = object()
+        value = self.get(stage, key, missing)
+        if value is not missing:
+            print(f"♻️ 命中缓存：{stage}")
+            get_trace().count("cache_hits")
+            return value
+
+        get_trace().count("cache_misses")
+        value = compute()
+        self.put(stage, key, value)
+        return value
+
+    def evict(self):
+        """
+        总大小超过上限时，删除最久未使用的产物
+        """
+        with self._lock:
+            stats = []
+            for p in self.root.glob("*/*"):
+                # 其他进程可能正在删除同一批产物：单个条目消失就跳过，不让整个阶段失败
+                try:
+                    if p.suffix in (".npy", ".pkl"):
+                        st = p.stat()
+                        stats.append((p, st.st_mtime, st.st_size))
+                    elif p.is_dir() and not p.name.endswith(".tmp") and not _in_use(p):
+                        size = sum(f.stat().st_size for f in p.iterdir())
+                        stats.append((p, p.stat().st_mtime, size))
+                except FileNotFoundError:
+                    continue
+
+            total = sum(size for _, _, size in stats)
+            if total <= self.max_bytes:
+                return
+
+            for path, _, size in sorted(stats, key=lambda x: x[1]):
+                if total <= self.max_bytes:
+                    break
+                if path.is_dir():
+                    shutil.rmtree(path, ignore_errors=True)
+                else:
+                    path.unlink(missing_ok=True)
+                total -= size
+
+
+def _in_use(path):
+    """
+    目录是否有活着的租约（本进程或其他进程）；持有者已退出的租约顺手删掉
+    """
+    if Path(os.path.abspath(path)) in _leases:
+        return True
+    for lease in path.glob(LEASE_PREFIX + "*"):
+        lock = FileLock(str(lease), timeout=0)
+        try:
+            lock.acquire()
+        except Timeout:
+            return True
+        lock.release()
+        lease.unlink(missing_ok=True)
+    return False
+
+
+_cache = None
+
+
+def get_cache():
+    global _cache
+    if _cache is None:
+        _cache = ArtifactCache()
+    return _cache
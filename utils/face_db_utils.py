@@ -1,68 +1,306 @@
+import heapq
 import os
 import json
+import shutil
 import cv2
 import numpy as np
-from .face_utils import extract_faces, cluster_faces
+from config import OUTPUT_DIR, face_db_paths
+from filelock import FileLock
+from .face_utils import OnlineFaceClusterer, cluster_faces, extract_face_store
+from .face_store_utils import FaceStore
+from .cache_utils import get_cache, video_hash
+from .frame_utils import FrameSampler
+from .identity_utils import pairwise_distances
+from .metrics_utils import get_trace
 
-OUTPUT_DIR = "outputs"
-FACE_DIR = os.path.join(OUTPUT_DIR, "faces")
-DB_PATH = os.path.join(OUTPUT_DIR, "face_db.json")
+N_REPRESENTATIVES = 5                                # 每人保存的代表向量数
+FACE_WORKERS = int(os.getenv("FACE_WORKERS", "0"))   # 人脸检测进程数，0/1 为串行
+FACE_INTERVAL = 15       # 缩短间隔防漏人！
+FACE_THRESHOLD = 0.45    # 略调低阈值更精细
+FACE_CLUSTERING = os.getenv("FACE_CLUSTERING", "dbscan")   # dbscan / online（长视频，内存有界）
+TOP_K_CROPS = 3          # 每人保留的人脸图数
+CROP_CANDIDATES = 8      # 每人按面积预选的候选数（再按清晰度挑 TOP_K_CROPS）
+THUMB_SIZE = 128         # 缩略图边长
+UNLABELLED_PREFIX = "未知人物_"   # 未校正的默认名字前缀（与 face_label_web.py 一致）
 
-def build_face_database(video_path):
-    if os.path.exists(DB_PATH):
-        print("✅ 已存在人物库，跳过人脸提取")
-        return
 
-    os.makedirs(FACE_DIR, exist_ok=True)
-    
-    # Step 1: 提取（现在返回更多信息）
-    encodings, frame_indices, face_boxes = extract_faces(video_path, interval=15)  # 缩短间隔防漏人！
-    
-    if not encodings:
-        print("未检测到任何人脸。")
-        return
-    
+def crop_quality(face_img):
+    """
+    廉价的人脸质量分：清晰度（拉普拉斯方差）× 尺寸（对数，避免大脸绝对占优）
+    """
+    gray = cv2.cvtColor(face_img, cv2.COLOR_BGR2GRAY)
+    sharpness = cv2.Laplacian(gray, cv2.CV_64F).var()
+    return sharpness * np.log1p(gray.shape[0] * gray.shape[1])
+
+
+def make_thumbnail(face_img, size=THUMB_SIZE):
+    """等比缩放到 size×size 以内，再居中填充成正方形"""
+    h, w = face_img.shape[:2]
+    scale = size / max(h, w)
+    resized = cv2.resize(face_img, (max(int(w * scale), 1), max(int(h * scale), 1)), interpolation=cv2.INTER_AREA)
+    thumb = np.zeros((size, size, 3), dtype=np.uint8)
+    y, x = (size - resized.shape[0]) // 2, (size - resized.shape[1]) // 2
+    thumb[y:y + resized.shape[0], x:x + resized.shape[1]] = resized
+    return thumb
+
+
+def extract_crops(video_path, clusters, frame_indices, face_boxes, top_k=TOP_K_CROPS, candidates=CROP_CANDIDATES):
+    """
+    为每个 cluster 挑选质量最高的 top_k 张人脸：
+    1. 每个 cluster 按 box 面积预选 candidates 个候选
+    2. 所有候选帧号汇总排序，一次顺序读取
+    3. 按 crop_quality 保留 top_k
+    返回 {cluster 下标: [(score, face_img), ...]}（按分数降序）
+    """
+    by_frame = {}
+    for i, cluster in enumerate(clusters):
+        def area(idx):
+            (top, right, bottom, left) = face_boxes[idx]
+            return (bottom - top) * (right - left)
+
+        for global_idx in sorted(cluster["indices"], key=area, reverse=True)[:candidates]:
+            by_frame.setdefault(int(frame_indices[global_idx]), []).append((i, global_idx))
+
+    crops = {i: [] for i in range(len(clusters))}
+    with FrameSampler(video_path) as sampler:
+        for frame_idx, frame in sampler.read_indices(by_frame):
+            h, w = frame.shape[:2]
+            for i, global_idx in by_frame[frame_idx]:
+                (top, right, bottom, left) = face_boxes[global_idx]
+                top, left = max(top, 0), max(left, 0)
+                bottom, right = min(bottom, h), min(right, w)
+                if bottom <= top or right <= left:
+                    continue
+
+                face_img = frame[top:bottom, left:right].copy()
+                heapq.heappush(crops[i], (crop_quality(face_img), global_idx, face_img))
+                if len(crops[i]) > top_k:
+                    heapq.heappop(crops[i])      # 只保留分数最高的 top_k
+
+    return {i: [(score, img) for score, _, img in sorted(heap, key=lambda x: -x[0])] for i, heap in crops.items()}
+
+
+def save_face_db(face_db, db_path):
+    """
+    写 face_db.json：持有与 face_label_web.py 相同的文件锁，写临时文件后原子替换，
+    不会和标注页面的保存交错，也不会被读到半个文件
+    """
+    with FileLock(db_path + ".lock"):
+        tmp = db_path + ".tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(face_db, f, ensure_ascii=False, indent=2)
+        os.replace(tmp, db_path)
+
+
+def clear_face_database(output_dir=OUTPUT_DIR):
+    """
+    删除输出目录下的人物库（face_db.json / .npz / .key 和 faces 目录下的人脸图）
+    """
+    face_dir, db_path, emb_path, key_path = face_db_paths(output_dir)
+    with FileLock(db_path + ".lock"):
+        for path in (db_path, emb_path, key_path):
+            if os.path.exists(path):
+                os.remove(path)
+        shutil.rmtree(face_dir, ignore_errors=True)
+
+
+def _read_db_key(key_path):
+    if not os.path.exists(key_path):
+        return None
+    with open(key_path, "r", encoding="utf-8") as f:
+        return f.read().strip()
+
+
+def save_face_embeddings(clusters, path):
+    """
+    保存每个 cluster 的中心向量和若干代表向量（离中心最近的成员）
+    ids 与 face_db.json 的 key 对应
+    """
+    ids, centers, samples, owners = [], [], [], []
+
+    for i, cluster in enumerate(clusters):
+        center = np.asarray(cluster["center"], dtype=np.float32)
+        members = np.asarray(cluster["members"], dtype=np.float32).reshape(-1, 128)
+        order = np.argsort(np.linalg.norm(members - center, axis=1))[:N_REPRESENTATIVES]
+
+        ids.append(i)
+        centers.append(center)
+        samples.append(members[order])
+        owners.extend([i] * len(order))
+
+    np.savez(
+        path,
+        ids=np.asarray(ids, dtype=np.int32),
+        centers=np.asarray(centers, dtype=np.float32),
+        samples=np.concatenate(samples).astype(np.float16),
+        owners=np.asarray(owners, dtype=np.int32),
+    )
+
+
+def load_face_embeddings(path):
+    """
+    读取人脸向量库，返回 dict: ids / centers / samples / owners
+    """
+    with np.load(path) as data:
+        return {
+            "ids": data["ids"],
+            "centers": data["centers"],
+            "samples": data["samples"].astype(np.float32),
+            "owners": data["owners"],
+        }
+
+
+def carry_over_names(clusters, db_path, emb_path, threshold=FACE_THRESHOLD):
+    """
+    重建人物库时沿用旧库里人工校正过的名字：
+    新 cluster 中心与旧库某人的中心距离 < threshold 时取该人的名字（默认名字不沿用）
+    返回 {新 cluster 下标: 名字}
+    """
+    if not (os.path.exists(db_path) and os.path.exists(emb_path)) or not clusters:
+        return {}
+    with open(db_path, "r", encoding="utf-8") as f:
+        old_db = json.load(f)
+    old = load_face_embeddings(emb_path)
+
+    labelled = [
+        j for j, pid in enumerate(old["ids"].tolist())
+        if not old_db.get(str(pid), {}).get("name", UNLABELLED_PREFIX).startswith(UNLABELLED_PREFIX)
+    ]
+    if not labelled:
+        return {}
+
+    centers = np.asarray([c["center"] for c in clusters], dtype=np.float32)
+    dists = pairwise_distances(centers, old["centers"][labelled])
+    nearest = np.argmin(dists, axis=1)
+
+    names = {}
+    for i, j in enumerate(nearest.tolist()):
+        if dists[i, j] < threshold:
+            names[i] = old_db[str(int(old["ids"][labelled[j]]))]["name"]
+    return names
+
+
+def face_store_path(video_path, interval=FACE_INTERVAL, shots=None, cache=None):
+    """
+    逐帧人脸库的缓存 key 和目录: (faces_key, path)
+    """
+    cache = cache or get_cache()
+    faces_key = cache.key("faces", video_hash(video_path), interval=interval, shots=shots)
+    return faces_key, cache.artifact_dir("face_store", faces_key)
+
+
+def get_face_store(video_path, interval=FACE_INTERVAL, shots=None, cache=None, frames=None):
+    """
+    逐帧人脸库按 (视频内容指纹, interval, shots) 缓存在 cache 目录下；
+    已存在时直接内存映射读取，不再解码视频
+    frames: 单次读取上的 FrameStream（见 extract_face_store），命中缓存时关闭它
+    返回 (faces_key, FaceStore)
+    """
+    cache = cache or get_cache()
+    faces_key, path = face_store_path(video_path, interval=interval, shots=shots, cache=cache)
+
+    if FaceStore.exists(path):
+        if frames is not None:
+            frames.close()
+        os.utime(path)      # 记录最近使用时间，供 LRU 淘汰
+        print("♻️ 命中缓存：face_store")
+        cache.lease(path)   # 本次运行内存映射着它，淘汰时跳过
+        return faces_key, FaceStore(path)
+
+    store = extract_face_store(
+        video_path, path, interval=interval, workers=FACE_WORKERS, shots=shots, frames=frames
+    )
+    cache.lease(path)
+    cache.evict()
+    return faces_key, store
+
+
+def _cluster_online(store, threshold, block=4096):
+    clusterer = OnlineFaceClusterer(threshold)
+    for lo in range(0, len(store), block):
+        for i, enc in enumerate(np.asarray(store.encodings[lo:lo + block]), start=lo):
+            clusterer.add(enc, i)
+    clusters, _ = clusterer.finalize()
+    return clusters
+
+
+def build_face_database(video_path, interval=FACE_INTERVAL, threshold=FACE_THRESHOLD, cache=None,
+                        output_dir=OUTPUT_DIR, shots=None, clustering=FACE_CLUSTERING, frames=None):
+    """
+    人脸检测结果写入逐帧人脸库（见 get_face_store），聚类结果按 (人脸库 key, threshold) 缓存；
+    调整阈值或换聚类方式只需重新聚类，不再解码视频
+    face_db.json 只有在聚类结果变化时才重建；重建时按 cluster 中心匹配旧库，沿用已校正的人名
+    shots 不为 None 时按镜头采样人脸（见 extract_faces）
+    clustering="online" 时分块流式聚类，内存只与人物数有关
+    frames: 按固定间隔采样时，可以传入注册在 MediaReader 单次读取上的 FrameStream，不再单独打开视频 seek
+    返回逐帧人脸库 FaceStore，供说话人识别直接查询
+    """
+    face_dir, db_path, emb_path, key_path = face_db_paths(output_dir)
+    cache = cache or get_cache()
+
+    # Step 1: 提取（逐帧落盘，内存映射读取）
+    faces_key, store = get_face_store(video_path, interval=interval, shots=shots, cache=cache, frames=frames)
+    frame_indices, face_boxes = store.face_frames, store.boxes
+
     # Step 2: 聚类
-    clusters = cluster_faces(encodings, threshold=0.45)  # 略调低阈值更精细
-    
-    # Step 3: 重新打开视频，按需读取帧裁剪代表图
-    cap = cv2.VideoCapture(video_path)
+    if clustering == "online":
+        clusters_key = cache.key("clusters_online", faces_key, threshold=threshold)
+        clusters = cache.get_or_compute("clusters_online", clusters_key, lambda: _cluster_online(store, threshold))
+    else:
+        clusters_key = cache.key("clusters", faces_key, threshold=threshold)
+        clusters = cache.get_or_compute(
+            "clusters", clusters_key, lambda: cluster_faces(np.asarray(store.encodings), threshold=threshold)
+        )
+
+    get_trace().gauge("face_clusters", len(clusters))
+    if not clusters:
+        print("未检测到任何人脸。")
+        clear_face_database(output_dir)    # 不能留着上一个视频的人物库，否则说话人会被标成别的视频里的人
+        return store
+
+    if os.path.exists(db_path) and _read_db_key(key_path) == clusters_key:
+        print("✅ 人物库与当前视频一致，跳过重建")
+        return store
+
+    # Step 3: 一次按帧号顺序读取所有候选帧，每人保留质量最高的几张人脸
+    crops = extract_crops(video_path, clusters, frame_indices, face_boxes)
+    names = carry_over_names(clusters, db_path, emb_path, threshold=threshold)
+    if names:
+        print(f"♻️ 沿用已校正的名字：{len(names)} 人")
+
+    # 清掉旧的人脸图：人数变少时，多出来的 person_N*.jpg 不能留给标注页面
+    shutil.rmtree(face_dir, ignore_errors=True)
+    os.makedirs(os.path.join(face_dir, "thumbs"), exist_ok=True)
+
     face_db = {}
-    
-    for i, cluster in enumerate(clusters):
-        # 从该 cluster 中选择“最佳”人脸：比如 box 面积最大（通常最清晰）
-        best_idx = None
-        best_area = -1
-        for local_idx, global_idx in enumerate(cluster["indices"]):
-            frame_idx = frame_indices[global_idx]
-            (top, right, bottom, left) = face_boxes[global_idx]
-            area = (bottom - top) * (right - left)
-            if area > best_area:
-                best_area = area
-                best_idx = global_idx  # 全局索引
-        
-        # 读取对应帧并裁剪
-        target_frame_idx = frame_indices[best_idx]
-        cap.set(cv2.CAP_PROP_POS_FRAMES, target_frame_idx)
-        ret, frame = cap.read()
-        if not ret:
+    for i in range(len(clusters)):
+        if not crops[i]:
             continue
-        
-        (top, right, bottom, left) = face_boxes[best_idx]
-        face_img = frame[top:bottom, left:right]
-        path = f"faces/person_{i}.jpg"
-        img_path = os.path.join(OUTPUT_DIR, path)
-        cv2.imwrite(img_path, face_img)
-        
+
+        paths = []
+        for rank, (_, face_img) in enumerate(crops[i]):
+            path = f"faces/person_{i}.jpg" if rank == 0 else f"faces/person_{i}_{rank}.jpg"
+            cv2.imwrite(os.path.join(output_dir, path), face_img)
+            paths.append(path)
+
+        # 预先缩好的缩略图，供标注页面使用
+        thumb = f"faces/thumbs/person_{i}.jpg"
+        cv2.imwrite(os.path.join(output_dir, thumb), make_thumbnail(crops[i][0][1]))
+
         face_db[str(i)] = {
-            "name": f"未知人物_{i}",
-            "image": path
+            "name": names.get(i, f"{UNLABELLED_PREFIX}{i}"),
+            "image": paths[0],
+            "thumb": thumb,
+            "crops": paths,
+            "count": int(clusters[i].get("count", len(clusters[i]["indices"]))),
         }
+
+    # 保存数据库（向量库 + 名字库 + 来源 key）
+    save_face_embeddings(clusters, emb_path)
+    save_face_db(face_db, db_path)
+    with open(key_path + ".tmp", "w", encoding="utf-8") as f:
+        f.write(clusters_key)
+    os.replace(key_path + ".tmp", key_path)
     
-    cap.release()
-    
-    # 保存数据库
-    with open(db_path, "w", encoding="utf-8") as f:
-        json.dump(face_db, f, ensure_ascii=False, indent=2)
-    
-    print(f"✅ 人脸数据库构建完成，共识别 {len(clusters)} 人。")
\ No newline at end of file
+    print(f"✅ 人脸数据库构建完成，共识别 {len(clusters)} 人。")
+    return store
@@ -0,0 +1,212 @@
+import json
+import os
+import shutil
+from pathlib import Path
+
+import numpy as np
+
+from .metrics_utils import get_trace
+
+FACE_DIM = 128
+
+# 文件名: (dtype, 每行宽度)；每个文件都是按行追加的原始二进制，读取时 np.memmap
+FRAME_FIELDS = {
+    "frames": (np.int64, 1),            # 已分析的帧号（含没有人脸的帧）
+}
+FACE_FIELDS = {
+    "face_frames": (np.int64, 1),       # 每张人脸所在帧号
+    "times": (np.float64, 1),           # 每张人脸的时间戳（秒）
+    "boxes": (np.int32, 4),             # (top, right, bottom, left)
+    "encodings": (np.float32, FACE_DIM),
+}
+META_FILE = "meta.json"
+PROGRESS_FILE = "progress.json"
+FLUSH_FRAMES = 50          # 每分析多少帧落一次检查点
+
+
+class FaceStoreWriter:
+    """
+    按帧顺序追加检测结果，写在 <path>.tmp 里：
+    1. 每分析 FLUSH_FRAMES 帧 fsync 一次并写 progress.json（已提交的帧数 / 人脸数 / 最后帧号）
+    2. 中断（异常或进程被杀）后再次打开同一 path，参数一致时截断到已提交的位置继续写，
+       last_frame 之前的帧不必重新分析
+    3. close() 时写 meta.json 并把临时目录原子改名为正式目录（meta.json 存在即代表完整可用）
+    """
+
+    def __init__(self, path, fps, flush_frames=None, **meta):
+        self.path = Path(path)
+        self.tmp = self.path.with_name(self.path.name + ".tmp")
+        self.flush_frames = flush_frames or FLUSH_FRAMES
+        self.meta = {"fps": fps, **meta}
+
+        progress = self._read_progress()
+        if progress is None:
+            shutil.rmtree(self.tmp, ignore_errors=True)
+            self.tmp.mkdir(parents=True)
+            progress = {"n_frames": 0, "n_faces": 0, "last_frame": -1}
+
+        self.n_frames = progress["n_frames"]
+        self.n_faces = progress["n_faces"]
+        self.last_frame = progress["last_frame"]
+        self._committed = self.n_frames
+
+        self._files = {}
+        for fields, rows in ((FRAME_FIELDS, self.n_frames), (FACE_FIELDS, self.n_faces)):
+            for name, (dtype, width) in fields.items():
+                f = open(self.tmp / f"{name}.bin", "ab")
+                f.truncate(rows * width * np.dtype(dtype).itemsize)     # 丢弃检查点之后写了一半的数据
+                self._files[name] = f
+
+    def _read_progress(self):
+        path = self.tmp / PROGRESS_FILE
+        if not path.exists():
+            return None
+        with open(path, "r", encoding="utf-8") as f:
+            progress = json.load(f)
+        if progress.get("meta") != self.meta:
+            return None
+        return progress
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, *exc):
+        if exc_type is None:
+            self.close()
+        else:
+            # 保留已完成的部分，下次从检查点继续
+            self.checkpoint()
+            for f in self._files.values():
+                f.close()
+
+    def _write(self, name, fields, values):
+        dtype, width = fields[name]
+        self._files[name].write(np.asarray(values, dtype=dtype).reshape(-1, width).tobytes())
+
+    def add_frame(self, frame_idx, faces):
+        """
+        faces: [(encoding, box), ...]（analyse_frame 的输出）
+        帧号不大于 last_frame 的帧（已在上次运行中写入）直接忽略
+        """
+        if frame_idx <= self.last_frame:
+            return
+
+        self._write("frames", FRAME_FIELDS, [frame_idx])
+        self.n_frames += 1
+        self.last_frame = frame_idx
+        if faces:
+            encs, boxes = zip(*faces)
+            self._write("face_frames", FACE_FIELDS, [frame_idx] * len(faces))
+            self._write("times", FACE_FIELDS, [frame_idx / self.meta["fps"]] * len(faces))
+            self._write("boxes", FACE_FIELDS, boxes)
+            self._write("encodings", FACE_FIELDS, encs)
+            self.n_faces += len(faces)
+
+        if self.n_frames - self._committed >= self.flush_frames:
+            self.checkpoint()
+
+    def checkpoint(self):
+        """
+        数据文件先 fsync，再原子替换 progress.json
+        """
+        for f in self._files.values():
+            f.flush()
+            os.fsync(f.fileno())
+
+        progress = {
+            "meta": self.meta, "n_frames": self.n_frames, "n_faces": self.n_faces, "last_frame": self.last_frame,
+        }
+        tmp = self.tmp / (PROGRESS_FILE + ".tmp")
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(progress, f)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, self.tmp / PROGRESS_FILE)
+        self._committed = self.n_frames
+
+    def close(self):
+        for f in self._files.values():
+            f.close()
+
+        trace = get_trace()
+        trace.count("frames_analysed", self.n_frames)
+        trace.count("faces_detected", self.n_faces)
+
+        meta = {**self.meta, "n_frames": self.n_frames, "n_faces": self.n_faces}
+        with open(self.tmp / META_FILE, "w", encoding="utf-8") as f:
+            json.dump(meta, f)
+        (self.tmp / PROGRESS_FILE).unlink(missing_ok=True)
+
+        shutil.rmtree(self.path, ignore_errors=True)
+        os.replace(self.tmp, self.path)
+
+
+def _memmap(path, dtype, width, rows):
+    if rows == 0:
+        return np.zeros((0, width) if width > 1 else 0, dtype=dtype)
+    shape = (rows, width) if width > 1 else (rows,)
+    return np.memmap(path, dtype=dtype, mode="r", shape=shape)
+
+
+class FaceStore:
+    """
+    逐帧人脸检测结果（内存映射，只读）：
+    frames / frame_times：已分析的帧；face_frames / times / boxes / encodings：每张人脸一行
+    帧号单调递增，可以按时间区间二分查找；重新聚类、改阈值、重新绑定说话人都不用再解码视频
+    """
+
+    def __init__(self, path):
+        self.path = Path(path)
+        with open(self.path / META_FILE, "r", encoding="utf-8") as f:
+            self.meta = json.load(f)
+        self.fps = self.meta["fps"]
+
+        for fields, rows in ((FRAME_FIELDS, self.meta["n_frames"]), (FACE_FIELDS, self.meta["n_faces"])):
+            for name, (dtype, width) in fields.items():
+                setattr(self, name, _memmap(self.path / f"{name}.bin", dtype, width, rows))
+        self.frame_times = np.asarray(self.frames) / self.fps   # 每个已分析帧一个，常驻内存
+
+    @staticmethod
+    def exists(path):
+        return (Path(path) / META_FILE).exists()
+
+    def __len__(self):
+        return len(self.encodings)
+
+    def faces_between(self, start, end):
+        """
+        时间落在 [start, end) 内的人脸行号区间 slice
+        """
+        lo, hi = np.searchsorted(self.times, [start, end], side="left")
+        return slice(int(lo), int(hi))
+
+    def frames_between(self, start, end):
+        """
+        [start, end) 内已分析的帧号
+        """
+        lo, hi = np.searchsorted(self.frame_times, [start, end], side="left")
+        return self.frames[lo:hi]
+
+    def nearest_frame(self, t):
+        """
+        离 t 最近的已分析帧: (帧号, 时间差)；没有已分析帧时返回 (None, inf)
+        """
+        if not len(self.frames):
+            return None, float("inf")
+        i = int(np.searchsorted(self.frame_times, t))
+        candidates = [j for j in (i - 1, i) if 0 <= j < len(self.frames)]
+        j = min(candidates, key=lambda j: abs(self.frame_times[j] - t))
+        return int(self.frames[j]), abs(float(self.frame_times[j]) - t)
+
+
+def build_face_store(path, frame_results, fps, **meta):
+    """
+    frame_results(after_frame): 产出 after_frame 之后逐帧的 (frame_idx, [(encoding, box), ...])
+    上次中断留下的检查点会被续用（见 FaceStoreWriter），只分析剩下的帧
+    """
+    with FaceStoreWriter(path, fps, **meta) as writer:
+        if writer.last_frame >= 0:
+            print(f"⏩ 从第 {writer.last_frame + 1} 帧继续人脸检测（已分析 {writer.n_frames} 帧）")
+        for frame_idx, faces in frame_results(writer.last_frame):
+            writer.add_frame(frame_idx, faces)
+    return FaceStore(path)
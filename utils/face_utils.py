@@ -1,56 +1,186 @@
+import itertools
+import math
+import multiprocessing
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import shared_memory
+
 import cv2
-import face_recognition
 import numpy as np
-from sklearn.cluster import DBSCAN
+
+from .face_store_utils import build_face_store
+from .frame_utils import FrameSampler
+from .identity_utils import pairwise_distances
+from .shot_utils import shot_sample_times
+
+
+def analyse_frame(frame):
+    """
+    检测并编码一帧中的人脸，返回 [(encoding, box), ...]
+    """
+    import face_recognition     # 延迟导入 dlib：只有真正检测时才加载
+
+    # 可选：缩放帧以加速（如 width=640）
+    scale = 640 / max(frame.shape[1], 1)
+    if scale < 1:
+        small_frame = cv2.resize(frame, (0, 0), fx=scale, fy=scale)
+    else:
+        small_frame = frame
+
+    # 检测人脸（使用 HOG，但 on smaller image）
+    boxes = face_recognition.face_locations(small_frame, model="hog")
+    if not boxes:
+        return []
+
+    # 恢复原始坐标（如果缩放过）
+    orig_boxes = [(int(top/scale), int(right/scale), int(bottom/scale), int(left/scale)) 
+                  for (top, right, bottom, left) in boxes]
+    encs = face_recognition.face_encodings(frame, known_face_locations=orig_boxes)
+    return list(zip(encs, orig_boxes))
+
+
+# ---------- 多进程：共享内存传帧，避免 pickle 整张图 ----------
+
+_worker_slots = {}
+
+
+def _init_worker(slot_names):
+    for name in slot_names:
+        _worker_slots[name] = shared_memory.SharedMemory(name=name)
+
+
+def _analyse_slot(slot_name, shape, frame_idx):
+    frame = np.ndarray(shape, dtype=np.uint8, buffer=_worker_slots[slot_name].buf)
+    return frame_idx, analyse_frame(frame)
+
+
+def _analyse_parallel(frames, workers):
+    """
+    单个解码器 + 进程池：
+    解码后的帧写入共享内存槽位，worker 按槽位名读取；
+    按提交顺序取回结果，保证与串行路径输出一致
+    """
+    frames = iter(frames)
+    first = next(frames, None)
+    if first is None:
+        return
+
+    shape = first[1].shape
+    n_slots = workers * 2
+    slots = [shared_memory.SharedMemory(create=True, size=first[1].nbytes) for _ in range(n_slots)]
+    free = deque(slots)
+    pending = deque()     # (future, slot)
+
+    try:
+        with ProcessPoolExecutor(
+            max_workers=workers,
+            initializer=_init_worker,
+            initargs=([slot.name for slot in slots],),
+            # 流水线在多线程中调用这里，fork 可能复制到别的线程持有的锁；用 spawn 启动干净的进程
+            mp_context=multiprocessing.get_context("spawn"),
+        ) as pool:
+            for frame_idx, frame in itertools.chain([first], frames):
+                if not free:
+                    future, slot = pending.popleft()
+                    yield future.result()
+                    free.append(slot)
+
+                slot = free.popleft()
+                np.ndarray(shape, dtype=np.uint8, buffer=slot.buf)[:] = frame
+                pending.append((pool.submit(_analyse_slot, slot.name, shape, frame_idx), slot))
+
+            while pending:
+                future, _ = pending.popleft()
+                yield future.result()
+    finally:
+        for slot in slots:
+            slot.close()
+            slot.unlink()
+
+
+def _analyse_frames(sampler, interval, workers, shots, per_shot, after_frame=-1):
+    """
+    逐帧产出 (frame_idx, [(encoding, box), ...])，包括没有人脸的帧
+    after_frame >= 0 时只分析该帧之后的采样点（断点续跑）
+    """
+    after = (after_frame + 0.5) / sampler.fps if after_frame >= 0 else -1.0
+
+    # 只解码需要分析的帧，不再逐帧 cap.read()
+    if shots is not None:
+        times = [t for t in shot_sample_times(shots, per_shot, max_gap=interval) if t > after]
+        frames = sampler.iter_times(times)
+    else:
+        start = (math.floor(after / interval) + 1) * interval if after >= 0 else 0.0
+        frames = sampler.iter_interval(interval, start=start)
+    return _analyse_iter(frames, workers)
+
+
+def _analyse_iter(frames, workers):
+    if workers > 1:
+        return _analyse_parallel(frames, workers)
+    return ((frame_idx, analyse_frame(frame)) for frame_idx, frame in frames)
+
+
+def iter_faces(video_path, interval=30, keyframes_only=False, workers=0, shots=None, per_shot=1):
+    """
+    流式产出检测到的人脸: (encoding, frame_idx, box)
+    workers > 1 时启用多进程检测/编码，结果顺序与串行一致
+    shots 不为 None 时按镜头采样：每个镜头取 per_shot 帧，长镜头每 interval 秒补一帧
+    """
+    with FrameSampler(video_path, keyframes_only=keyframes_only) as sampler:
+        for frame_idx, faces in _analyse_frames(sampler, interval, workers, shots, per_shot):
+            for enc, box in faces:
+                yield enc, frame_idx, box
+
+
+def extract_face_store(video_path, path, interval=30, keyframes_only=False, workers=0, shots=None, per_shot=1,
+                       frames=None):
+    """
+    检测结果逐帧写入 path 下的 FaceStore（见 face_store_utils），返回 FaceStore
+    每 FLUSH_FRAMES 帧落一次检查点，中断后再次调用从检查点继续
+    frames: 注册在正在进行的 MediaReader 单次读取上的 FrameStream（按 interval 取帧）；
+       为 None 时自己打开视频稀疏 seek；其余参数见 iter_faces
+    """
+    if frames is not None:
+        return build_face_store(
+            path,
+            lambda after_frame: _analyse_iter(((i, f) for i, f in frames if i > after_frame), workers),
+            frames.fps,
+            interval=interval, keyframes_only=False,
+        )
+
+    with FrameSampler(video_path, keyframes_only=keyframes_only) as sampler:
+        return build_face_store(
+            path,
+            lambda after_frame: _analyse_frames(sampler, interval, workers, shots, per_shot, after_frame),
+            sampler.fps,
+            interval=interval, keyframes_only=keyframes_only,
+        )
+
 
 # 返回: (encodings, frame_indices, face_locations_per_frame)
-def extract_faces(video_path, interval=30):
-    cap = cv2.VideoCapture(video_path)
-    fps = cap.get(cv2.CAP_PROP_FPS)
-    total_frames = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
-    if fps <= 0:
-        raise ValueError("无法读取视频帧率")
-    
-    frame_interval = int(fps * interval)
+def extract_faces(video_path, interval=30, keyframes_only=False, workers=0, shots=None, per_shot=1):
+    """
+    参数见 iter_faces
+    """
     encodings = []
     frame_indices = []      # 记录每张人脸来自哪一帧
     face_boxes = []         # 记录每张人脸的 bounding box
 
-    frame_idx = 0
-    while cap.isOpened():
-        ret, frame = cap.read()
-        if not ret:
-            break
-
-        if frame_idx % frame_interval == 0:
-            # 可选：缩放帧以加速（如 width=640）
-            scale = 640 / max(frame.shape[1], 1)
-            if scale < 1:
-                small_frame = cv2.resize(frame, (0, 0), fx=scale, fy=scale)
-            else:
-                small_frame = frame
-
-            # 检测人脸（使用 HOG，但 on smaller image）
-            boxes = face_recognition.face_locations(small_frame, model="hog")
-            if boxes:
-                # 恢复原始坐标（如果缩放过）
-                orig_boxes = [(int(top/scale), int(right/scale), int(bottom/scale), int(left/scale)) 
-                              for (top, right, bottom, left) in boxes]
-                encs = face_recognition.face_encodings(frame, known_face_locations=orig_boxes)
-                for enc, box in zip(encs, orig_boxes):
-                    encodings.append(enc)
-                    frame_indices.append(frame_idx)
-                    face_boxes.append(box)
-        frame_idx += 1
-
-    cap.release()
+    for enc, frame_idx, box in iter_faces(video_path, interval, keyframes_only, workers, shots, per_shot):
+        encodings.append(enc)
+        frame_indices.append(frame_idx)
+        face_boxes.append(box)
+
     return encodings, frame_indices, face_boxes
 
 
 
 def cluster_faces(encodings, threshold=0.5):
-    if not encodings:
+    if len(encodings) == 0:
         return []
+
+    from sklearn.cluster import DBSCAN
     
     # 转为 numpy array
     X = np.array(encodings)
@@ -69,8 +199,9 @@ def cluster_faces(encodings, threshold=0.5):
         center = members.mean(axis=0)
         clusters.append({
             "center": center,
-            "members": members.tolist(),
-            "indices": np.where(labels == label)[0].tolist()  # 成员在原列表中的索引
+            "members": members,     # 直接保留数组，不再 tolist() 复制一份
+            "indices": np.where(labels == label)[0].tolist(),  # 成员在原列表中的索引
+            "count": len(members),
         })
     
     # 处理噪声点：每个单独成簇（可选）
@@ -78,8 +209,127 @@ def cluster_faces(encodings, threshold=0.5):
     for idx in noise_indices:
         clusters.append({
             "center": X[idx],
-            "members": [X[idx].tolist()],
-            "indices": [idx]
+            "members": X[idx:idx + 1],
+            "indices": [int(idx)],
+            "count": 1,
         })
     
-    return clusters
\ No newline at end of file
+    return clusters
+
+
+class OnlineFaceClusterer:
+    """
+    流式人脸聚类（内存有界）：
+    1. 每个向量归入最近的中心（距离 < threshold），否则新建一簇
+    2. 每簇只保存 中心 / 数量 / 至多 reservoir_size 个样本（蓄水池抽样）
+    3. finalize() 时把中心距离 < threshold 的簇合并（并查集）
+    输出格式与 cluster_faces 相同，members / indices 为蓄水池中的样本
+    """
+
+    def __init__(self, threshold=0.5, reservoir_size=32, seed=0):
+        self.threshold = threshold
+        self.reservoir_size = reservoir_size
+        self.rng = np.random.default_rng(seed)
+
+        self.centers = np.zeros((64, 128), dtype=np.float64)   # 预分配，按需倍增
+        self.counts = []
+        self.samples = []      # 每簇 [(index, vector), ...]
+        self.labels = []       # 每个输入向量所属簇号（int，只占少量内存）
+
+    def __len__(self):
+        return len(self.counts)
+
+    def add(self, enc, index=None):
+        enc = np.asarray(enc, dtype=np.float64)
+        index = len(self.labels) if index is None else index
+        k = len(self.counts)
+
+        label = -1
+        if k:
+            dists = np.linalg.norm(self.centers[:k] - enc, axis=1)
+            nearest = int(np.argmin(dists))
+            if dists[nearest] < self.threshold:
+                label = nearest
+
+        if label < 0:
+            label = k
+            if k == len(self.centers):
+                self.centers = np.concatenate([self.centers, np.zeros_like(self.centers)])
+            self.centers[k] = enc
+            self.counts.append(1)
+            self.samples.append([(index, enc.astype(np.float32))])
+        else:
+            self.counts[label] += 1
+            n = self.counts[label]
+            self.centers[label] += (enc - self.centers[label]) / n     # 增量均值
+            self._reservoir_add(self.samples[label], n, index, enc)
+
+        self.labels.append(label)
+        return label
+
+    def _reservoir_add(self, reservoir, n, index, enc):
+        if len(reservoir) < self.reservoir_size:
+            reservoir.append((index, enc.astype(np.float32)))
+        else:
+            j = int(self.rng.integers(n))
+            if j < self.reservoir_size:
+                reservoir[j] = (index, enc.astype(np.float32))
+
+    def _merge_groups(self):
+        # 并查集：中心距离 < threshold 的簇归为一组；分块计算距离，避免 K×K 一次占满内存
+        k = len(self.counts)
+        parent = list(range(k))
+
+        def find(x):
+            while parent[x] != x:
+                parent[x] = parent[parent[x]]
+                x = parent[x]
+            return x
+
+        C = self.centers[:k]
+        for lo in range(0, k, 1024):
+            block = pairwise_distances(C[lo:lo + 1024], C)
+            for a, b in zip(*np.nonzero(block < self.threshold)):
+                a += lo
+                if a < b:
+                    ra, rb = find(a), find(b)
+                    if ra != rb:
+                        parent[max(ra, rb)] = min(ra, rb)
+
+        return [find(x) for x in range(k)]
+
+    def finalize(self):
+        """
+        合并相近的簇，返回 (clusters, labels)
+        labels[i] 为第 i 个输入向量最终所属的簇下标
+        """
+        roots = self._merge_groups()
+        order = sorted(set(roots))              # 按首次出现顺序编号
+        new_id = {r: i for i, r in enumerate(order)}
+
+        groups = {}
+        for c, r in enumerate(roots):
+            groups.setdefault(r, []).append(c)
+
+        clusters = []
+        for r in order:
+            members = groups[r]
+            counts = np.asarray([self.counts[c] for c in members], dtype=np.float64)
+            center = (self.centers[members] * counts[:, None]).sum(axis=0) / counts.sum()
+
+            # 合并蓄水池：每个样本的权重 = 所在簇数量 / 该簇样本数，按权重无放回抽样
+            pool = [(s, self.counts[c] / len(self.samples[c])) for c in members for s in self.samples[c]]
+            if len(pool) > self.reservoir_size:
+                w = np.asarray([x[1] for x in pool])
+                pick = self.rng.choice(len(pool), self.reservoir_size, replace=False, p=w / w.sum())
+                pool = [pool[i] for i in sorted(pick)]
+
+            clusters.append({
+                "center": center,
+                "members": np.stack([s[1] for s, _ in pool]),
+                "indices": [s[0] for s, _ in pool],
+                "count": int(counts.sum()),
+            })
+
+        labels = np.asarray([new_id[roots[c]] for c in self.labels], dtype=np.int32)
+        return clusters, labels
\ No newline at end of file
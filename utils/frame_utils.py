@@ -0,0 +1,155 @@
+import av
+
+from .metrics_utils import get_trace
+
+# 前后两个目标时间相差超过该秒数时才 seek，否则顺序解码更便宜
+SEEK_THRESHOLD = 2.0
+
+
+class FrameSampler:
+    """
+    稀疏抽帧器（基于 PyAV）：
+    1. 只解码到请求的时间点，远距离跳转时 seek 到最近的关键帧
+    2. keyframes_only=True 时解码器只输出关键帧（每个目标只解码一帧）
+    3. decoded_frames 记录实际解码的帧数，read_frames 记录实际产出的帧数，用于评估抽帧开销
+       （close 时计入当前 Trace）
+    """
+
+    def __init__(self, video_path, keyframes_only=False, seek_threshold=SEEK_THRESHOLD):
+        self.container = av.open(str(video_path))
+        self.stream = self.container.streams.video[0]
+        self.stream.thread_type = "AUTO"    # 多线程解码
+        if keyframes_only:
+            self.stream.codec_context.skip_frame = "NONKEY"
+
+        rate = self.stream.average_rate or self.stream.guessed_rate
+        self.fps = float(rate) if rate else 0.0
+        if self.fps <= 0:
+            raise ValueError("无法读取视频帧率")
+
+        self.keyframes_only = keyframes_only
+        self.seek_threshold = seek_threshold
+        self.time_base = self.stream.time_base
+        self.start_time = float(self.stream.start_time * self.time_base) if self.stream.start_time else 0.0
+
+        if self.stream.duration:
+            self.duration = float(self.stream.duration * self.time_base)
+        elif self.container.duration:
+            self.duration = self.container.duration / av.time_base
+        else:
+            self.duration = 0.0
+        self.frame_count = self.stream.frames or int(self.duration * self.fps)
+
+        self.decoded_frames = 0
+        self.read_frames = 0
+        self._frames = None     # 当前解码迭代器
+        self._last = None       # 最近解码的 (时间, av.VideoFrame)
+        self._seek_time = 0.0
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def close(self):
+        self.container.close()
+        trace = get_trace()
+        trace.count("frames_decoded", self.decoded_frames)
+        trace.count("frames_read", self.read_frames)
+
+    def _seek(self, t):
+        # backward=True：落到 t 之前最近的关键帧
+        offset = int((t + self.start_time) / self.time_base)
+        self.container.seek(max(offset, 0), backward=True, any_frame=False, stream=self.stream)
+        self._frames = self.container.decode(self.stream)
+        self._last = None
+        self._seek_time = t
+
+    def _next(self):
+        frame = next(self._frames, None)
+        if frame is None:
+            return None
+        self.decoded_frames += 1
+        if frame.time is not None:
+            t = float(frame.time) - self.start_time
+        elif self._last is not None:
+            t = self._last[0] + 1 / self.fps     # 没有时间戳的帧：按上一帧 + 帧间隔推算
+        else:
+            t = self._seek_time
+        self._last = (t, frame)
+        return self._last
+
+    def _decode_to(self, t):
+        half = 0.5 / self.fps
+
+        if self.keyframes_only:
+            # 每个目标都 seek 一次，只解码关键帧本身
+            self._seek(t)
+            return self._next()
+
+        if (
+            self._frames is None
+            or (self._last is not None and t < self._last[0] - half)
+            or (self._last is not None and t - self._last[0] > self.seek_threshold)
+        ):
+            self._seek(t)
+
+        while self._last is None or self._last[0] < t - half:
+            if self._next() is None:
+                return None
+        return self._last
+
+    def read_at(self, timestamps):
+        """
+        按时间顺序读取若干时间点的帧（自动排序去重）
+        逐个产出: (请求时间, 帧号, BGR 图像)
+        """
+        for t in sorted(set(timestamps)):
+            hit = self._decode_to(max(t, 0.0))
+            if hit is None:
+                break
+            frame_time, frame = hit
+            self.read_frames += 1
+            yield t, int(round(frame_time * self.fps)), frame.to_ndarray(format="bgr24")
+
+    def read_indices(self, frame_indices):
+        """
+        按帧号读取，逐个产出: (请求帧号, BGR 图像)
+        """
+        by_time = {idx / self.fps: idx for idx in set(frame_indices)}
+        for t, _, image in self.read_at(by_time):
+            yield by_time[t], image
+
+    def iter_times(self, timestamps):
+        """
+        读取给定时间点的帧（同一帧只产出一次）
+        逐个产出: (帧号, BGR 图像)
+        """
+        seen = set()
+        for _, frame_idx, image in self.read_at(timestamps):
+            if frame_idx not in seen:
+                seen.add(frame_idx)
+                yield frame_idx, image
+
+    def iter_interval(self, interval, start=0.0):
+        """
+        从 start 秒起每隔 interval 秒取一帧（同一帧只产出一次）
+        逐个产出: (帧号, BGR 图像)
+        """
+        seen = set()
+        t = start
+        while not self.duration or t <= self.duration:
+            hit = self._decode_to(t)
+            if hit is None:
+                break
+            frame_time, frame = hit
+            frame_idx = int(round(frame_time * self.fps))
+            t += interval
+            if frame_idx in seen:
+                if not self.duration:
+                    break   # 时长未知且已无新帧
+                continue
+            seen.add(frame_idx)
+            self.read_frames += 1
+            yield frame_idx, frame.to_ndarray(format="bgr24")
@@ -0,0 +1,121 @@
+import numpy as np
+
+# 已知向量超过该数量时，auto 模式自动启用近似检索（IVF）
+ANN_MIN_SIZE = 2000
+
+
+class IdentityIndex:
+    """
+    已知人脸向量索引：
+    1. 所有已知向量保存在一个连续的 float32 矩阵里
+    2. 一批查询向量（可来自多帧）一次矩阵运算得到全部距离
+    3. mode="ivf" 时先用 k-means 粗聚类，只在最近的 nprobe 个桶里精确比对
+    """
+
+    def __init__(self, encodings, names, mode="auto", n_lists=None, nprobe=8):
+        self.matrix = np.ascontiguousarray(np.asarray(encodings, dtype=np.float32).reshape(-1, 128))
+        self.names = list(names)
+        if len(self.names) != len(self.matrix):
+            raise ValueError("encodings 与 names 数量不一致")
+        self.sq_norms = np.einsum("ij,ij->i", self.matrix, self.matrix)
+
+        if mode == "auto":
+            mode = "ivf" if len(self.matrix) >= ANN_MIN_SIZE else "exact"
+        if mode not in ("exact", "ivf"):
+            raise ValueError(f"未知索引模式: {mode}")
+        self.mode = mode
+
+        self.nprobe = nprobe
+        if mode == "ivf":
+            self._build_ivf(n_lists or max(int(np.sqrt(len(self.matrix))), 1))
+
+    def __len__(self):
+        return len(self.matrix)
+
+    def _build_ivf(self, n_lists, iters=10):
+        # 简单 k-means（确定性初始化），不引入额外依赖
+        rng = np.random.default_rng(0)
+        n_lists = min(n_lists, len(self.matrix))
+        centroids = self.matrix[rng.choice(len(self.matrix), n_lists, replace=False)].copy()
+
+        for _ in range(iters):
+            assign = self._nearest(self.matrix, centroids)
+            for c in range(n_lists):
+                members = self.matrix[assign == c]
+                if len(members):
+                    centroids[c] = members.mean(axis=0)
+
+        self.centroids = centroids
+        assign = self._nearest(self.matrix, centroids)
+        self.lists = [np.where(assign == c)[0] for c in range(n_lists)]
+
+    @staticmethod
+    def _nearest(X, centroids):
+        return pairwise_distances(X, centroids).argmin(axis=1)
+
+    def distances(self, queries):
+        """
+        返回 (n_queries, n_known) 的欧氏距离矩阵
+        """
+        Q = np.asarray(queries, dtype=np.float32).reshape(-1, 128)
+        return pairwise_distances(Q, self.matrix, self.sq_norms)
+
+    def search(self, queries, k=1, threshold=None):
+        """
+        批量 top-k 检索
+        返回: 每个查询一个列表 [(name, dist), ...]，按距离升序，
+        threshold 不为 None 时只保留 dist < threshold 的结果
+        """
+        Q = np.asarray(queries, dtype=np.float32).reshape(-1, 128)
+        if not len(Q) or not len(self.matrix):
+            return [[] for _ in range(len(Q))]
+
+        if self.mode == "ivf":
+            return [self._search_ivf(q, k, threshold) for q in Q]
+
+        D = self.distances(Q)
+        k = min(k, D.shape[1])
+        top = np.argpartition(D, k - 1, axis=1)[:, :k]
+        results = []
+        for row, cand in zip(D, top):
+            cand = cand[np.argsort(row[cand])]
+            results.append(self._format(cand, row[cand], threshold))
+        return results
+
+    def _search_ivf(self, q, k, threshold):
+        probe = np.argsort(pairwise_distances(q[None], self.centroids)[0])[: self.nprobe]
+        cand = np.concatenate([self.lists[c] for c in probe])
+        if not len(cand):
+            return []
+        d = pairwise_distances(q[None], self.matrix[cand], self.sq_norms[cand])[0]
+        order = np.argsort(d)[:k]
+        return self._format(cand[order], d[order], threshold)
+
+    def _format(self, idx, dists, threshold):
+        return [
+            (self.names[i], float(d))
+            for i, d in zip(idx, dists)
+            if threshold is None or d < threshold
+        ]
+
+    def best(self, queries, threshold=0.5):
+        """
+        在所有查询向量中找距离最小且低于阈值的身份
+        返回 (name, dist)，没有匹配时返回 (None, inf)
+        """
+        best_name, best_dist = None, float("inf")
+        for hits in self.search(queries, k=1, threshold=threshold):
+            if hits and hits[0][1] < best_dist:
+                best_name, best_dist = hits[0]
+        return best_name, best_dist
+
+
+def pairwise_distances(A, B, b_sq_norms=None):
+    """
+    ||a - b|| = sqrt(|a|² + |b|² - 2a·b)，一次矩阵乘法完成
+    """
+    if b_sq_norms is None:
+        b_sq_norms = np.einsum("ij,ij->i", B, B)
+    a_sq = np.einsum("ij,ij->i", A, A)[:, None]
+    d2 = a_sq + b_sq_norms[None, :] - 2.0 * (A @ B.T)
+    return np.sqrt(np.maximum(d2, 0.0))
@@ -1,17 +1,23 @@
-from openai import OpenAI
+import asyncio
+import json
 import os
+import random
+import re
+import time
 
-client = OpenAI(
-    api_key=os.getenv("DASHSCOPE_API_KEY"),
-    base_url="https://dashscope.aliyuncs.com/compatible-mode/v1",
-)
+from .cache_utils import get_cache
+from .metrics_utils import get_trace
 
+LLM_MODEL = "qwen-turbo"
+LLM_BASE_URL = os.getenv("LLM_BASE_URL", "https://dashscope.aliyuncs.com/compatible-mode/v1")
+LLM_CONCURRENCY = int(os.getenv("LLM_CONCURRENCY", "4"))     # 同时进行的请求数
+LLM_TIMEOUT = float(os.getenv("LLM_TIMEOUT", "120"))
+LLM_MAX_RETRIES = int(os.getenv("LLM_MAX_RETRIES", "6"))
+CHUNK_LINES = 200          # 每个 map 请求的台词行数
+REDUCE_BATCH = max(int(os.getenv("REDUCE_BATCH", "8")), 2)  # 每个 reduce 请求最多合并的分段结果数（控制 prompt 长度）
 
-def analyze_video(dialogues):
-    text = "\n".join([d.text for d in dialogues[:200]])
-
-    prompt = f"""
-你是视频理解专家，请分析以下视频台词并返回JSON：
+MAP_PROMPT = """
+你是视频理解专家，以下是一段视频中的部分台词（第 {part}/{total} 段），请分析并返回JSON：
 
 台词：
 {text}
@@ -26,11 +32,167 @@ def analyze_video(dialogues):
 }}
 """
 
-    resp = client.chat.completions.create(
-        model="qwen-turbo",
-        messages=[{"role": "user", "content": prompt}],
-        temperature=0.3
+REDUCE_PROMPT = """
+你是视频理解专家，以下是同一个视频按台词分段分析得到的多个结果，请合并为整部视频的结论并返回JSON。
+同一人物只保留一次，core_theme 用一句话概括全片。
+
+分段结果：
+{parts}
+
+返回格式：
+{{
+ "video_type": "",
+ "core_theme": "",
+ "people": [
+    {{"name": "", "identity": ""}}
+ ]
+}}
+"""
+
+
+def parse_json_reply(content):
+    """
+    容错解析模型回复：去掉 ``` 代码块标记，截取第一个 {...}
+    结构不符合返回格式（不是对象、people 不是列表）时抛出 ValueError，由 _ask 重试
+    """
+    content = re.sub(r"^```(?:json)?|```$", "", (content or "").strip(), flags=re.MULTILINE).strip()
+    start, end = content.find("{"), content.rfind("}")
+    if start < 0 or end < start:
+        raise ValueError(f"模型回复不是 JSON: {content[:200]}")
+    result = json.loads(content[start:end + 1])
+    if not isinstance(result, dict):
+        raise ValueError(f"模型回复不是 JSON 对象: {content[:200]}")
+    if not isinstance(result.get("people") or [], list):
+        raise ValueError(f"模型回复的 people 不是列表: {content[:200]}")
+    return result
+
+
+def _normalize(result):
+    # 保证 build_metadata 需要的字段都存在且非空
+    # 人物条目可能只是名字字符串（"people": ["张三"]），其他类型直接丢弃
+    people = []
+    for p in result.get("people") or []:
+        if isinstance(p, str):
+            p = {"name": p}
+        if not isinstance(p, dict):
+            continue
+        name = str(p.get("name") or "").strip()
+        if name:
+            people.append({"name": name, "identity": str(p.get("identity") or "").strip() or "未知"})
+
+    return {
+        "video_type": str(result.get("video_type") or "").strip() or "未知",
+        "core_theme": str(result.get("core_theme") or "").strip() or "未知",
+        "people": people,
+    }
+
+
+def _retry_delay(attempt, error):
+    from openai import APIStatusError
+
+    # 429 时优先遵循服务端的 Retry-After
+    if isinstance(error, APIStatusError):
+        retry_after = error.response.headers.get("retry-after")
+        if retry_after:
+            try:
+                return float(retry_after)
+            except ValueError:
+                pass
+    return min(2 ** attempt, 60) * (0.5 + random.random() / 2)
+
+
+async def _ask(client, semaphore, prompt, cache):
+    """
+    单次请求：磁盘缓存（按 模型+prompt 哈希） → 限流并发 → 失败退避重试
+    """
+    from openai import APIConnectionError, APIStatusError, APITimeoutError, RateLimitError
+
+    trace = get_trace()
+    key = cache.key("llm_response", LLM_MODEL, prompt)
+    cached = cache.get("llm_response", key)
+    if cached is not None:
+        trace.count("llm_cache_hits")
+        return cached
+
+    for attempt in range(LLM_MAX_RETRIES + 1):
+        try:
+            async with semaphore:
+                started = time.perf_counter()
+                resp = await client.chat.completions.create(
+                    model=LLM_MODEL,
+                    messages=[{"role": "user", "content": prompt}],
+                    temperature=0.3
+                )
+                trace.observe("llm_latency_seconds", time.perf_counter() - started)
+            if resp.usage:
+                trace.count("llm_prompt_tokens", resp.usage.prompt_tokens or 0)
+                trace.count("llm_completion_tokens", resp.usage.completion_tokens or 0)
+            result = parse_json_reply(resp.choices[0].message.content)
+            break
+        except (RateLimitError, APITimeoutError, APIConnectionError, ValueError) as e:
+            error = e
+        except APIStatusError as e:
+            if e.status_code < 500:
+                raise
+            error = e
+
+        if attempt == LLM_MAX_RETRIES:
+            raise RuntimeError(f"LLM 请求失败（已重试 {LLM_MAX_RETRIES} 次）: {error}") from error
+
+        trace.count("llm_retries")
+        delay = _retry_delay(attempt, error)
+        print(f"⚠️ LLM 请求失败，{delay:.1f}s 后重试：{error}")
+        await asyncio.sleep(delay)
+
+    cache.put("llm_response", key, result)
+    return result
+
+
+async def analyze_video_async(dialogues, cache=None):
+    """
+    Map-Reduce 分析全部台词：
+    1. map：每 CHUNK_LINES 行台词一个请求，并发执行
+    2. reduce：每 REDUCE_BATCH 个结果合并一次，逐层归并直到只剩一个结论
+       （长视频分段很多时，一次性拼进 prompt 会超出上下文）
+    """
+    # 延迟导入：只有真正调用 LLM 时才加载网络客户端
+    import httpx
+    from openai import AsyncOpenAI
+
+    cache = cache or get_cache()
+    lines = [d.text for d in dialogues]
+    chunks = [lines[i:i + CHUNK_LINES] for i in range(0, len(lines), CHUNK_LINES)] or [[]]
+
+    semaphore = asyncio.Semaphore(LLM_CONCURRENCY)
+    http_client = httpx.AsyncClient(
+        limits=httpx.Limits(max_connections=LLM_CONCURRENCY, max_keepalive_connections=LLM_CONCURRENCY),
+        timeout=LLM_TIMEOUT,
     )
 
-    import json
-    return json.loads(resp.choices[0].message.content)
+    async with AsyncOpenAI(
+        api_key=os.getenv("DASHSCOPE_API_KEY"),
+        base_url=LLM_BASE_URL,
+        http_client=http_client,
+        max_retries=0,          # 重试由 _ask 统一处理
+    ) as client:
+        parts = await asyncio.gather(*[
+            _ask(client, semaphore, MAP_PROMPT.format(part=i + 1, total=len(chunks), text="\n".join(chunk)), cache)
+            for i, chunk in enumerate(chunks)
+        ])
+
+        parts = [_normalize(p) for p in parts]
+        while len(parts) > 1:
+            batches = [parts[i:i + REDUCE_BATCH] for i in range(0, len(parts), REDUCE_BATCH)]
+            parts = await asyncio.gather(*[_reduce(client, semaphore, batch, cache) for batch in batches])
+        return parts[0]
+
+
+async def _reduce(client, semaphore, parts, cache):
+    if len(parts) == 1:
+        return parts[0]
+    parts_text = "\n".join(json.dumps(p, ensure_ascii=False) for p in parts)
+    return _normalize(await _ask(client, semaphore, REDUCE_PROMPT.format(parts=parts_text), cache))
+
+
+def analyze_video(dialogues):
+    return asyncio.run(analyze_video_async(dialogues))
@@ -0,0 +1,284 @@
+import queue
+import threading
+from concurrent.futures import Future
+
+import av
+import numpy as np
+from config import SAMPLE_RATE
+
+from .metrics_utils import get_trace
+
+FRAME_QUEUE_SIZE = 32   # FrameStream 至多缓存多少帧（下游跟不上时解封装等待）
+
+
+class AudioBuffer:
+    """
+    音频消费者：收集重采样后的 PCM，finish() 后 audio 为一维 float32 数组
+    """
+
+    def __init__(self):
+        self.chunks = []
+        self.audio = None
+
+    def on_audio(self, samples):
+        self.chunks.append(samples)
+
+    def finish(self):
+        self.audio = np.concatenate(self.chunks) if self.chunks else np.zeros(0, dtype=np.float32)
+        self.chunks = []
+
+
+class AudioStream:
+    """
+    音频消费者：边解封装边交给下游（如流式识别），迭代产出 float32 块（只能迭代一次）
+    解封装出错或被取消时，迭代方抛出同样的异常
+    """
+
+    _END = object()
+
+    def __init__(self):
+        self._queue = queue.Queue()
+
+    def on_audio(self, samples):
+        self._queue.put(samples)
+
+    def finish(self):
+        self._queue.put(self._END)
+
+    def fail(self, error):
+        self._queue.put(error)
+
+    def __iter__(self):
+        while True:
+            item = self._queue.get()
+            if item is self._END:
+                return
+            if isinstance(item, BaseException):
+                raise item
+            yield item
+
+
+class FrameStream:
+    """
+    视频消费者：从 start 秒起每隔 interval 秒取一帧（取法与 FrameSampler.iter_interval 相同），
+    迭代产出 (帧号, BGR 图像)（只能迭代一次），只有取中的帧才转换格式
+    队列至多 maxsize 帧，下游（如人脸检测）跟不上时解封装等待，内存有界；
+    下游不再需要时调用 close()，之后的帧直接丢弃，不会卡住同一遍里的其他消费者
+    """
+
+    _END = object()
+
+    def __init__(self, fps, interval, start=0.0, maxsize=FRAME_QUEUE_SIZE):
+        if fps <= 0:
+            raise ValueError("无法读取视频帧率")
+        self.fps = fps
+        self.interval = interval
+        self._next = start
+        self._queue = queue.Queue(maxsize)
+        self._closed = threading.Event()
+
+    def on_frame(self, t, frame):
+        half = 0.5 / self.fps
+        if self._closed.is_set() or t < self._next - half:
+            return
+        while self._next - half <= t:       # 间隔小于一帧时，多个采样点落在同一帧上，只产出一次
+            self._next += self.interval
+        self._put((int(round(t * self.fps)), frame.to_ndarray(format="bgr24")))
+
+    def finish(self):
+        self._put(self._END)
+
+    def fail(self, error):
+        self._put(error)
+
+    def close(self):
+        self._closed.set()
+
+    def _put(self, item):
+        while not self._closed.is_set():
+            try:
+                self._queue.put(item, timeout=0.1)
+                return
+            except queue.Full:
+                continue
+
+    def __iter__(self):
+        while True:
+            item = self._queue.get()
+            if item is self._END:
+                return
+            if isinstance(item, BaseException):
+                raise item
+            yield item
+
+
+class MediaReader:
+    """
+    单次解封装的媒体读取器（基于 PyAV）：
+    1. 打开时只读容器头：时长 / 帧率 / 音视频流（代替 ffprobe）
+    2. add_audio() / add_video() 注册消费者，run() 只 demux 一遍：
+       音频解码后重采样为 sample_rate 单声道 float32，分块交给 consumer.on_audio(samples)；
+       视频逐帧交给 consumer.on_frame(t, av.VideoFrame)（t 为相对视频起点的秒数，格式转换由消费者自己做）
+       音频按两个流的起始时间差补静音或裁掉开头，第 i 个采样点对应视频时间 i / sample_rate
+    3. 没有消费者的流不解码；结束后依次调用各消费者的 finish()，出错时调用 fail(error)（如果有）
+    4. start() 在后台线程执行 run()，消费者可以边解封装边处理（如 AudioStream 流式识别）
+    网络存储上整个文件只读一遍，不再 ffprobe / ffmpeg / 镜头检测各读一遍
+    """
+
+    def __init__(self, video_path, sample_rate=SAMPLE_RATE):
+        self.container = av.open(str(video_path))
+        self.sample_rate = sample_rate
+        self.video_stream = self.container.streams.video[0] if self.container.streams.video else None
+        self.audio_stream = self.container.streams.audio[0] if self.container.streams.audio else None
+
+        self.fps = 0.0
+        self.start_time = 0.0
+        if self.video_stream is not None:
+            rate = self.video_stream.average_rate or self.video_stream.guessed_rate
+            self.fps = float(rate) if rate else 0.0
+            self.start_time = _stream_start(self.video_stream)
+
+        if self.container.duration:
+            self.duration = self.container.duration / av.time_base
+        elif self.video_stream is not None and self.video_stream.duration:
+            self.duration = float(self.video_stream.duration * self.video_stream.time_base)
+        else:
+            self.duration = 0.0
+
+        # 音频相对视频起点的偏移（采样数）：>0 时开头补静音，<0 时裁掉视频开始前的音频
+        self._audio_shift = 0
+        if self.audio_stream is not None and self.video_stream is not None:
+            shift = _stream_start(self.audio_stream) - self.start_time
+            self._audio_shift = int(round(shift * sample_rate))
+
+        self.decoded_frames = 0
+        self.audio_samples = 0
+        self._last_frame_time = None
+        self._stopped = False
+        self._audio_consumers = []
+        self._video_consumers = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def close(self):
+        self.container.close()
+
+    def add_audio(self, consumer):
+        if self.audio_stream is None:
+            raise RuntimeError("视频中没有音频流")
+        self._audio_consumers.append(consumer)
+        return consumer
+
+    def add_video(self, consumer):
+        if self.video_stream is None:
+            raise RuntimeError("文件中没有视频流")
+        self._video_consumers.append(consumer)
+        return consumer
+
+    def _dispatch_audio(self, frames):
+        for frame in frames:
+            samples = frame.to_ndarray().reshape(-1)
+            if self._audio_shift > 0:
+                samples = np.concatenate([np.zeros(self._audio_shift, dtype=samples.dtype), samples])
+                self._audio_shift = 0
+            elif self._audio_shift < 0:
+                dropped = min(-self._audio_shift, len(samples))
+                samples, self._audio_shift = samples[dropped:], self._audio_shift + dropped
+            if not len(samples):
+                continue
+            self.audio_samples += len(samples)
+            for consumer in self._audio_consumers:
+                consumer.on_audio(samples)
+
+    def stop(self):
+        """让正在进行的 run() 尽快结束，消费者收到错误"""
+        self._stopped = True
+
+    def start(self):
+        """
+        在后台线程执行 run()（结束后关闭文件），返回 Future
+        """
+        future = Future()
+        trace = get_trace()
+
+        def work():
+            try:
+                with trace.stage("media_pass"):
+                    self.run()
+            except BaseException as e:
+                future.set_exception(e)
+            else:
+                future.set_result(None)
+            finally:
+                self.close()
+
+        threading.Thread(target=work, name="media-pass", daemon=True).start()
+        return future
+
+    def run(self):
+        streams = []
+        if self._audio_consumers:
+            streams.append(self.audio_stream)
+        if self._video_consumers:
+            self.video_stream.thread_type = "AUTO"    # 多线程解码
+            streams.append(self.video_stream)
+        if not streams:
+            return
+
+        consumers = self._audio_consumers + self._video_consumers
+        try:
+            self._demux(streams)
+        except BaseException as e:
+            for consumer in consumers:
+                if hasattr(consumer, "fail"):
+                    consumer.fail(e)
+            raise
+
+        trace = get_trace()
+        trace.count("media_passes")
+        trace.count("frames_decoded", self.decoded_frames)
+        trace.count("audio_decoded_seconds", self.audio_samples / self.sample_rate)
+
+        for consumer in consumers:
+            consumer.finish()
+
+    def _frame_time(self, frame):
+        # 部分容器 / 码流的帧没有时间戳（frame.time 为 None）：按上一帧时间 + 帧间隔推算
+        if frame.time is not None:
+            t = float(frame.time) - self.start_time
+        elif self._last_frame_time is None:
+            t = 0.0
+        else:
+            t = self._last_frame_time + (1 / self.fps if self.fps else 0.0)
+        self._last_frame_time = t
+        return t
+
+    def _demux(self, streams):
+        resampler = av.AudioResampler(format="flt", layout="mono", rate=self.sample_rate)
+        for packet in self.container.demux(streams):
+            if self._stopped:
+                raise RuntimeError("媒体读取已取消")
+            # 每个流结束时 demux 会给出一个空包，decode() 它会冲刷出解码器里剩余的帧
+            if packet.stream is self.audio_stream:
+                for frame in packet.decode():
+                    self._dispatch_audio(resampler.resample(frame))
+            else:
+                for frame in packet.decode():
+                    self.decoded_frames += 1
+                    t = self._frame_time(frame)
+                    for consumer in self._video_consumers:
+                        consumer.on_frame(t, frame)
+
+        if self._audio_consumers:
+            self._dispatch_audio(resampler.resample(None))
+
+
+def _stream_start(stream):
+    """流的起始时间（秒），容器没有记录时为 0"""
+    if stream.start_time is None:
+        return 0.0
+    return float(stream.start_time * stream.time_base)
@@ -0,0 +1,271 @@
+import cProfile
+import json
+import os
+import re
+import sys
+import threading
+import time
+from contextlib import contextmanager
+from pathlib import Path
+
+from filelock import FileLock
+
+try:
+    import resource
+except ImportError:      # Windows 没有 resource 模块，峰值内存记为 None
+    resource = None
+
+METRICS_PREFIX = "video_to_text"
+METRICS_DIR = os.getenv("METRICS_DIR")     # Prometheus node_exporter textfile 目录；为空时写到输出目录
+PROFILE_STAGES = {s for s in os.getenv("PROFILE_STAGES", "").split(",") if s}   # 需要 cProfile 的阶段，all 为全部
+JSON_ONLY_LABELS = ("video",)   # 只写入 JSON trace 的标签：每个视频一个取值，进 Prometheus 会让序列数无限增长
+
+
+def peak_rss_bytes():
+    """
+    本进程（含已结束的子进程）的峰值常驻内存
+    """
+    if resource is None:
+        return None
+    scale = 1 if sys.platform == "darwin" else 1024     # Linux 单位为 KB，macOS 为字节
+    usage = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    children = resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss
+    return max(usage, children) * scale
+
+
+class Trace:
+    """
+    一次运行的结构化记录：
+    1. stage()：每个阶段的 wall / CPU 时间、进程峰值内存的增长，可选 cProfile
+    2. count() / gauge() / observe()：计数、数值、分布（如 LLM 延迟），自动归到当前线程所在的阶段
+    3. drain() / merge()：子进程（如 ASR 识别进程）把自己记录的指标随结果传回主进程
+    结束后 write() 输出 JSON trace 和 Prometheus textfile
+    """
+
+    def __init__(self, labels=None, profile_stages=PROFILE_STAGES, profile_dir=None):
+        self.labels = dict(labels or {})
+        self.profile_stages = set(profile_stages)
+        self.profile_dir = profile_dir
+        self.started = time.time()
+        self.stages = {}        # 阶段名 → {wall_seconds, cpu_seconds, peak_rss_growth_bytes, status}
+        self.metrics = {}       # (阶段名, 指标名) → {"type": ..., ...}
+        self._lock = threading.Lock()
+        self._local = threading.local()
+
+    @property
+    def current_stage(self):
+        return getattr(self._local, "stage", None) or "main"
+
+    @contextmanager
+    def stage(self, name):
+        """
+        记录一个阶段；CPU 时间为执行该阶段的线程的 CPU 时间（不含子进程）
+        内存只能取到整个进程的峰值：记录阶段期间峰值涨了多少，并发阶段的增长会算到同时运行的每个阶段上
+        """
+        outer = getattr(self._local, "stage", None)
+        self._local.stage = name
+        profiler = self._start_profile(name)
+        wall, cpu, rss = time.perf_counter(), time.thread_time(), peak_rss_bytes()
+        status = "failed"
+        try:
+            yield
+            status = "done"
+        finally:
+            record = {
+                "status": status,
+                "wall_seconds": time.perf_counter() - wall,
+                "cpu_seconds": time.thread_time() - cpu,
+                "peak_rss_growth_bytes": None if rss is None else peak_rss_bytes() - rss,
+            }
+            self._stop_profile(name, profiler)
+            self._local.stage = outer
+            with self._lock:
+                self.stages[name] = record
+
+    def _start_profile(self, name):
+        if not ({name, "all"} & self.profile_stages):
+            return None
+        profiler = cProfile.Profile()
+        try:
+            profiler.enable()
+        except ValueError:      # 同一时刻只能有一个 profiler（并发阶段时可能冲突）
+            print(f"⚠️ 阶段 {name} 无法启用 cProfile（已有其他 profiler）")
+            return None
+        return profiler
+
+    def _stop_profile(self, name, profiler):
+        if profiler is None:
+            return
+        profiler.disable()
+        out_dir = Path(self.profile_dir or ".")
+        out_dir.mkdir(parents=True, exist_ok=True)
+        path = out_dir / f"{self.labels.get('video', 'run')}_{name}.prof"
+        profiler.dump_stats(path)
+        print(f"📈 cProfile 已写入：{path}")
+
+    def _metric(self, name, kind, stage):
+        key = (stage or self.current_stage, name)
+        if key not in self.metrics:
+            if kind == "summary":
+                self.metrics[key] = {"type": kind, "count": 0, "sum": 0.0, "max": 0.0}
+            else:
+                self.metrics[key] = {"type": kind, "value": 0.0}
+        return self.metrics[key]
+
+    def count(self, name, value=1, stage=None):
+        """累加计数（如解码帧数、token 数）"""
+        with self._lock:
+            self._metric(name, "counter", stage)["value"] += value
+
+    def gauge(self, name, value, stage=None):
+        """记录一个数值（如聚类数、ASR 实时率），重复记录时保留最后一次"""
+        with self._lock:
+            self._metric(name, "gauge", stage)["value"] = value
+
+    def observe(self, name, value, stage=None):
+        """记录一次观测值（如单次 LLM 请求延迟），汇总为 count / sum / max"""
+        with self._lock:
+            m = self._metric(name, "summary", stage)
+            m["count"] += 1
+            m["sum"] += value
+            m["max"] = max(m["max"], value)
+
+    def drain(self):
+        """取出并清空已记录的指标（子进程里调用，随任务结果传回主进程，见 merge）"""
+        with self._lock:
+            metrics, self.metrics = self.metrics, {}
+        return metrics
+
+    def merge(self, metrics, stage=None):
+        """合并子进程 drain() 出的指标，归到 stage（默认当前线程所在的阶段）"""
+        with self._lock:
+            for (_, name), m in metrics.items():
+                target = self._metric(name, m["type"], stage)
+                if m["type"] == "counter":
+                    target["value"] += m["value"]
+                elif m["type"] == "gauge":
+                    target["value"] = m["value"]
+                else:
+                    target["count"] += m["count"]
+                    target["sum"] += m["sum"]
+                    target["max"] = max(target["max"], m["max"])
+
+    def to_dict(self):
+        with self._lock:
+            return {
+                "labels": self.labels,
+                "started": self.started,
+                "wall_seconds": time.time() - self.started,
+                "cpu_seconds": time.process_time(),
+                "peak_rss_bytes": peak_rss_bytes(),
+                "stages": dict(self.stages),
+                "metrics": [
+                    {"stage": stage, "name": name, **m} for (stage, name), m in sorted(self.metrics.items())
+                ],
+            }
+
+    def to_prometheus(self, previous=""):
+        """
+        Prometheus 文本格式（node_exporter textfile collector）
+        JSON_ONLY_LABELS 里的标签（视频名）不输出；计数输出为 counter（<名字>_total），分布输出为 summary
+        previous: 同一文件上次的内容：counter / summary 的累计值加到本次上，保证单调递增；
+           本次没有输出的样本（如其他子命令的指标）原样保留
+        """
+        data = self.to_dict()
+        base = {k: str(v) for k, v in self.labels.items() if k not in JSON_ONLY_LABELS}
+        old = _parse_samples(previous)
+        families = {}       # 同名指标的样本必须连续输出
+
+        def emit(name, kind, value, family=None, **labels):
+            if value is None:
+                return
+            name = f"{METRICS_PREFIX}_{re.sub(r'[^a-zA-Z0-9_]', '_', name)}"
+            family = family or name
+            text = ",".join(f'{k}="{_escape(v)}"' for k, v in {**base, **labels}.items())
+            sample = f"{name}{{{text}}}"
+            if kind in ("counter", "summary") and sample in old:
+                value = float(value) + old[sample][2]
+            old.pop(sample, None)
+            families.setdefault(family, [f"# TYPE {family} {kind}"]).append(f"{sample} {float(value)}")
+
+        emit("run_wall_seconds", "gauge", data["wall_seconds"])
+        emit("run_cpu_seconds", "gauge", data["cpu_seconds"])
+        emit("run_peak_rss_bytes", "gauge", data["peak_rss_bytes"])
+        emit("runs_total", "counter", 1)
+        for stage, s in data["stages"].items():
+            emit("stage_wall_seconds", "gauge", s["wall_seconds"], stage=stage)
+            emit("stage_cpu_seconds", "gauge", s["cpu_seconds"], stage=stage)
+            emit("stage_peak_rss_growth_bytes", "gauge", s["peak_rss_growth_bytes"], stage=stage)
+            emit("stage_failed", "gauge", s["status"] == "failed", stage=stage)
+        for m in data["metrics"]:
+            if m["type"] == "summary":
+                family = f"{METRICS_PREFIX}_{m['name']}"
+                emit(f"{m['name']}_count", "summary", m["count"], family=family, stage=m["stage"])
+                emit(f"{m['name']}_sum", "summary", m["sum"], family=family, stage=m["stage"])
+                emit(f"{m['name']}_max", "gauge", m["max"], stage=m["stage"])
+            elif m["type"] == "counter":
+                emit(f"{m['name']}_total", "counter", m["value"], stage=m["stage"])
+            else:
+                emit(m["name"], "gauge", m["value"], stage=m["stage"])
+
+        for sample, (family, kind, value) in old.items():
+            families.setdefault(family, [f"# TYPE {family} {kind}"]).append(f"{sample} {value}")
+        return "".join(line + "\n" for lines in families.values() for line in lines)
+
+    def write(self, json_path, prom_path):
+        """
+        写出 JSON trace 和 Prometheus textfile（先写临时文件再替换，避免被采集到半个文件）
+        textfile 由多次运行（批量时多个进程）共用：加锁读出上次的累计计数，加上本次的再写回
+        """
+        _write_atomic(json_path, json.dumps(self.to_dict(), ensure_ascii=False, indent=2))
+
+        prom_path = Path(prom_path)
+        prom_path.parent.mkdir(parents=True, exist_ok=True)
+        with FileLock(str(prom_path) + ".lock"):
+            previous = prom_path.read_text(encoding="utf-8") if prom_path.exists() else ""
+            _write_atomic(prom_path, self.to_prometheus(previous))
+
+
+def _write_atomic(path, text):
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = path.with_name(f"{path.name}.{os.getpid()}.tmp")
+    tmp.write_text(text, encoding="utf-8")
+    os.replace(tmp, path)
+
+
+def _parse_samples(text):
+    """
+    解析 to_prometheus() 写出的 textfile：{"名字{标签}": (指标族, 类型, 值)}
+    """
+    kinds, samples = {}, {}
+    for line in text.splitlines():
+        if line.startswith("# TYPE "):
+            _, _, family, kind = line.split(" ", 3)
+            kinds[family] = kind
+        elif line and not line.startswith("#"):
+            sample, _, value = line.rpartition(" ")
+            family = sample.split("{", 1)[0]
+            if family not in kinds:
+                family = family.rsplit("_", 1)[0]     # summary 的 <名字>_count / <名字>_sum
+            if family in kinds:
+                samples[sample] = (family, kinds[family], float(value))
+    return samples
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+_trace = Trace()
+
+
+def get_trace():
+    """当前进程正在记录的 Trace（未设置时为一个默认 Trace）"""
+    return _trace
+
+
+def set_trace(trace):
+    global _trace
+    _trace = trace
+    return trace
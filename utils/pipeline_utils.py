@@ -0,0 +1,99 @@
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from dataclasses import dataclass, field
+from typing import Callable, Tuple
+
+from .metrics_utils import get_trace
+
+
+@dataclass
+class Stage:
+    name: str                              # 阶段名，同时也是输出的名字
+    func: Callable                         # 以依赖阶段的输出为关键字参数调用
+    deps: Tuple[str, ...] = field(default_factory=tuple)
+
+
+def _check_stages(stages):
+    names = [s.name for s in stages]
+    if len(names) != len(set(names)):
+        raise ValueError(f"阶段名重复: {names}")
+
+    known = set(names)
+    for s in stages:
+        missing = set(s.deps) - known
+        if missing:
+            raise ValueError(f"阶段 {s.name} 依赖不存在的阶段: {missing}")
+
+
+def select_stages(stages, targets):
+    """
+    只保留 targets 及其（递归）依赖的阶段，顺序不变
+    """
+    by_name = {s.name: s for s in stages}
+    needed, todo = set(), list(targets)
+    while todo:
+        name = todo.pop()
+        if name in needed:
+            continue
+        if name not in by_name:
+            raise ValueError(f"未知阶段: {name}")
+        needed.add(name)
+        todo.extend(by_name[name].deps)
+    return [s for s in stages if s.name in needed]
+
+
+def _run_stage(stage, kwargs):
+    # 每个阶段在自己的线程里运行，计时 / 计数归到该阶段（见 metrics_utils.Trace）
+    with get_trace().stage(stage.name):
+        return stage.func(**kwargs)
+
+
+def run_stages(stages, max_workers=None, on_event=None):
+    """
+    按依赖关系并发执行各阶段（DAG）：
+    依赖全部完成的阶段立即提交，互不依赖的阶段同时运行
+    on_event(阶段名, 状态, 耗时, 错误) 在阶段开始/完成/失败时回调
+    返回 {阶段名: 输出}
+    """
+    on_event = on_event or (lambda *args: None)
+    _check_stages(stages)
+
+    remaining = {s.name: s for s in stages}
+    results = {}
+    running = {}    # future → 阶段名
+    started = {}
+
+    pool = ThreadPoolExecutor(max_workers=max_workers or len(stages))
+    try:
+        while remaining or running:
+            ready = [s for s in remaining.values() if all(d in results for d in s.deps)]
+            for s in ready:
+                del remaining[s.name]
+                print(f"▶️ 开始阶段：{s.name}")
+                started[s.name] = time.perf_counter()
+                on_event(s.name, "running", 0.0, None)
+                future = pool.submit(_run_stage, s, {d: results[d] for d in s.deps})
+                running[future] = s.name
+
+            if not running:
+                raise ValueError(f"阶段存在循环依赖: {list(remaining)}")
+
+            done, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in done:
+                name = running.pop(future)
+                elapsed = time.perf_counter() - started[name]
+                try:
+                    results[name] = future.result()
+                except Exception as e:
+                    print(f"❌ 阶段失败：{name}：{e}")
+                    on_event(name, "failed", elapsed, repr(e))
+                    raise
+                print(f"✅ 阶段完成：{name}（{elapsed:.1f}s）")
+                on_event(name, "done", elapsed, None)
+    except BaseException:
+        # 任一阶段失败立即抛出：取消还没开始的阶段，不等其他正在运行的阶段结束
+        pool.shutdown(wait=False, cancel_futures=True)
+        raise
+    pool.shutdown()
+
+    return results
@@ -0,0 +1,162 @@
+import os
+import socket
+import sqlite3
+import time
+
+MAX_ATTEMPTS = 3
+HEARTBEAT_SECONDS = 30      # worker 处理任务期间每隔多少秒更新一次心跳
+LEASE_SECONDS = 120         # 心跳超过多少秒没有更新，视为 worker 已经不在了
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id          INTEGER PRIMARY KEY AUTOINCREMENT,
+    video_path  TEXT NOT NULL UNIQUE,
+    output_dir  TEXT NOT NULL,
+    status      TEXT NOT NULL DEFAULT 'pending',   -- pending / running / done / failed
+    attempts    INTEGER NOT NULL DEFAULT 0,
+    error       TEXT,
+    result      TEXT,
+    updated_at  REAL,
+    worker      TEXT,                              -- 领取任务的 worker：<主机名>:<PID>
+    heartbeat   REAL                               -- worker 最近一次心跳时间
+);
+CREATE TABLE IF NOT EXISTS stages (
+    job_id      INTEGER NOT NULL,
+    stage       TEXT NOT NULL,
+    status      TEXT NOT NULL,                     -- running / done / failed
+    seconds     REAL,
+    error       TEXT,
+    updated_at  REAL,
+    PRIMARY KEY (job_id, stage)
+);
+"""
+
+
+class JobQueue:
+    """
+    基于 SQLite 的本地任务队列：
+    1. 每个视频一条 job，每个阶段一条状态记录
+    2. 多个 worker 进程通过 BEGIN IMMEDIATE 互斥领取任务
+    3. 失败的任务在 max_attempts 次以内重新排队；recover() 回收 worker 已经不在了的中断任务
+    4. 领取时记下 worker（主机名:PID），处理期间定时 heartbeat()，另一个批量进程不会抢走还在运行的任务
+    """
+
+    def __init__(self, db_path, max_attempts=MAX_ATTEMPTS):
+        self.max_attempts = max_attempts
+        self.worker_id = f"{socket.gethostname()}:{os.getpid()}"
+        self.conn = sqlite3.connect(str(db_path), timeout=60, isolation_level=None)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.executescript(SCHEMA)
+        # 旧版本建的库没有 worker / heartbeat 列
+        columns = {row[1] for row in self.conn.execute("PRAGMA table_info(jobs)")}
+        for column, kind in (("worker", "TEXT"), ("heartbeat", "REAL")):
+            if column not in columns:
+                self.conn.execute(f"ALTER TABLE jobs ADD COLUMN {column} {kind}")
+
+    def close(self):
+        self.conn.close()
+
+    def add(self, video_path, output_dir):
+        self.conn.execute(
+            "INSERT OR IGNORE INTO jobs (video_path, output_dir, updated_at) VALUES (?, ?, ?)",
+            (str(video_path), str(output_dir), time.time()),
+        )
+
+    def recover(self, lease_seconds=LEASE_SECONDS):
+        """
+        回收中断的任务：状态为 running，但领取它的 worker 已经不在了
+        （本机按 PID 判断，其他机器按心跳是否超过 lease_seconds 判断），还在运行的任务不动
+        尝试次数未用完的重新排队，用完的标记为 failed；返回回收的任务数
+        """
+        now = time.time()
+        self.conn.execute("BEGIN IMMEDIATE")
+        try:
+            rows = self.conn.execute("SELECT id, worker, heartbeat FROM jobs WHERE status = 'running'").fetchall()
+            stale = [job_id for job_id, worker, heartbeat in rows if not _alive(worker, heartbeat, now, lease_seconds)]
+            for job_id in stale:
+                self.conn.execute(
+                    "UPDATE jobs SET status = CASE WHEN attempts < ? THEN 'pending' ELSE 'failed' END, "
+                    "error = ?, worker = NULL, updated_at = ? WHERE id = ?",
+                    (self.max_attempts, "worker 中断（未正常结束）", now, job_id),
+                )
+            self.conn.execute("COMMIT")
+        except Exception:
+            self.conn.execute("ROLLBACK")
+            raise
+        return len(stale)
+
+    def heartbeat(self, job_id):
+        """更新本 worker 正在处理的任务的心跳"""
+        self.conn.execute(
+            "UPDATE jobs SET heartbeat = ? WHERE id = ? AND worker = ? AND status = 'running'",
+            (time.time(), job_id, self.worker_id),
+        )
+
+    def claim(self):
+        """
+        领取一个待处理任务，返回 (id, video_path, output_dir)；没有任务时返回 None
+        """
+        self.conn.execute("BEGIN IMMEDIATE")
+        try:
+            row = self.conn.execute(
+                "SELECT id, video_path, output_dir FROM jobs "
+                "WHERE status = 'pending' AND attempts < ? ORDER BY id LIMIT 1",
+                (self.max_attempts,),
+            ).fetchone()
+            if row:
+                now = time.time()
+                self.conn.execute(
+                    "UPDATE jobs SET status = 'running', attempts = attempts + 1, worker = ?, heartbeat = ?, "
+                    "updated_at = ? WHERE id = ?",
+                    (self.worker_id, now, now, row[0]),
+                )
+            self.conn.execute("COMMIT")
+        except Exception:
+            self.conn.execute("ROLLBACK")
+            raise
+        return row
+
+    def set_stage(self, job_id, stage, status, seconds=None, error=None):
+        self.conn.execute(
+            "INSERT OR REPLACE INTO stages (job_id, stage, status, seconds, error, updated_at) "
+            "VALUES (?, ?, ?, ?, ?, ?)",
+            (job_id, stage, status, seconds, error, time.time()),
+        )
+
+    def finish(self, job_id, result=None):
+        self.conn.execute(
+            "UPDATE jobs SET status = 'done', error = NULL, result = ?, updated_at = ? WHERE id = ?",
+            (None if result is None else str(result), time.time(), job_id),
+        )
+
+    def fail(self, job_id, error):
+        """
+        记录失败；未超过最大尝试次数时重新排队（已完成的阶段会命中缓存，只重跑失败的阶段）
+        """
+        self.conn.execute(
+            "UPDATE jobs SET status = CASE WHEN attempts < ? THEN 'pending' ELSE 'failed' END, "
+            "error = ?, updated_at = ? WHERE id = ?",
+            (self.max_attempts, error, time.time(), job_id),
+        )
+
+    def counts(self):
+        rows = self.conn.execute("SELECT status, COUNT(*) FROM jobs GROUP BY status").fetchall()
+        return dict(rows)
+
+
+def _alive(worker, heartbeat, now, lease_seconds):
+    """
+    领取任务的 worker 是否还在：心跳超时即视为不在；本机的 worker 再确认进程是否存在
+    """
+    if heartbeat is None or now - heartbeat > lease_seconds:
+        return False
+    host, _, pid = (worker or "").rpartition(":")
+    # Windows 上 os.kill 会直接结束目标进程，只能依赖心跳
+    if os.name == "posix" and host == socket.gethostname() and pid.isdigit():
+        try:
+            os.kill(int(pid), 0)
+        except ProcessLookupError:
+            return False
+        except PermissionError:
+            pass        # 进程存在，只是属于别的用户
+    return True
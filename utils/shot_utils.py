@@ -0,0 +1,90 @@
+import numpy as np
+from config import MIN_SHOT_LEN, SHOT_THRESHOLD
+
+from .media_utils import MediaReader
+
+THUMB_SIZE = (64, 36)      # 检测用缩略图尺寸
+BINS = 16                  # 每通道直方图桶数
+
+
+def _histograms(batch):
+    """
+    一批缩略图 (n, h, w, 3) → 归一化颜色直方图 (n, 3 * BINS)
+    整批只调用一次 bincount
+    """
+    n = len(batch)
+    q = (batch >> 4).astype(np.int32)                                   # 256 → 16 桶
+    q += np.arange(3, dtype=np.int32) * BINS                            # 通道偏移
+    q += (np.arange(n, dtype=np.int32) * 3 * BINS)[:, None, None, None] # 帧偏移
+    hist = np.bincount(q.ravel(), minlength=n * 3 * BINS).reshape(n, 3 * BINS).astype(np.float32)
+    return hist / hist.sum(axis=1, keepdims=True)
+
+
+class ShotDetector:
+    """
+    视频消费者（见 MediaReader）：
+    1. 每帧缩成 THUMB_SIZE 小图，按批计算颜色直方图
+    2. 相邻帧直方图差异（L1 / 2）超过阈值即为切点
+    finish() 后 shots 为镜头列表 [(start, end), ...]（秒）
+    """
+
+    def __init__(self, fps, threshold=SHOT_THRESHOLD, min_shot_len=MIN_SHOT_LEN, batch_size=256):
+        self.frame_len = 1 / fps if fps else 0.0
+        self.threshold = threshold
+        self.min_shot_len = min_shot_len
+        self.batch_size = batch_size
+        self.times, self.hists, self.batch = [], [], []
+        self.shots = None
+
+    def on_frame(self, t, frame):
+        width, height = THUMB_SIZE
+        self.times.append(t)
+        self.batch.append(frame.to_ndarray(width=width, height=height, format="rgb24"))
+        if len(self.batch) == self.batch_size:
+            self.hists.append(_histograms(np.stack(self.batch)))
+            self.batch = []
+
+    def finish(self):
+        if self.batch:
+            self.hists.append(_histograms(np.stack(self.batch)))
+            self.batch = []
+        if not self.times:
+            self.shots = []
+            return
+
+        H = np.concatenate(self.hists)
+        T = np.asarray(self.times)
+        diffs = 0.5 * np.abs(np.diff(H, axis=0)).sum(axis=1)    # diffs[i]：第 i 帧与第 i+1 帧
+
+        cuts = [max(T[0], 0.0)]
+        for i in np.flatnonzero(diffs > self.threshold) + 1:
+            if T[i] - cuts[-1] >= self.min_shot_len:
+                cuts.append(float(T[i]))
+
+        end = float(T[-1]) + self.frame_len
+        self.shots = [(float(a), float(b)) for a, b in zip(cuts, cuts[1:] + [end]) if b > a]
+
+
+def detect_shots(video_path, threshold=SHOT_THRESHOLD, min_shot_len=MIN_SHOT_LEN, batch_size=256):
+    """
+    单次解码检测镜头边界，返回镜头列表 [(start, end), ...]（秒）
+    需要同时解码音频时直接把 ShotDetector 注册到同一个 MediaReader 上
+    """
+    with MediaReader(video_path) as reader:
+        detector = reader.add_video(ShotDetector(reader.fps, threshold, min_shot_len, batch_size))
+        reader.run()
+    return detector.shots
+
+
+def shot_sample_times(shots, per_shot=1, max_gap=None):
+    """
+    每个镜头内均匀取 per_shot 个时间点；
+    max_gap 不为 None 时，长镜头按 max_gap 秒加密采样，避免漏掉中途出场的人
+    """
+    times = []
+    for start, end in shots:
+        n = per_shot
+        if max_gap:
+            n = max(n, int((end - start) // max_gap))
+        times.extend(start + (end - start) * (k + 1) / (n + 1) for k in range(n))
+    return times
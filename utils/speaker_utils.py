@@ -1,25 +1,64 @@
 import json
+import os
+from collections import Counter
 import cv2
-import face_recognition
 import numpy as np
 from pathlib import Path
+from config import OUTPUT_DIR, SAMPLES_PER_DIALOGUE, STORE_MAX_GAP, face_db_paths
 
-FACE_DB_PATH = "outputs/face_db.json"
+from .cache_utils import get_cache, video_hash
+from .face_db_utils import load_face_embeddings
+from .face_store_utils import FaceStore, build_face_store
+from .frame_utils import FrameSampler
+from .identity_utils import IdentityIndex
 
 
-def load_face_db():
-    with open(FACE_DB_PATH, "r", encoding="utf-8") as f:
+def load_face_db(db_path):
+    with open(db_path, "r", encoding="utf-8") as f:
         return json.load(f)
 
 
-def load_face_encodings():
-    db = load_face_db()
+def load_face_encodings(output_dir=OUTPUT_DIR):
+    """
+    从 face_db.npz 直接读取已知人脸向量（中心 + 代表向量），启动时不跑 dlib
+    旧版本没有向量库时，退回到重新编码人脸图片
+    """
+    _, db_path, emb_path, _ = face_db_paths(output_dir)
+    db = load_face_db(db_path)
+
+    if not Path(emb_path).exists():
+        print("⚠️ 未找到人脸向量库，重新编码人脸图片")
+        return _encode_face_images(db, output_dir)
+
+    store = load_face_embeddings(emb_path)
+    encodings = []
+    names = []
+
+    for pid, center in zip(store["ids"], store["centers"]):
+        info = db.get(str(pid))
+        if info is None:
+            continue
+        encodings.append(center)
+        names.append(info["name"])
+
+    for pid, sample in zip(store["owners"], store["samples"]):
+        info = db.get(str(pid))
+        if info is None:
+            continue
+        encodings.append(sample)
+        names.append(info["name"])
+
+    return np.asarray(encodings, dtype=np.float32).reshape(-1, 128), names
+
+
+def _encode_face_images(db, output_dir=OUTPUT_DIR):
+    import face_recognition
 
     encodings = []
     names = []
 
     for pid, info in db.items():
-        img_path = Path("outputs") / info["image"]
+        img_path = Path(output_dir) / info["image"]
         img = face_recognition.load_image_file(str(img_path))
         enc = face_recognition.face_encodings(img)
 
@@ -27,46 +66,154 @@ def load_face_encodings():
             encodings.append(enc[0])
             names.append(info["name"])
 
-    return encodings, names
+    return np.asarray(encodings, dtype=np.float32).reshape(-1, 128), names
 
 
-def identify_speaker(frame, known_encodings, known_names, threshold=0.5):
-    rgb = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
-    boxes = face_recognition.face_locations(rgb)
-    encs = face_recognition.face_encodings(rgb, boxes)
+def load_identity_index(output_dir=OUTPUT_DIR):
+    known_encodings, known_names = load_face_encodings(output_dir)
+    return IdentityIndex(known_encodings, known_names)
 
-    if not encs:
-        return "未知"
 
-    best_name = "未知"
-    best_dist = 999
+def detect_faces(frame):
+    """
+    检测一帧中的所有人脸并编码，返回 [(encoding, box), ...]
+    """
+    import face_recognition     # 延迟导入 dlib：只有真正检测时才加载
 
-    for enc in encs:
-        dists = face_recognition.face_distance(known_encodings, enc)
-        idx = np.argmin(dists)
-        if dists[idx] < best_dist and dists[idx] < threshold:
-            best_dist = dists[idx]
-            best_name = known_names[idx]
-
-    return best_name
+    rgb = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
+    boxes = face_recognition.face_locations(rgb)
+    encs = face_recognition.face_encodings(rgb, boxes)
+    return list(zip(encs, boxes))
+
+
+def detect_encodings(frame):
+    """
+    检测一帧中的所有人脸并编码，返回 (n, 128) 矩阵
+    """
+    encs = [enc for enc, _ in detect_faces(frame)]
+    return np.asarray(encs, dtype=np.float32).reshape(-1, 128)
+
+
+def identify_speaker(frame, index, threshold=0.5):
+    name, _ = index.best(detect_encodings(frame), threshold=threshold)
+    return name or "未知"
+
+
+def sample_times(dlg, n=SAMPLES_PER_DIALOGUE):
+    """
+    在台词区间内均匀取 n 个时间点（不含首尾，避开切镜头）
+    """
+    span = dlg.end_time - dlg.start_time
+    return [round(dlg.start_time + span * (k + 1) / (n + 1), 3) for k in range(n)]
+
+
+def assign_speakers(video_path, dialogues, samples_per_dialogue=SAMPLES_PER_DIALOGUE, threshold=0.5,
+                    output_dir=OUTPUT_DIR):
+    """
+    批量说话人识别：
+    1. 收集所有台词的采样时间点，排序去重
+    2. 一次顺序读取所有帧（不再每句台词随机 seek）
+    3. 所有帧的人脸向量一次批量检索
+    4. 每句台词多帧投票，票数最多者为说话人
+    """
+    index = load_identity_index(output_dir)
+
+    # 时间点 → 需要该帧的台词下标
+    wanted = {}
+    for i, dlg in enumerate(dialogues):
+        for t in sample_times(dlg, samples_per_dialogue):
+            wanted.setdefault(t, []).append(i)
+
+    # 顺序读帧并编码；相邻时间点落在同一帧时只编码一次
+    frame_encs = {}         # 帧号 → 该帧人脸向量
+    frame_of = {}           # 时间点 → 帧号
+    with FrameSampler(video_path) as sampler:
+        for t, frame_idx, frame in sampler.read_at(wanted):
+            if frame_idx not in frame_encs:
+                frame_encs[frame_idx] = detect_encodings(frame)
+            frame_of[t] = frame_idx
+
+    # 所有帧的人脸一次批量检索
+    frame_ids = list(frame_encs)
+    owners = np.concatenate([np.full(len(frame_encs[f]), f) for f in frame_ids]) if frame_ids else []
+    all_encs = np.concatenate([frame_encs[f] for f in frame_ids]) if frame_ids else []
+    hits = index.search(all_encs, k=1, threshold=threshold)
+
+    best = {}               # 帧号 → (name, dist)
+    for frame_idx, hit in zip(owners, hits):
+        if hit and hit[0][1] < best.get(frame_idx, (None, float("inf")))[1]:
+            best[frame_idx] = hit[0]
+
+    votes = [Counter() for _ in dialogues]
+    for t, frame_idx in frame_of.items():
+        if frame_idx in best:
+            for i in wanted[t]:
+                votes[i][best[frame_idx][0]] += 1
+
+    for dlg, vote in zip(dialogues, votes):
+        dlg.speaker = vote.most_common(1)[0][0] if vote else "未知"
 
+    return dialogues
 
-def assign_speakers(video_path, dialogues):
-    cap = cv2.VideoCapture(video_path)
-    fps = cap.get(cv2.CAP_PROP_FPS)
 
-    known_encodings, known_names = load_face_encodings()
+def get_speaker_store(video_path, dialogues, samples_per_dialogue=SAMPLES_PER_DIALOGUE, cache=None):
+    """
+    台词采样帧的逐帧人脸库（时间戳 / box / 向量），按 (视频内容指纹, 采样时间点) 缓存；
+    只有第一次需要解码视频和跑检测，之后人名校正、阈值调整都只是查表
+    """
+    cache = cache or get_cache()
+    times = sorted({t for dlg in dialogues for t in sample_times(dlg, samples_per_dialogue)})
+    key = cache.key("speaker_faces", video_hash(video_path), times)
+    path = cache.artifact_dir("speaker_faces", key)
+
+    if FaceStore.exists(path):
+        os.utime(path)      # 记录最近使用时间，供 LRU 淘汰
+        print("♻️ 命中缓存：speaker_faces")
+        cache.lease(path)   # 本次运行内存映射着它，淘汰时跳过
+        return FaceStore(path)
+
+    def frames(after_frame):
+        after = (after_frame + 0.5) / sampler.fps if after_frame >= 0 else -1.0
+        for frame_idx, frame in sampler.iter_times([t for t in times if t > after]):
+            yield frame_idx, detect_faces(frame)
+
+    with FrameSampler(video_path) as sampler:
+        store = build_face_store(path, frames, sampler.fps, samples_per_dialogue=samples_per_dialogue)
+    cache.lease(path)
+    cache.evict()
+    return store
+
+
+def _best_per_frame(store, index, threshold, block=4096):
+    """
+    人脸库中每个已分析帧的最佳匹配: {帧号: (name, dist)}；分块检索，内存有界
+    """
+    best = {}
+    for lo in range(0, len(store), block):
+        hits = index.search(np.asarray(store.encodings[lo:lo + block]), k=1, threshold=threshold)
+        for frame_idx, hit in zip(store.face_frames[lo:lo + block].tolist(), hits):
+            if hit and hit[0][1] < best.get(frame_idx, (None, float("inf")))[1]:
+                best[frame_idx] = hit[0]
+    return best
+
+
+def assign_speakers_from_store(store, dialogues, threshold=0.5, output_dir=OUTPUT_DIR, max_gap=STORE_MAX_GAP):
+    """
+    基于逐帧人脸库（见 get_speaker_store / get_face_store）的说话人识别，不解码视频：
+    1. 人脸库所有向量分块批量检索，得到每个已分析帧的最佳匹配
+    2. 每句台词用区间内已分析的帧投票；区间内没有时取 max_gap 秒内最近的一帧
+    """
+    index = load_identity_index(output_dir)
+    best = _best_per_frame(store, index, threshold)
 
     for dlg in dialogues:
-        t = (dlg.start_time + dlg.end_time) / 2
-        frame_idx = int(t * fps)
-
-        cap.set(cv2.CAP_PROP_POS_FRAMES, frame_idx)
-        ret, frame = cap.read()
+        frames = store.frames_between(dlg.start_time, dlg.end_time).tolist()
+        if not frames:
+            frame_idx, gap = store.nearest_frame((dlg.start_time + dlg.end_time) / 2)
+            if gap <= max_gap + (dlg.end_time - dlg.start_time) / 2:
+                frames = [frame_idx]
 
-        if ret:
-            name = identify_speaker(frame, known_encodings, known_names)
-            dlg.speaker = name
+        vote = Counter(best[f][0] for f in frames if f in best)
+        dlg.speaker = vote.most_common(1)[0][0] if vote else "未知"
 
-    cap.release()
     return dialogues
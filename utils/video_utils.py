@@ -1,18 +1,7 @@
-import subprocess
-import json
+from .media_utils import MediaReader
 
 
 def get_video_duration(video_path: str) -> float:
-    cmd = [
-        "ffprobe",
-        "-v", "quiet",
-        "-print_format", "json",
-        "-show_format",
-        video_path
-    ]
-
-    result = subprocess.run(cmd, capture_output=True, text=True)
-    data = json.loads(result.stdout)
-
-    duration = float(data["format"]["duration"])
-    return duration
+    # 只读容器头，不解封装（不再依赖 ffprobe）
+    with MediaReader(video_path) as reader:
+        return reader.duration
@@ -1,9 +1,17 @@
 # video_metadata.py
+import bisect
 import json
+import struct
+from array import array
 from dataclasses import dataclass, asdict
 from typing import List, Optional
 from pathlib import Path
 
+import numpy as np
+
+BINARY_MAGIC = b"VMD1"      # 二进制列式格式（.vmd）文件头
+_ALIGN = 64                 # 每个数组按 64 字节对齐，便于 mmap 后直接 view
+
 def _validate_non_empty(s: str, field_name: str):
     if not s or not s.strip():
         raise ValueError(f"{field_name} 不能为空或仅包含空白字符")
@@ -57,26 +65,298 @@ class Dialogue:
         _validate_non_empty(self.speaker, "Dialogue.speaker")
         _validate_non_empty(self.text, "Dialogue.text")
 
+# ---------- 列式存储（struct-of-arrays）：大批量对白 / 镜头 ----------
+
+def _validate_time_columns(start: np.ndarray, end: np.ndarray, label: str):
+    """整列校验时间范围，与 _validate_time_range 规则一致"""
+    bad = np.flatnonzero((start < 0) | (end < 0))
+    if bad.size:
+        raise ValueError(f"{label}[{bad[0]}] 时间不能为负数")
+    bad = np.flatnonzero(start >= end)
+    if bad.size:
+        raise ValueError(f"{label}[{bad[0]}] 起始时间必须小于结束时间")
+
+
+class StringColumn:
+    """不可变字符串列：所有字符串拼成一个 UTF-8 块 + int64 偏移，按需解码"""
+    __slots__ = ("blob", "offsets")
+
+    def __init__(self, blob: bytes, offsets: np.ndarray):
+        self.blob = blob
+        self.offsets = offsets
+
+    @classmethod
+    def from_strings(cls, strings) -> "StringColumn":
+        blob, offsets = _pack_strings(strings)
+        return cls(blob.tobytes(), offsets)
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+    def __getitem__(self, i: int) -> str:
+        return self.blob[self.offsets[i]:self.offsets[i + 1]].decode("utf-8")
+
+    def tolist(self) -> List[str]:
+        return _unpack_strings(np.frombuffer(self.blob, dtype=np.uint8), self.offsets)
+
+    def blank_rows(self) -> np.ndarray:
+        """空串或仅含空白字符的行号"""
+        empty = np.flatnonzero(np.diff(self.offsets) == 0)
+        if empty.size:
+            return empty
+        return _blank_rows(self.tolist())
+
+
+def _blank_rows(strings) -> np.ndarray:
+    return np.asarray([i for i, x in enumerate(strings) if not x.strip()], dtype=np.int64)
+
+
+class DialogueView:
+    """DialogueTable 中一行的轻量视图，属性与 Dialogue 相同"""
+    __slots__ = ("_table", "_i")
+
+    def __init__(self, table: "DialogueTable", i: int):
+        self._table = table
+        self._i = i
+
+    @property
+    def start_time(self) -> float:
+        return float(self._table.start_time[self._i])
+
+    @property
+    def end_time(self) -> float:
+        return float(self._table.end_time[self._i])
+
+    @property
+    def speaker(self) -> str:
+        return self._table.speakers[self._table.speaker_id[self._i]]
+
+    @speaker.setter
+    def speaker(self, name: str):
+        self._table.set_speaker(self._i, name)
+
+    @property
+    def text(self) -> str:
+        return self._table.texts[self._i]
+
+    def __repr__(self):
+        return f"Dialogue(start_time={self.start_time}, end_time={self.end_time}, speaker={self.speaker!r}, text={self.text!r})"
+
+
+class ShotView:
+    """ShotTable 中一行的轻量视图，属性与 Shot 相同"""
+    __slots__ = ("_table", "_i")
+
+    def __init__(self, table: "ShotTable", i: int):
+        self._table = table
+        self._i = i
+
+    @property
+    def start_time(self) -> float:
+        return float(self._table.start_time[self._i])
+
+    @property
+    def end_time(self) -> float:
+        return float(self._table.end_time[self._i])
+
+    @property
+    def description(self) -> str:
+        return self._table.descriptions[self._i]
+
+    def __repr__(self):
+        return f"Shot(start_time={self.start_time}, end_time={self.end_time}, description={self.description!r})"
+
+
+class DialogueTable:
+    """
+    对白列式表：时间为 float64 数组，说话人去重后存 int32 编号，台词存 StringColumn；
+    整表一次向量化校验，按下标访问返回 DialogueView，可直接替代 List[Dialogue]
+    """
+
+    def __init__(self, start_time, end_time, speaker_id, speakers: List[str], texts: StringColumn,
+                 validate: bool = True):
+        self.start_time = np.asarray(start_time, dtype=np.float64)
+        self.end_time = np.asarray(end_time, dtype=np.float64)
+        self.speaker_id = np.asarray(speaker_id, dtype=np.int32)
+        self.speakers = list(speakers)
+        self._speaker_ids = {name: i for i, name in enumerate(self.speakers)}
+        self.texts = texts
+        if validate:
+            self.validate()
+
+    @classmethod
+    def from_columns(cls, start_time, end_time, speakers, texts) -> "DialogueTable":
+        """speakers / texts 为逐行字符串"""
+        texts = list(texts)
+        ids = {}
+        speaker_id = np.fromiter((ids.setdefault(x, len(ids)) for x in speakers), np.int32)
+        table = cls(start_time, end_time, speaker_id, list(ids), StringColumn.from_strings(texts), validate=False)
+        table.validate(blank=_blank_rows(texts))    # 直接检查原字符串，省去一次解码
+        return table
+
+    @classmethod
+    def from_dialogues(cls, dialogues) -> "DialogueTable":
+        n = len(dialogues)
+        return cls.from_columns(
+            np.fromiter((d.start_time for d in dialogues), np.float64, n),
+            np.fromiter((d.end_time for d in dialogues), np.float64, n),
+            [d.speaker for d in dialogues],
+            [d.text for d in dialogues],
+        )
+
+    @classmethod
+    def from_iter(cls, dialogues) -> "DialogueTable":
+        """
+        边迭代边累积成列（如直接消费 iter_dialogues），
+        不需要先把全部台词收集成 List[Dialogue]
+        """
+        start_time, end_time, speakers, texts = array("d"), array("d"), [], []
+        for d in dialogues:
+            start_time.append(d.start_time)
+            end_time.append(d.end_time)
+            speakers.append(d.speaker)
+            texts.append(d.text)
+        return cls.from_columns(np.frombuffer(start_time), np.frombuffer(end_time), speakers, texts)
+
+    def validate(self, blank=None):
+        n = len(self.start_time)
+        if not (len(self.end_time) == len(self.speaker_id) == len(self.texts) == n):
+            raise ValueError("DialogueTable 各列长度不一致")
+        _validate_time_columns(self.start_time, self.end_time, "Dialogue")
+        for name in self.speakers:
+            _validate_non_empty(name, "Dialogue.speaker")
+        blank = self.texts.blank_rows() if blank is None else blank
+        if blank.size:
+            raise ValueError(f"Dialogue[{blank[0]}].text 不能为空或仅包含空白字符")
+
+    def set_speaker(self, i: int, name: str):
+        _validate_non_empty(name, "Dialogue.speaker")
+        if name not in self._speaker_ids:
+            self._speaker_ids[name] = len(self.speakers)
+            self.speakers.append(name)
+        if not self.speaker_id.flags.writeable:
+            self.speaker_id = self.speaker_id.copy()     # mmap 加载的只读列，首次修改时复制
+        self.speaker_id[i] = self._speaker_ids[name]
+
+    def __len__(self):
+        return len(self.start_time)
+
+    def __getitem__(self, i: int) -> DialogueView:
+        if i < 0:
+            i += len(self)
+        if not 0 <= i < len(self):
+            raise IndexError(i)
+        return DialogueView(self, i)
+
+    def __iter__(self):
+        return (DialogueView(self, i) for i in range(len(self)))
+
+    def to_dialogues(self) -> List[Dialogue]:
+        speakers = self.speakers
+        return [
+            _unchecked(Dialogue, start_time=a, end_time=b, speaker=speakers[k], text=t)
+            for a, b, k, t in zip(self.start_time.tolist(), self.end_time.tolist(),
+                                  self.speaker_id.tolist(), self.texts.tolist())
+        ]
+
+
+class ShotTable:
+    """镜头列式表：时间为 float64 数组，描述存 StringColumn；按下标访问返回 ShotView"""
+
+    def __init__(self, start_time, end_time, descriptions: StringColumn, validate: bool = True):
+        self.start_time = np.asarray(start_time, dtype=np.float64)
+        self.end_time = np.asarray(end_time, dtype=np.float64)
+        self.descriptions = descriptions
+        if validate:
+            self.validate()
+
+    @classmethod
+    def from_columns(cls, start_time, end_time, descriptions) -> "ShotTable":
+        descriptions = list(descriptions)
+        table = cls(start_time, end_time, StringColumn.from_strings(descriptions), validate=False)
+        table.validate(blank=_blank_rows(descriptions))
+        return table
+
+    @classmethod
+    def from_shots(cls, shots) -> "ShotTable":
+        n = len(shots)
+        return cls.from_columns(
+            np.fromiter((s.start_time for s in shots), np.float64, n),
+            np.fromiter((s.end_time for s in shots), np.float64, n),
+            [s.description for s in shots],
+        )
+
+    def validate(self, blank=None):
+        if not (len(self.end_time) == len(self.start_time) == len(self.descriptions)):
+            raise ValueError("ShotTable 各列长度不一致")
+        _validate_time_columns(self.start_time, self.end_time, "Shot")
+        blank = self.descriptions.blank_rows() if blank is None else blank
+        if blank.size:
+            raise ValueError(f"Shot[{blank[0]}].description 不能为空或仅包含空白字符")
+
+    def __len__(self):
+        return len(self.start_time)
+
+    def __getitem__(self, i: int) -> ShotView:
+        if i < 0:
+            i += len(self)
+        if not 0 <= i < len(self):
+            raise IndexError(i)
+        return ShotView(self, i)
+
+    def __iter__(self):
+        return (ShotView(self, i) for i in range(len(self)))
+
+    def to_shots(self) -> List[Shot]:
+        return [
+            _unchecked(Shot, start_time=a, end_time=b, description=t)
+            for a, b, t in zip(self.start_time.tolist(), self.end_time.tolist(), self.descriptions.tolist())
+        ]
+
+
+def _end_times(items) -> np.ndarray:
+    if isinstance(items, (DialogueTable, ShotTable)):
+        return items.end_time
+    return np.fromiter((x.end_time for x in items), np.float64, len(items))
+
+
 @dataclass
 class VideoMetadata:
     basic_info: BasicInfo
-    shots: List[Shot]
+    shots: List[Shot]            # 也可以是 ShotTable
     people: List[Person]
-    dialogues: List[Dialogue]
+    dialogues: List[Dialogue]    # 也可以是 DialogueTable
 
     def __post_init__(self):
-        # 可选：验证时间是否在视频总时长内（按需启用）
+        # 可选：验证时间是否在视频总时长内（按需启用），整列向量化比较
         dur = self.basic_info.duration_seconds
-        for shot in self.shots:
-            if shot.end_time > dur + 1.0:  # 允许 1 秒误差
-                raise ValueError(f"Shot 超出视频总时长: {shot}")
-        for dlg in self.dialogues:
-            if dlg.end_time > dur + 1.0:
-                raise ValueError(f"Dialogue 超出视频总时长: {dlg}")
+        bad = np.flatnonzero(_end_times(self.shots) > dur + 1.0)  # 允许 1 秒误差
+        if bad.size:
+            raise ValueError(f"Shot 超出视频总时长: {self.shots[int(bad[0])]}")
+        bad = np.flatnonzero(_end_times(self.dialogues) > dur + 1.0)
+        if bad.size:
+            raise ValueError(f"Dialogue 超出视频总时长: {self.dialogues[int(bad[0])]}")
 
     def to_dict(self) -> dict:
-        """转换为可 JSON 序列化的字典"""
-        return asdict(self)
+        """转换为可 JSON 序列化的字典（逐字段构造，避免 asdict 的递归深拷贝）"""
+        shots = self.shots.to_shots() if isinstance(self.shots, ShotTable) else self.shots
+        dialogues = self.dialogues.to_dialogues() if isinstance(self.dialogues, DialogueTable) else self.dialogues
+        return {
+            "basic_info": {
+                "duration_seconds": self.basic_info.duration_seconds,
+                "video_type": self.basic_info.video_type,
+                "core_theme": self.basic_info.core_theme,
+            },
+            "shots": [
+                {"start_time": s.start_time, "end_time": s.end_time, "description": s.description}
+                for s in shots
+            ],
+            "people": [{"name": p.name, "identity": p.identity} for p in self.people],
+            "dialogues": [
+                {"start_time": d.start_time, "end_time": d.end_time, "speaker": d.speaker, "text": d.text}
+                for d in dialogues
+            ],
+        }
 
     @classmethod
     def from_dict(cls, data: dict) -> "VideoMetadata":
@@ -117,6 +397,100 @@ class VideoMetadata:
             data = json.load(f)
         return cls.from_dict(data)
 
+    def save_to_binary(self, filepath: str | Path):
+        """
+        保存为二进制列式格式（.vmd）：
+        时间列为 float64 数组，文本拼成一个 UTF-8 大块 + 偏移数组，说话人去重后存编号
+        """
+        d = self.dialogues if isinstance(self.dialogues, DialogueTable) else DialogueTable.from_dialogues(self.dialogues)
+        s = self.shots if isinstance(self.shots, ShotTable) else ShotTable.from_shots(self.shots)
+
+        arrays = {
+            "dialogues.start_time": d.start_time,
+            "dialogues.end_time": d.end_time,
+            "dialogues.speaker_id": d.speaker_id,
+            "dialogues.text_offsets": d.texts.offsets,
+            "dialogues.text_blob": np.frombuffer(d.texts.blob, dtype=np.uint8),
+            "shots.start_time": s.start_time,
+            "shots.end_time": s.end_time,
+            "shots.description_offsets": s.descriptions.offsets,
+            "shots.description_blob": np.frombuffer(s.descriptions.blob, dtype=np.uint8),
+        }
+
+        layout, pos = {}, 0
+        for name, arr in arrays.items():
+            pos = _aligned(pos)
+            layout[name] = {"offset": pos, "dtype": arr.dtype.str, "shape": list(arr.shape)}
+            pos += arr.nbytes
+
+        header = json.dumps({
+            "version": 1,
+            "basic_info": {
+                "duration_seconds": self.basic_info.duration_seconds,
+                "video_type": self.basic_info.video_type,
+                "core_theme": self.basic_info.core_theme,
+            },
+            "people": [{"name": p.name, "identity": p.identity} for p in self.people],
+            "speakers": d.speakers,
+            "counts": {"dialogues": len(d), "shots": len(s)},
+            "arrays": layout,
+        }, ensure_ascii=False).encode("utf-8")
+
+        data_start = _aligned(len(BINARY_MAGIC) + 8 + len(header))
+        with open(filepath, "wb") as f:
+            f.write(BINARY_MAGIC)
+            f.write(struct.pack("<Q", len(header)))
+            f.write(header)
+            for name, arr in arrays.items():
+                f.seek(data_start + layout[name]["offset"])
+                f.write(arr.tobytes())
+
+    @classmethod
+    def load_from_binary(cls, filepath: str | Path, sections=("shots", "dialogues"),
+                         as_tables: bool = False) -> "VideoMetadata":
+        """
+        从 .vmd 加载（mmap，只解码 sections 中列出的部分，其余为空）
+        as_tables=True 时返回 DialogueTable / ShotTable（时间列直接映射文件，不复制），
+        build_index() 直接按列建索引，不逐条构造对象
+        文件由已校验的对象写出，加载时不再逐条校验
+        """
+        header, columns = read_binary_columns(filepath)
+
+        shots = ShotTable(
+            columns["shots.start_time"], columns["shots.end_time"],
+            StringColumn(columns["shots.description_blob"].tobytes(), columns["shots.description_offsets"]),
+            validate=False,
+        ) if "shots" in sections else ShotTable.from_columns([], [], [])
+
+        dialogues = DialogueTable(
+            columns["dialogues.start_time"], columns["dialogues.end_time"], columns["dialogues.speaker_id"],
+            header["speakers"],
+            StringColumn(columns["dialogues.text_blob"].tobytes(), columns["dialogues.text_offsets"]),
+            validate=False,
+        ) if "dialogues" in sections else DialogueTable.from_columns([], [], [], [])
+
+        if not as_tables:
+            shots, dialogues = shots.to_shots(), dialogues.to_dialogues()
+
+        return _unchecked(
+            cls,
+            basic_info=BasicInfo(**header["basic_info"]),
+            shots=shots,
+            people=[Person(**p) for p in header["people"]],
+            dialogues=dialogues,
+        )
+
+    @classmethod
+    def load(cls, filepath: str | Path) -> "VideoMetadata":
+        """按扩展名选择格式：.vmd 为二进制，其余按 JSON"""
+        if Path(filepath).suffix == ".vmd":
+            return cls.load_from_binary(filepath)
+        return cls.load_from_json(filepath)
+
+    def build_index(self) -> "MetadataIndex":
+        """建立时间索引（对白 / 镜头 / 说话人片段），支持按时间点和时间段查询"""
+        return MetadataIndex(self)
+
     # 辅助方法（可选）
     def get_duration_formatted(self) -> str:
         secs = int(self.basic_info.duration_seconds)
@@ -124,4 +498,239 @@ class VideoMetadata:
         if h > 0:
             return f"{h:02d}:{m:02d}:{s:02d}"
         else:
-            return f"{m:02d}:{s:02d}"
\ No newline at end of file
+            return f"{m:02d}:{s:02d}"
+
+
+# ---------- 时间区间索引 ----------
+
+class IntervalIndex:
+    """
+    区间索引（半开区间 [start, end)），支持增量插入 / 删除：
+    1. 区间按起始时间排序，分成至多 2 * BLOCK 条的块
+    2. 各块的最大结束时间组成一棵线段树，查询时只进入“起点 <= b 且最大结束时间 > a”的块
+    即使存在很长的区间（如长镜头），查询也是 O(log n + 命中块数 * BLOCK)
+    """
+
+    BLOCK = 64
+
+    def __init__(self, items=()):
+        # items: 可迭代的 (start, end, key)
+        entries = sorted(items)
+        self._blocks = [entries[i:i + self.BLOCK] for i in range(0, len(entries), self.BLOCK)]
+        self._rebuild()
+
+    def _rebuild(self):
+        self._mins = [blk[0][0] for blk in self._blocks]
+        self._size = 1
+        while self._size < len(self._blocks):
+            self._size *= 2
+        self._tree = [float("-inf")] * (2 * self._size)
+        for j, blk in enumerate(self._blocks):
+            self._tree[self._size + j] = max(e[1] for e in blk)
+        for i in range(self._size - 1, 0, -1):
+            self._tree[i] = max(self._tree[2 * i], self._tree[2 * i + 1])
+
+    def _update_block(self, j):
+        blk = self._blocks[j]
+        self._mins[j] = blk[0][0]
+        i = self._size + j
+        self._tree[i] = max(e[1] for e in blk)
+        i //= 2
+        while i:
+            self._tree[i] = max(self._tree[2 * i], self._tree[2 * i + 1])
+            i //= 2
+
+    def __len__(self):
+        return sum(len(blk) for blk in self._blocks)
+
+    @property
+    def start(self):
+        """最早的起始时间；索引为空时为 None"""
+        return self._mins[0] if self._mins else None
+
+    def insert(self, start, end, key):
+        if not self._blocks:
+            self._blocks = [[(start, end, key)]]
+            self._rebuild()
+            return
+
+        j = max(bisect.bisect_right(self._mins, start) - 1, 0)
+        blk = self._blocks[j]
+        blk.insert(bisect.bisect_right([e[0] for e in blk], start), (start, end, key))
+        if len(blk) > 2 * self.BLOCK:
+            self._blocks[j:j + 1] = [blk[:self.BLOCK], blk[self.BLOCK:]]
+            self._rebuild()
+        else:
+            self._update_block(j)
+
+    def remove(self, start, key):
+        j = max(bisect.bisect_left(self._mins, start) - 1, 0)
+        while j < len(self._blocks) and self._mins[j] <= start:
+            blk = self._blocks[j]
+            for i, e in enumerate(blk):
+                if e[0] == start and e[2] == key:
+                    del blk[i]
+                    if blk:
+                        self._update_block(j)
+                    else:
+                        del self._blocks[j]
+                        self._rebuild()
+                    return
+            j += 1
+        raise KeyError(key)
+
+    def _candidate_blocks(self, a, hi):
+        # 线段树中下标 < hi 且最大结束时间 > a 的块，按下标升序
+        found, stack = [], [(1, 0, self._size)]
+        while stack:
+            node, lo, end = stack.pop()
+            if lo >= hi or self._tree[node] <= a:
+                continue
+            if end - lo == 1:
+                found.append(lo)
+                continue
+            mid = (lo + end) // 2
+            stack.append((2 * node + 1, mid, end))
+            stack.append((2 * node, lo, mid))
+        return found
+
+    def overlapping(self, a, b):
+        """与 [a, b] 有重叠的区间 key（按起始时间排序）"""
+        result = []
+        for j in self._candidate_blocks(a, bisect.bisect_right(self._mins, b)):
+            for start, end, key in self._blocks[j]:
+                if start > b:
+                    break
+                if end > a and (start < b or start == a == b):
+                    result.append(key)
+        return result
+
+    def at(self, t):
+        """包含时间点 t 的区间 key"""
+        return self.overlapping(t, t)
+
+
+class MetadataIndex:
+    """
+    VideoMetadata 的时间索引：
+    shots / dialogues 存列表下标，speakers 为 说话人 → 该人对白下标的区间索引；
+    说话人变化时用 set_speaker / refresh_speakers 增量更新
+    shots / dialogues 为 ShotTable / DialogueTable 时直接读时间列和说话人编号列
+    """
+
+    def __init__(self, metadata: "VideoMetadata"):
+        self.metadata = metadata
+        self.shots = IntervalIndex(_intervals(metadata.shots))
+        dialogues = list(_intervals(metadata.dialogues))
+        self.dialogues = IntervalIndex(dialogues)
+
+        if isinstance(metadata.dialogues, DialogueTable):
+            names = metadata.dialogues.speakers
+            self._speaker_of = [names[k] for k in metadata.dialogues.speaker_id.tolist()]
+        else:
+            self._speaker_of = [d.speaker for d in metadata.dialogues]
+        by_speaker = {}
+        for item, name in zip(dialogues, self._speaker_of):
+            by_speaker.setdefault(name, []).append(item)
+        self.speakers = {name: IntervalIndex(items) for name, items in by_speaker.items()}
+
+    def at(self, t) -> dict:
+        """时间点 t 的画面与对白：{"shots": [...], "dialogues": [...], "speakers": [...]}"""
+        return self.between(t, t)
+
+    def between(self, a, b) -> dict:
+        """与 [a, b] 重叠的全部镜头、对白和说话人"""
+        shots = [self.metadata.shots[i] for i in self.shots.overlapping(a, b)]
+        dialogues = [self.metadata.dialogues[i] for i in self.dialogues.overlapping(a, b)]
+        speakers = [name for name, idx in self.speakers.items() if idx.overlapping(a, b)]
+        return {"shots": shots, "dialogues": dialogues, "speakers": speakers}
+
+    def speaker_dialogues(self, name, a=float("-inf"), b=float("inf")) -> List[Dialogue]:
+        """某人在 [a, b] 内的全部对白"""
+        idx = self.speakers.get(name)
+        if idx is None:
+            return []
+        return [self.metadata.dialogues[i] for i in idx.overlapping(a, b)]
+
+    def set_speaker(self, i, name):
+        """修改第 i 条对白的说话人，并增量更新说话人索引"""
+        dlg = self.metadata.dialogues[i]
+        dlg.speaker = name
+        self._move_speaker(i, name)
+
+    def refresh_speakers(self) -> int:
+        """对白的 speaker 被外部修改后（如重新绑定说话人），只更新变化的条目，返回更新数"""
+        changed = 0
+        for i, dlg in enumerate(self.metadata.dialogues):
+            if dlg.speaker != self._speaker_of[i]:
+                self._move_speaker(i, dlg.speaker)
+                changed += 1
+        return changed
+
+    def _move_speaker(self, i, name):
+        old = self._speaker_of[i]
+        if old == name:
+            return
+        dlg = self.metadata.dialogues[i]
+        self.speakers[old].remove(dlg.start_time, i)
+        if not self.speakers[old]:
+            del self.speakers[old]
+        self.speakers.setdefault(name, IntervalIndex()).insert(dlg.start_time, dlg.end_time, i)
+        self._speaker_of[i] = name
+
+
+def _intervals(items):
+    """逐条的 (start, end, 下标)；列式表直接取时间列，不构造行视图"""
+    if isinstance(items, (DialogueTable, ShotTable)):
+        return zip(items.start_time.tolist(), items.end_time.tolist(), range(len(items)))
+    return ((x.start_time, x.end_time, i) for i, x in enumerate(items))
+
+
+# ---------- 二进制列式格式（.vmd）辅助函数 ----------
+
+def _aligned(pos: int) -> int:
+    return (pos + _ALIGN - 1) // _ALIGN * _ALIGN
+
+
+def _pack_strings(strings):
+    """多个字符串 → (UTF-8 大块 uint8 数组, int64 偏移数组[n+1])"""
+    encoded = [x.encode("utf-8") for x in strings]
+    offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+    np.cumsum([len(b) for b in encoded], out=offsets[1:])
+    return np.frombuffer(b"".join(encoded), dtype=np.uint8), offsets
+
+
+def _unpack_strings(blob, offsets):
+    raw = blob.tobytes()
+    bounds = offsets.tolist()
+    return [raw[a:b].decode("utf-8") for a, b in zip(bounds, bounds[1:])]
+
+
+def _unchecked(cls, **fields):
+    """跳过 __post_init__ 校验直接构造（仅用于读取自己写出的可信数据）"""
+    obj = object.__new__(cls)
+    obj.__dict__.update(fields)
+    return obj
+
+
+def read_binary_columns(filepath: str | Path):
+    """
+    以 mmap 方式打开 .vmd，返回 (header, {列名: numpy 数组})
+    数组直接映射文件内容，不复制；下游索引器可以只读需要的列
+    """
+    with open(filepath, "rb") as f:
+        if f.read(len(BINARY_MAGIC)) != BINARY_MAGIC:
+            raise ValueError(f"不是有效的 .vmd 文件: {filepath}")
+        (header_len,) = struct.unpack("<Q", f.read(8))
+        header = json.loads(f.read(header_len).decode("utf-8"))
+
+    data_start = _aligned(len(BINARY_MAGIC) + 8 + header_len)
+    buf = np.memmap(filepath, dtype=np.uint8, mode="r")
+
+    columns = {}
+    for name, info in header["arrays"].items():
+        dtype = np.dtype(info["dtype"])
+        count = int(np.prod(info["shape"]))
+        start = data_start + info["offset"]
+        columns[name] = buf[start:start + count * dtype.itemsize].view(dtype).reshape(info["shape"])
+    return header, columns